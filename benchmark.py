@@ -0,0 +1,408 @@
+"""
+性能基准测试
+
+在本机启动一个兼容 OpenAI 接口的模拟翻译服务（可设置延迟、吞吐量、错误率和限流），
+生成不同页数的合成论文 PDF，然后按线程数、并行任务数、分片大小和常驻工作进程数的
+组合，通过与界面相同的调度器、pdf2zh 命令行和环境变量（OPENAI_BASE_URL 指向模拟
+服务）翻译这些文件。每种组合的墙钟时间、页/秒、进程启动耗时和峰值内存保存为 JSON
+与 CSV，便于比较不同版本和设置，不消耗任何 API 额度：
+
+    python benchmark.py --pages 1,5,20 --threads 1,4,8 --jobs 1,2 --shard-size 0,10
+    python benchmark.py --serve --port 8765    # 只启动模拟服务，供界面手动测试
+"""
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import platform
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core import setup_console_encoding
+from scheduler import JobState
+from telemetry import TelemetryLog
+
+# 合成论文使用的词汇，固定随机种子时生成的文档完全相同
+_WORDS = (
+    "model method data training result analysis network layer parameter function "
+    "distribution estimate sample error performance baseline experiment dataset feature "
+    "learning optimization gradient loss accuracy approach framework structure variable "
+    "regression inference probability observation evaluation significant proposed robust"
+).split()
+_BOILERPLATE = [
+    "This work is licensed under a Creative Commons Attribution 4.0 International License.",
+    "The authors declare no competing interests.",
+    "All experiments were repeated five times and we report the mean and standard deviation.",
+]
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid json"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        status, data, headers = self.server.mock.complete(request)
+        self._send_json(status, data, headers)
+
+
+class MockTranslationServer:
+    """
+    兼容 OpenAI chat/completions 接口的本地模拟翻译服务
+
+    每个请求耗时 latency（加上 ±jitter 的随机波动）再加上按 chars_per_second 计算的
+    生成时间；error_rate 与 rate_limit_rate 分别为返回 500 和 429 的比例；同时处理的请求
+    超过 max_concurrency（0 为不限制）时返回 429。
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, jitter=0.0, chars_per_second=0,
+                 error_rate=0.0, rate_limit_rate=0.0, max_concurrency=0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.chars_per_second = chars_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.max_concurrency = max_concurrency
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.reset_stats()
+        self.httpd = ThreadingHTTPServer((host, port), _MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def settings(self):
+        return {
+            "latency": self.latency,
+            "jitter": self.jitter,
+            "chars_per_second": self.chars_per_second,
+            "error_rate": self.error_rate,
+            "rate_limit_rate": self.rate_limit_rate,
+            "max_concurrency": self.max_concurrency,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "peak_concurrency": 0,
+                          "chars": 0}
+
+    def complete(self, request):
+        """处理一个 chat/completions 请求，返回 (状态码, 响应, 响应头)"""
+        messages = request.get("messages") or [{"content": ""}]
+        content = messages[-1].get("content", "")
+        # pdf2zh 默认提示词中原文位于 "Source Text:" 与 "Translated Text:" 之间
+        if "Source Text:" in content:
+            content = content.split("Source Text:", 1)[1].rsplit("Translated Text:", 1)[0].strip()
+
+        with self._lock:
+            self.stats["requests"] += 1
+            roll = self._random.random()
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            if self.max_concurrency and self._in_flight >= self.max_concurrency:
+                roll = -1.0
+            self._in_flight += 1
+            self.stats["peak_concurrency"] = max(self.stats["peak_concurrency"], self._in_flight)
+        try:
+            if roll < 0 or roll < self.rate_limit_rate:
+                with self._lock:
+                    self.stats["rate_limited"] += 1
+                return 429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}, \
+                    {"Retry-After": "1"}
+            if roll < self.rate_limit_rate + self.error_rate:
+                time.sleep(delay)
+                with self._lock:
+                    self.stats["errors"] += 1
+                return 500, {"error": {"message": "Internal server error", "type": "server_error"}}, {}
+
+            translation = f"【译】{content}"
+            if self.chars_per_second:
+                delay += len(translation) / self.chars_per_second
+            time.sleep(delay)
+            with self._lock:
+                self.stats["chars"] += len(content)
+            return 200, {
+                "id": f"chatcmpl-mock-{self.stats['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": translation},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": len(content) // 4,
+                    "completion_tokens": len(translation) // 4,
+                    "total_tokens": (len(content) + len(translation)) // 4,
+                },
+            }, {}
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def make_pdf(path, pages, seed=0):
+    """生成一篇合成论文：每页一个小节标题、若干段落、一个图注和重复出现的固定表述"""
+    from sharding import open_pdf
+
+    rng = random.Random(f"{seed}-{pages}")
+    doc = open_pdf()
+    for page_number in range(1, pages + 1):
+        page = doc.new_page(width=595, height=842)
+        y = 72
+        page.insert_text((72, y), f"{page_number}. Section on {rng.choice(_WORDS)} {rng.choice(_WORDS)}",
+                         fontsize=14)
+        y += 30
+        for _ in range(4):
+            sentences = []
+            for _ in range(rng.randint(3, 5)):
+                words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 16))]
+                sentences.append(" ".join(words).capitalize() + ".")
+            paragraph = " ".join(sentences)
+            rect = (72, y, 523, y + 130)
+            page.insert_textbox(rect, paragraph, fontsize=10)
+            y += 140
+        page.insert_textbox((72, y, 523, y + 40),
+                            f"Figure {page_number}: The {rng.choice(_WORDS)} of the proposed {rng.choice(_WORDS)}.",
+                            fontsize=9)
+        page.insert_textbox((72, 770, 523, 800), _BOILERPLATE[page_number % len(_BOILERPLATE)], fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def make_corpus(directory, page_counts, seed=0):
+    """生成（或复用已生成的）各页数的合成文档，返回文件路径列表"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for pages in page_counts:
+        path = os.path.join(directory, f"synthetic-{pages:03d}p-s{seed}.pdf")
+        if not os.path.exists(path):
+            make_pdf(path, pages, seed)
+        paths.append(path)
+    return paths
+
+
+def run_case(files, page_counts, server, case, output_root, verbose=False):
+    """按一种设置组合翻译整个语料，返回一行结果"""
+    from headless import run_jobs
+
+    threads, jobs, shard_size, workers = case
+    name = f"t{threads}-j{jobs}-s{shard_size}-w{workers}"
+    output_dir = os.path.join(output_root, name)
+    base_params = {
+        "service": "openai",
+        "model": "mock",
+        "source_lang": "en",
+        "target_lang": "zh-CN",
+        "api_key": "benchmark",
+        "api_url": server.url,
+        "pages": "",
+        "threads": threads,
+        "compatible_mode": False,
+        "skip_subset_fonts": False,
+        "shard_size": shard_size,
+        "shard_parallel": 16,
+        "checkpoint": False,
+        # 每次都真正请求模拟服务，不使用 pdf2zh 自带的段落缓存
+        "ignore_cache": True,
+        "translation_memory": "",
+    }
+    params_list = [dict(base_params, file_path=path, output_dir=output_dir) for path in files]
+
+    worker_pool = None
+    pool_startup = 0.0
+    if workers:
+        from worker_pool import WorkerPool
+        started = time.time()
+        worker_pool = WorkerPool(workers, 0, 0)
+        pool_startup = time.time() - started
+
+    def log(job_id, message):
+        if verbose:
+            print(f"  [{name} #{job_id}] {message}", flush=True)
+
+    telemetry = TelemetryLog(None)
+    server.reset_stats()
+    started = time.time()
+    try:
+        scheduler = run_jobs(params_list, jobs, worker_pool, None, None, telemetry, log)
+    finally:
+        wall_time = time.time() - started
+        if worker_pool is not None:
+            worker_pool.shutdown()
+
+    counts = scheduler.stats()["counts"]
+    records = [r for r in telemetry.records if r["mode"] in ("subprocess", "pool")]
+    startups = [r["phases"].get("startup", 0.0) for r in records]
+    merges = [r["phases"].get("merge", 0.0) for r in telemetry.records if r["mode"] == "merge"]
+    total_pages = sum(page_counts)
+    return {
+        "case": name,
+        "threads": threads,
+        "jobs": jobs,
+        "shard_size": shard_size,
+        "workers": workers,
+        "documents": len(files),
+        "pages": total_pages,
+        "succeeded": counts[JobState.DONE],
+        "failed": counts[JobState.FAILED] + counts[JobState.CANCELLED],
+        "wall_time": round(wall_time, 3),
+        "pages_per_sec": round(total_pages / wall_time, 4) if wall_time > 0 else 0.0,
+        "processes": len(records),
+        "startup_mean": round(sum(startups) / len(startups), 3) if startups else 0.0,
+        "startup_total": round(sum(startups), 3),
+        "pool_startup": round(pool_startup, 3),
+        "merge_total": round(sum(merges, 0.0), 3),
+        "peak_rss_mb": max((r["peak_rss_mb"] or 0.0 for r in records), default=0.0),
+        "cpu_seconds": round(sum(r["cpu_seconds"] or 0.0 for r in records), 2),
+        "requests": server.stats["requests"],
+        "service_errors": server.stats["errors"],
+        "service_429": server.stats["rate_limited"],
+        "peak_service_concurrency": server.stats["peak_concurrency"],
+    }
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(",") if value.strip()]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="PDF翻译工具性能基准测试 (使用本地模拟翻译服务)")
+    parser.add_argument("--pages", type=_int_list, default=[1, 5, 20], help="合成文档的页数列表，默认 1,5,20")
+    parser.add_argument("--threads", type=_int_list, default=[1, 4, 8], help="线程数 (-t) 列表")
+    parser.add_argument("--jobs", type=_int_list, default=[1, 2], help="并行任务数列表")
+    parser.add_argument("--shard-size", type=_int_list, default=[0], help="分片大小列表，0为不分片")
+    parser.add_argument("--workers", type=_int_list, default=[0], help="常驻工作进程数列表，0为子进程模式")
+    parser.add_argument("--repeat", type=int, default=1, help="每种组合重复次数")
+    parser.add_argument("--seed", type=int, default=0, help="合成文档和模拟服务的随机种子")
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟服务每个请求的延迟(秒)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="延迟的随机波动(秒)")
+    parser.add_argument("--chars-per-second", type=float, default=0, help="模拟生成速度，0为不限制")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的请求比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回 429 的请求比例")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="模拟服务并发上限，超过时返回 429")
+    parser.add_argument("-o", "--output-dir", default="benchmark-results", help="报告与翻译结果的保存目录")
+    parser.add_argument("--serve", action="store_true", help="只启动模拟服务，不运行基准测试")
+    parser.add_argument("--port", type=int, default=0, help="模拟服务端口，默认随机")
+    parser.add_argument("-v", "--verbose", action="store_true", help="显示每个任务的日志")
+    return parser
+
+
+def write_report(rows, metadata, output_dir):
+    """保存 JSON 与 CSV 报告，返回两个文件路径"""
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    json_path = os.path.join(output_dir, f"benchmark-{stamp}.json")
+    csv_path = os.path.join(output_dir, f"benchmark-{stamp}.csv")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({"metadata": metadata, "results": rows}, f, ensure_ascii=False, indent=2)
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ["case"])
+        writer.writeheader()
+        writer.writerows(rows)
+    return json_path, csv_path
+
+
+def _pdf2zh_version():
+    try:
+        from importlib.metadata import version
+        return version("pdf2zh")
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    setup_console_encoding()
+    args = build_parser().parse_args(argv)
+    server = MockTranslationServer(port=args.port, latency=args.latency, jitter=args.jitter,
+                                   chars_per_second=args.chars_per_second, error_rate=args.error_rate,
+                                   rate_limit_rate=args.rate_limit_rate,
+                                   max_concurrency=args.max_concurrency, seed=args.seed).start()
+    if args.serve:
+        print(f"模拟翻译服务已启动: {server.url} (服务选择 OpenAI，API URL 填写此地址)，按 Ctrl+C 退出", flush=True)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.stop()
+        return 0
+
+    output_dir = os.path.abspath(args.output_dir)
+    files = make_corpus(os.path.join(output_dir, "corpus"), args.pages, args.seed)
+    cases = list(itertools.product(args.threads, args.jobs, args.shard_size, args.workers))
+    rows = []
+    try:
+        for index, case in enumerate(cases, start=1):
+            for run in range(args.repeat):
+                print(f"[{index}/{len(cases)}] 线程 {case[0]}，并行任务 {case[1]}，分片 {case[2]}，"
+                      f"工作进程 {case[3]}，第 {run + 1} 次", flush=True)
+                row = run_case(files, args.pages, server, case, os.path.join(output_dir, "runs"), args.verbose)
+                row["run"] = run + 1
+                rows.append(row)
+                print(f"    {row['wall_time']:.2f} 秒，{row['pages_per_sec']:.2f} 页/秒，"
+                      f"启动 {row['startup_mean']:.2f} 秒/进程，峰值内存 {row['peak_rss_mb']:.0f} MB，"
+                      f"成功 {row['succeeded']}/{row['documents']}", flush=True)
+    finally:
+        server.stop()
+
+    metadata = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pdf2zh": _pdf2zh_version(),
+        "pages": args.pages,
+        "seed": args.seed,
+        "mock_service": server.settings(),
+    }
+    json_path, csv_path = write_report(rows, metadata, output_dir)
+    print(f"报告已保存: {json_path}\n            {csv_path}", flush=True)
+    return 0 if all(row["failed"] == 0 for row in rows) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
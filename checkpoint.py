@@ -0,0 +1,85 @@
+"""
+断点续译检查点
+
+启用后任务总是按分片执行，每个分片完成时把页码范围和输出位置写入分片目录下的
+journal.json。任务失败、被取消或程序重启后再次翻译同一文件（设置相同）时，已完成
+的分片直接复用，只重新翻译缺失的页，最后照常合并。
+"""
+import os
+import json
+import time
+import threading
+
+JOURNAL_NAME = "journal.json"
+
+# 未设置分片大小时，断点续译使用的分片大小
+CHECKPOINT_SHARD_SIZE = 10
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(path):
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+
+class CheckpointJournal:
+    """一个分片任务的检查点记录，多个分片线程可以同时写入"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, JOURNAL_NAME)
+        self._lock = _lock_for(self.path)
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, data):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def begin(self, source_digest, shard_specs):
+        """
+        开始或恢复一次分片翻译，返回已完成且输出仍然存在的分片序号集合
+
+        输入文件内容或分片划分发生变化时丢弃旧记录。
+        """
+        with self._lock:
+            data = self._load()
+            if (data is None or data.get("source_digest") != source_digest
+                    or data.get("shards") != shard_specs):
+                data = {
+                    "source_digest": source_digest,
+                    "shards": shard_specs,
+                    "completed": {},
+                    "created": time.time(),
+                }
+                self._save(data)
+                return set()
+
+            completed = set()
+            for index, entry in data["completed"].items():
+                if os.path.exists(entry["mono"]) and os.path.exists(entry["dual"]):
+                    completed.add(int(index))
+            return completed
+
+    def mark_done(self, index, mono_path, dual_path):
+        with self._lock:
+            data = self._load()
+            if data is None:
+                return
+            data["completed"][str(index)] = {
+                "pages": data["shards"][index],
+                "mono": mono_path,
+                "dual": dual_path,
+                "completed_at": time.time(),
+            }
+            self._save(data)
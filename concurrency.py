@@ -0,0 +1,241 @@
+"""
+按翻译服务自适应调整并发
+
+pdf2zh 的 -t 决定一个任务同时发出多少个翻译请求。免费的 Google/Bing 接口很快就会
+限流，DeepSeek、硅基流动等付费接口可以承受高得多的并发，本地 Ollama/Xinference
+则受本机 CPU 限制。这里为每个服务提供默认配置，并根据任务输出中的限流、超时和
+错误信息以及每页耗时，在后续任务（或分片）中调整线程数：没有异常且吞吐量没有下降
+时逐步增加，出现限流或超时时减半。
+
+同一服务、同一密钥下所有并发任务的线程数之和不超过该服务的总额度。
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+
+# 每个服务的默认线程数、自适应上下限以及所有任务共享的总额度
+_LOCAL_THREADS = max(1, (os.cpu_count() or 2) // 2)
+SERVICE_PROFILES = {
+    "google": {"threads": 2, "min": 1, "max": 4, "budget": 4},
+    "bing": {"threads": 2, "min": 1, "max": 4, "budget": 4},
+    "argos": {"threads": _LOCAL_THREADS, "min": 1, "max": _LOCAL_THREADS, "budget": _LOCAL_THREADS},
+    "deepl": {"threads": 4, "min": 1, "max": 8, "budget": 8},
+    "openai": {"threads": 8, "min": 1, "max": 32, "budget": 48},
+    "azure-openai": {"threads": 8, "min": 1, "max": 32, "budget": 48},
+    "zhipu": {"threads": 4, "min": 1, "max": 16, "budget": 16},
+    "modelscope": {"threads": 4, "min": 1, "max": 8, "budget": 8},
+    "ollama": {"threads": _LOCAL_THREADS, "min": 1, "max": _LOCAL_THREADS, "budget": _LOCAL_THREADS},
+    "xinference": {"threads": _LOCAL_THREADS, "min": 1, "max": _LOCAL_THREADS, "budget": _LOCAL_THREADS},
+    "gemini": {"threads": 4, "min": 1, "max": 16, "budget": 16},
+    "deepseek": {"threads": 16, "min": 2, "max": 64, "budget": 64},
+    "qwen-mt": {"threads": 8, "min": 1, "max": 16, "budget": 16},
+    "silicon": {"threads": 16, "min": 2, "max": 64, "budget": 64},
+    "tencent": {"threads": 4, "min": 1, "max": 10, "budget": 10},
+}
+DEFAULT_PROFILE = {"threads": 4, "min": 1, "max": 16, "budget": 16}
+
+DEFAULT_STATE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "pdf-translator", "concurrency.json")
+
+# 任务输出中表示限流、超时和请求错误的信息
+RATE_LIMIT_PATTERN = re.compile(r"(?<![\d/.])429(?![\d/.])|too many requests|rate.?limit|quota|throttl",
+                                re.IGNORECASE)
+TIMEOUT_PATTERN = re.compile(r"timed? ?out|timeout", re.IGNORECASE)
+ERROR_PATTERN = re.compile(r"(?<![\d/.])5\d\d(?![\d/.])|connection (?:error|reset|refused|aborted)|\bERROR\b")
+
+# 一个任务中错误信息超过该数量时也视为过载
+ERROR_THRESHOLD = 3
+# 吞吐量低于此前最好水平的该比例时回退到上一次的线程数
+THROUGHPUT_TOLERANCE = 0.9
+
+
+def profile_for(service):
+    return SERVICE_PROFILES.get(service, DEFAULT_PROFILE)
+
+
+def service_key(params):
+    """服务与密钥的组合，同一密钥的并发额度由所有任务共享"""
+    secret = f"{params.get('api_key', '')}\0{params.get('api_url', '')}"
+    return f"{params['service']}:{hashlib.sha1(secret.encode('utf-8')).hexdigest()[:8]}"
+
+
+class _ServiceState:
+    def __init__(self, profile, limit=None):
+        self.profile = profile
+        self.limit = min(max(limit or profile["threads"], profile["min"]), profile["max"])
+        self.previous_limit = self.limit
+        self.best_rate = 0.0  # 每秒页数的最好记录
+        self.in_use = 0
+
+
+class ServiceLease:
+    """一个任务占用的并发额度，运行期间统计输出中的异常信息"""
+
+    def __init__(self, controller, key, threads, adaptive):
+        self._controller = controller
+        self.key = key
+        self.threads = threads
+        self.adaptive = adaptive
+        self.rate_limited = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.started_at = time.time()
+        self._released = False
+        self._suspended_at = None
+
+    def observe(self, text):
+        if RATE_LIMIT_PATTERN.search(text):
+            self.rate_limited += 1
+        elif TIMEOUT_PATTERN.search(text):
+            self.timeouts += 1
+        elif ERROR_PATTERN.search(text):
+            self.errors += 1
+
+    def suspend(self):
+        """任务被挂起时暂时归还额度，避免抢占它的任务等待额度"""
+        if self._released or self._suspended_at is not None:
+            return
+        self._suspended_at = time.time()
+        self._controller._lend(self.key, -self.threads)
+
+    def resume(self):
+        """重新占用额度（可能短暂超出总额度），挂起时间不计入耗时"""
+        if self._suspended_at is None:
+            return
+        self.started_at += time.time() - self._suspended_at
+        self._suspended_at = None
+        self._controller._lend(self.key, self.threads)
+
+    def release(self, success, pages=0):
+        """归还额度，并用本次任务的结果调整后续任务的线程数，返回调整说明"""
+        if self._released:
+            return None
+        self.resume()
+        self._released = True
+        return self._controller._release(self, success, pages, time.time() - self.started_at)
+
+
+class ConcurrencyController:
+    """
+    各翻译服务的线程数控制
+
+    acquire() 为任务分配线程数，同一服务与密钥的额度用完时阻塞等待；任务结束后
+    调用 lease.release()。学习到的线程数保存在 state_file 中，下次启动时继续使用。
+    """
+
+    def __init__(self, state_file=DEFAULT_STATE_FILE):
+        self.state_file = state_file
+        self._cond = threading.Condition()
+        self._states = {}
+        self._saved = self._load()
+
+    def _load(self):
+        if not self.state_file:
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        if not self.state_file:
+            return
+        data = {key: state.limit for key, state in self._states.items()}
+        try:
+            os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+            tmp_path = self.state_file + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.state_file)
+        except OSError:
+            pass
+
+    def _state(self, key, service):
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _ServiceState(profile_for(service), self._saved.get(key))
+        return state
+
+    def current_limit(self, params):
+        """自适应模式下该服务当前使用的线程数"""
+        with self._cond:
+            return self._state(service_key(params), params["service"]).limit
+
+    def acquire(self, params, cancel_event=None):
+        """
+        为任务分配线程数，返回 ServiceLease；等待期间任务被取消时返回 None
+
+        params["threads"] 为0时使用自适应线程数，否则使用指定值，两者都受总额度和
+        params["max_threads"]（如有）限制。
+        """
+        key = service_key(params)
+        with self._cond:
+            state = self._state(key, params["service"])
+            adaptive = not params.get("threads")
+            budget = state.profile["budget"]
+            while True:
+                wanted = state.limit if adaptive else params["threads"]
+                if params.get("max_threads"):
+                    # 预检得出的上限：pdf2zh 页内按段落并行，多余的线程不会被用到
+                    wanted = min(wanted, params["max_threads"])
+                available = budget - state.in_use
+                if available >= 1:
+                    threads = min(wanted, available)
+                    state.in_use += threads
+                    return ServiceLease(self, key, threads, adaptive)
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                self._cond.wait(0.2)
+
+    def _lend(self, key, threads):
+        with self._cond:
+            self._states[key].in_use += threads
+            self._cond.notify_all()
+
+    def _release(self, lease, success, pages, elapsed):
+        with self._cond:
+            state = self._states[lease.key]
+            state.in_use -= lease.threads
+            self._cond.notify_all()
+            if not lease.adaptive:
+                return None
+
+            profile = state.profile
+            old_limit = state.limit
+            overloaded = lease.rate_limited or lease.timeouts or lease.errors >= ERROR_THRESHOLD
+            if overloaded:
+                # 乘性减小
+                state.limit = max(profile["min"], old_limit // 2)
+                state.best_rate = 0.0
+                reason = (f"限流 {lease.rate_limited} 次，超时 {lease.timeouts} 次，"
+                          f"错误 {lease.errors} 次")
+            elif success and pages and elapsed > 0 and lease.threads == old_limit:
+                rate = pages / elapsed
+                if state.best_rate and rate < state.best_rate * THROUGHPUT_TOLERANCE \
+                        and state.previous_limit < old_limit:
+                    # 增加线程后吞吐量反而明显下降，回退到上一次的线程数
+                    state.limit = state.previous_limit
+                    reason = "吞吐量下降"
+                else:
+                    # 加性增加
+                    state.best_rate = max(state.best_rate, rate)
+                    state.limit = min(profile["max"], old_limit + 1)
+                    reason = f"{rate:.2f} 页/秒"
+            else:
+                return None
+
+            if state.limit == old_limit:
+                return None
+            state.previous_limit = old_limit
+            self._save()
+            return f"{lease.key.split(':')[0]} 的线程数 {old_limit} → {state.limit} ({reason})"
+
+    def stats(self):
+        """各服务当前的线程数与占用情况"""
+        with self._cond:
+            return {key: {"limit": state.limit, "in_use": state.in_use,
+                          "budget": state.profile["budget"]}
+                    for key, state in self._states.items()}
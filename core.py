@@ -0,0 +1,890 @@
+"""
+翻译核心逻辑
+
+不依赖 Qt：服务/模型/语言配置、pdf2zh 命令行与环境变量的构建，以及执行单个翻译
+任务的 TranslationRunner。图形界面和无界面模式共用这些接口。
+"""
+import io
+import os
+import re
+import json
+import sys
+import time
+import shutil
+import signal
+import subprocess
+import threading
+import importlib.util
+import urllib.parse
+
+from output_pipeline import OutputPipeline, STDERR
+from checkpoint import CheckpointJournal
+from layout_cache import LAYOUT_CACHE_ENV
+from translation_memory import DEFAULT_MEMORY_PATH, DEFAULT_MAX_ENTRIES, MEMORY_ENV, MEMORY_MAX_ENV
+from usage import USAGE_PATTERN
+from routing import ROUTE_KEYS, provider_key
+
+# 抢占时用 SIGSTOP/SIGCONT 挂起和恢复 pdf2zh 进程，Windows 不支持
+SUSPEND_SUPPORTED = hasattr(signal, "SIGSTOP")
+
+# 翻译服务配置
+TRANSLATION_SERVICES = {
+    "Google (默认)": "google",
+    "Bing": "bing",
+    "DeepL": "deepl",
+    "OpenAI": "openai",
+    "Azure OpenAI": "azure-openai",
+    "智谱 AI": "zhipu",
+    "魔搭 ModelScope": "modelscope",
+    "Ollama (本地模型)": "ollama",
+    "Xinference (本地模型)": "xinference",
+    "Gemini": "gemini",
+    "DeepSeek": "deepseek",
+    "阿里千问翻译": "qwen-mt",
+    "硅基流动": "silicon",  # 新增 Silicon 服务
+    "腾讯云翻译": "tencent"  # 新增 腾讯云翻译 服务
+}
+
+# 模型配置
+MODEL_OPTIONS = {
+    "openai": ["gpt-4o-mini", "gpt-4o", "gpt-3.5-turbo"],
+    "azure-openai": ["gpt-4o-mini", "gpt-4o", "gpt-3.5-turbo"],
+    "zhipu": ["glm-4-flash", "glm-4", "glm-3-turbo"],
+    "modelscope": ["Qwen/Qwen2.5-Coder-32B-Instruct", "Qwen/Qwen2.5-7B-Instruct"],
+    "ollama": ["gemma2", "llama3", "mixtral"],
+    "xinference": ["gemma-2-it", "llama3", "qwen2"],
+    "gemini": ["gemini-1.5-flash", "gemini-1.5-pro"],
+    "deepseek": ["deepseek-chat", "deepseek-coder"],
+    "qwen-mt": ["qwen-mt-turbo"],
+    "silicon": ["deepseek-ai/DeepSeek-V3", "Qwen/Qwen2.5-7B-Instruct"],  # 新增 Silicon 模型选项
+    "tencent": []  # 腾讯云翻译不需要选择模型
+}
+
+# 语言映射
+LANGUAGES = {
+    "英语": "en",
+    "中文(简体)": "zh-CN",
+    "中文(繁体)": "zh-TW",
+    "日语": "ja",
+    "韩语": "ko",
+    "法语": "fr",
+    "德语": "de",
+    "西班牙语": "es",
+    "俄语": "ru"
+}
+
+# 不需要API密钥的服务
+KEYLESS_SERVICES = ["google", "bing", "argos"]
+
+
+def is_url(file_path):
+    return file_path.startswith(("http://", "https://"))
+
+
+def default_output_dir(file_path):
+    """默认输出目录：本地文件为其所在目录下的translated子文件夹，URL为当前工作目录下的translated"""
+    if file_path and not is_url(file_path):
+        return os.path.join(os.path.dirname(file_path), "translated")
+    return os.path.join(os.getcwd(), "translated")
+
+
+_UNSAFE_FILE_CHARS = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+def url_file_name(url):
+    """
+    URL 对应的本地文件名：取路径的最后一段并统一以 .pdf 结尾
+
+    保留其中的点，例如 https://arxiv.org/pdf/2401.01234 对应 2401.01234.pdf。
+    下载缓存使用同一文件名，因此下载前后推断的输出文件名一致。
+    """
+    path = urllib.parse.urlsplit(url).path.rstrip("/")
+    name = _UNSAFE_FILE_CHARS.sub("_", urllib.parse.unquote(os.path.basename(path))).strip("._")
+    if not name:
+        name = "translated"
+    if not name.lower().endswith(".pdf"):
+        name += ".pdf"
+    return name
+
+
+def output_paths(params):
+    """根据任务参数推断 pdf2zh 生成的单语版与双语版文件路径，多语言任务的文件名带语言代码"""
+    file_path = params["file_path"]
+    if is_url(file_path):
+        file_path = url_file_name(file_path)
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    if params.get("output_lang"):
+        base_name = f"{base_name}-{params['output_lang']}"
+
+    output_dir = params["output_dir"]
+    mono_path = os.path.join(output_dir, f"{base_name}-mono.pdf")
+    dual_path = os.path.join(output_dir, f"{base_name}-dual.pdf")
+    return mono_path, dual_path
+
+
+# 任务完成后保留的输出文件
+OUTPUT_VARIANTS = {
+    "both": "单语版和双语版",
+    "mono": "仅单语版",
+    "dual": "仅双语版",
+}
+
+
+def kept_output_paths(params):
+    """
+    任务完成后保留的 (单语版, 双语版) 路径，按 output_variant 不保留的一项为空字符串
+
+    增量模式需要上一版本的两份结果，始终保留两者。
+    """
+    mono_path, dual_path = output_paths(params)
+    variant = params.get("output_variant") or "both"
+    if params.get("incremental"):
+        variant = "both"
+    return (mono_path if variant != "dual" else "", dual_path if variant != "mono" else "")
+
+
+def find_pdfs(folder):
+    """递归查找文件夹中的待翻译PDF，跳过translated目录和已有的翻译结果"""
+    pdfs = []
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if d != "translated")
+        for name in sorted(files):
+            lower = name.lower()
+            if not lower.endswith(".pdf"):
+                continue
+            if lower.endswith(("-mono.pdf", "-dual.pdf")):
+                continue
+            pdfs.append(os.path.join(root, name))
+    return pdfs
+
+
+def build_command(params):
+    """根据任务参数构建 pdf2zh 命令行"""
+    command = ["pdf2zh"]
+
+    # 文件或URL
+    if params["file_path"]:
+        command.append(params["file_path"])
+
+    # 翻译服务和模型
+    if params["service"]:
+        if params["model"]:
+            command.extend(["-s", f"{params['service']}:{params['model']}"])
+        else:
+            command.extend(["-s", params["service"]])
+
+    # 语言设置
+    if params["source_lang"]:
+        command.extend(["-li", params["source_lang"]])
+    if params["target_lang"]:
+        command.extend(["-lo", params["target_lang"]])
+
+    # 线程数
+    if params["threads"] > 0:
+        command.extend(["-t", str(params["threads"])])
+
+    # 输出目录
+    if params["output_dir"]:
+        command.extend(["-o", params["output_dir"]])
+
+    # 特定页面
+    if params["pages"]:
+        command.extend(["-p", params["pages"]])
+
+    # 兼容模式
+    if params["compatible_mode"]:
+        command.append("-cp")
+
+    # 跳过字体子集化
+    if params["skip_subset_fonts"]:
+        command.append("--skip-subset-fonts")
+
+    # 不使用 pdf2zh 自带的段落缓存
+    if params.get("ignore_cache"):
+        command.append("--ignore-cache")
+
+    return command
+
+
+def service_env(params):
+    """根据任务参数生成翻译服务需要的环境变量"""
+    env = {}
+    if params["api_key"]:
+        service_upper = params["service"].upper().replace("-", "_")
+        env[f"{service_upper}_API_KEY"] = params["api_key"]
+
+        # 特殊处理OpenAI和其他服务
+        if params["service"] == "openai":
+            env["OPENAI_API_KEY"] = params["api_key"]
+        elif params["service"] == "azure-openai":
+            env["AZURE_OPENAI_API_KEY"] = params["api_key"]
+        elif params["service"] == "deepseek":
+            env["DEEPSEEK_API_KEY"] = params["api_key"]
+        elif params["service"] == "silicon":
+            env["SILICON_API_KEY"] = params["api_key"]
+        elif params["service"] == "tencent":
+            env["TENCENTCLOUD_SECRET_ID"] = params["api_key"]
+            env["TENCENTCLOUD_SECRET_KEY"] = params["api_url"]  # 腾讯云使用API URL字段作为SECRET_KEY
+
+    if params["api_url"] and params["service"] in ["openai", "azure-openai", "xinference", "ollama"]:
+        if params["service"] == "openai":
+            env["OPENAI_BASE_URL"] = params["api_url"]
+        elif params["service"] == "azure-openai":
+            env["AZURE_OPENAI_BASE_URL"] = params["api_url"]
+        elif params["service"] == "xinference":
+            env["XINFERENCE_HOST"] = params["api_url"]
+        elif params["service"] == "ollama":
+            env["OLLAMA_HOST"] = params["api_url"]
+
+    # 如果有选择模型，设置对应环境变量
+    if params["model"] and params["service"] in ["openai", "azure-openai", "deepseek", "zhipu", "modelscope", "ollama", "xinference", "gemini", "silicon"]:
+        service_upper = params["service"].upper().replace("-", "_")
+        env[f"{service_upper}_MODEL"] = params["model"]
+
+    return env
+
+
+def launcher_available():
+    """翻译记忆和用量计量需要在当前 Python 环境中导入 pdf2zh"""
+    return not getattr(sys, "frozen", False) and importlib.util.find_spec("pdf2zh") is not None
+
+
+def build_launch_command(params):
+    """实际启动的命令：能导入 pdf2zh 时通过 launcher.py 在同一环境中运行，以启用翻译记忆和用量计量"""
+    command = build_command(params)
+    if launcher_available():
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "launcher.py")
+        command = [sys.executable, script] + command[1:]
+    return command
+
+
+def build_env(params):
+    """当前进程环境变量加上翻译服务相关的环境变量"""
+    env = os.environ.copy()
+    env.update(service_env(params))
+    if params.get("translation_memory"):
+        env[MEMORY_ENV] = params["translation_memory"]
+        env[MEMORY_MAX_ENV] = str(params.get("translation_memory_entries", DEFAULT_MAX_ENTRIES))
+    if params.get("layout_cache"):
+        env[LAYOUT_CACHE_ENV] = params["layout_cache"]
+    return env
+
+
+def parse_pages(pages):
+    """将 "1-3,5" 形式的页面范围转换为 pdf2zh 使用的从0开始的页码列表"""
+    if not pages:
+        return None
+    result = []
+    for part in pages.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            result.extend(range(int(start) - 1, int(end)))
+        else:
+            result.append(int(part) - 1)
+    return result
+
+
+def service_display_name(service_code):
+    for name, code in TRANSLATION_SERVICES.items():
+        if code == service_code:
+            return name
+    return service_code
+
+
+def provider_label(params):
+    """服务显示名称加模型"""
+    name = service_display_name(params["service"])
+    return f"{name} {params['model']}" if params.get("model") else name
+
+
+# 任务的 CPU 亲和性，如 "0-3,6"
+CPU_LIST_PATTERN = re.compile(r'^\s*\d+(\s*-\s*\d+)?(\s*,\s*\d+(\s*-\s*\d+)?)*\s*$')
+
+
+def validate_params(params):
+    """检查必填参数（包括备用服务），返回错误提示，参数有效时返回 None"""
+    for index, route in enumerate([params] + list(params.get("fallbacks") or [])):
+        prefix = f"备用服务 {index}: " if index else ""
+        if route["service"] == "tencent" and not route.get("api_url"):
+            return prefix + "使用腾讯云翻译时，需要填写Secret Key"
+        if route["service"] not in KEYLESS_SERVICES and not route.get("api_key"):
+            return prefix + f"{service_display_name(route['service'])} 需要API密钥，请填写"
+    if params.get("cpu_affinity") and not CPU_LIST_PATTERN.match(params["cpu_affinity"]):
+        return f"CPU 列表格式不正确: {params['cpu_affinity']}（示例: 0-3,6）"
+    return None
+
+
+def normalize_route(route):
+    """备用服务配置项：服务可以是显示名称或代码"""
+    service = route.get("service", "google")
+    service = TRANSLATION_SERVICES.get(service, service)
+    if service not in TRANSLATION_SERVICES.values():
+        raise ValueError(f"未知的翻译服务: {service}")
+    model = route.get("model", "")
+    if not MODEL_OPTIONS.get(service):
+        model = ""
+    return {"service": service, "model": model,
+            "api_key": route.get("api_key", "").strip(), "api_url": route.get("api_url", "").strip()}
+
+
+def params_from_config(config):
+    """
+    把界面“保存配置”生成的 JSON 转换为任务参数（不含文件与输出目录）
+
+    服务和语言既可以是界面上的显示名称，也可以直接写 pdf2zh 使用的代码。
+    """
+    service = config.get("service", "google")
+    service = TRANSLATION_SERVICES.get(service, service)
+    if service not in TRANSLATION_SERVICES.values():
+        raise ValueError(f"未知的翻译服务: {service}")
+
+    model = config.get("model", "")
+    if model == "无需选择模型" or not MODEL_OPTIONS.get(service):
+        model = ""
+
+    output_variant = config.get("output_variant", "both")
+    if output_variant not in OUTPUT_VARIANTS:
+        raise ValueError(f"未知的输出文件设置: {output_variant}（可选 {', '.join(OUTPUT_VARIANTS)}）")
+
+    source_lang = config.get("source_lang", "英语")
+    target_lang = config.get("target_lang", "中文(简体)")
+    return {
+        "service": service,
+        "model": model,
+        "source_lang": LANGUAGES.get(source_lang, source_lang),
+        "target_lang": LANGUAGES.get(target_lang, target_lang),
+        "target_langs": [LANGUAGES.get(lang, lang) for lang in config.get("target_langs", [])],
+        "api_key": config.get("api_key", "").strip(),
+        "api_url": config.get("api_url", "").strip(),
+        "pages": config.get("pages", "").strip(),
+        "threads": int(config.get("threads", 0)),
+        "compatible_mode": bool(config.get("compatible_mode", False)),
+        "skip_subset_fonts": bool(config.get("skip_subset_fonts", False)),
+        "shard_size": int(config.get("shard_size", 0)),
+        "shard_parallel": int(config.get("shard_parallel", 4)),
+        "checkpoint": bool(config.get("checkpoint", False)),
+        "incremental": bool(config.get("incremental", False)),
+        "ignore_cache": bool(config.get("ignore_cache", False)),
+        "preflight": bool(config.get("preflight", True)),
+        "translation_memory": (config.get("translation_memory_path") or DEFAULT_MEMORY_PATH
+                               if config.get("translation_memory", False) else ""),
+        "translation_memory_entries": int(config.get("translation_memory_entries", DEFAULT_MAX_ENTRIES)),
+        "fallbacks": [normalize_route(route) for route in config.get("fallbacks", [])],
+        "hedge": bool(config.get("hedge", False)),
+        "memory_limit_mb": int(config.get("job_memory_limit_mb", 0)),
+        "nice": int(config.get("job_nice", 0)),
+        "cpu_affinity": config.get("job_cpu_affinity", "").strip(),
+        "output_variant": output_variant,
+        "optimize_output": bool(config.get("optimize_output", False)),
+        "optimize_linearize": bool(config.get("optimize_linearize", False)),
+    }
+
+
+def setup_console_encoding():
+    """统一控制台与子进程的输出编码为 UTF-8"""
+    if sys.stdout.encoding != 'utf-8':
+        if hasattr(sys.stdout, 'reconfigure'):
+            sys.stdout.reconfigure(encoding='utf-8')
+        elif hasattr(sys.stdout, 'buffer'):
+            sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+
+    os.environ['PYTHONIOENCODING'] = 'utf-8'
+
+
+# 正则表达式匹配进度
+PAGE_PATTERN = re.compile(r'Processing page (\d+) of (\d+)')
+TQDM_PATTERN = re.compile(r'\|\s*(\d+)/(\d+) \[')
+TRANSLATION_PATTERN = re.compile(r'Translating batch (\d+)/(\d+)')
+
+
+class TranslationRunner:
+    """
+    执行单个翻译任务：命中结果缓存时直接复用，否则交给常驻工作进程或 pdf2zh 子进程
+
+    on_log(文本) 与 on_progress(当前页, 总页数) 在执行线程中被调用。传入 router
+    （ProviderRouter）时按主服务和备用服务依次尝试，并在需要时对冲；传入 gateway
+    （LlmGateway）时 pdf2zh 通过本地网关访问 OpenAI 兼容接口、Ollama 和 Xinference。
+    传入 postprocessor（postprocess.OutputProcessor）时成功后处理输出文件（分片和各语言的子任务除外）。
+    调度器抢占时调用 suspend()/resume() 挂起和恢复 pdf2zh 进程。
+    """
+
+    def __init__(self, params, worker_pool=None, result_cache=None, on_log=None, on_progress=None,
+                 concurrency=None, telemetry=None, usage=None, router=None, gateway=None,
+                 postprocessor=None):
+        self.params = params
+        self.process = None
+        self.worker_pool = worker_pool
+        self.result_cache = result_cache
+        self.concurrency = concurrency
+        self.telemetry = telemetry
+        self.usage = usage
+        self.router = router
+        self.gateway = gateway
+        self.postprocessor = postprocessor
+        self.budget_reason = None
+        self.lease = None
+        self.attempt = None
+        self.failover_reason = None
+        self.hedge = None
+        self.attempt_event = threading.Event()
+        self.pages_done = 0
+        self.worker_pid = None
+        self.exit_code = None  # 最近一次 pdf2zh 子进程的返回码，常驻工作进程模式下为 None
+        self.suspended_pid = None
+        self.suspended_at = None
+        self._suspend_lock = threading.Lock()
+        self.on_log = on_log or (lambda message: None)
+        self._on_progress = on_progress or (lambda current, total: None)
+        self.cancel_event = threading.Event()
+
+    def on_progress(self, current, total):
+        if total and current >= total:
+            self.pages_done = total
+        if self.telemetry is not None:
+            self.telemetry.progress(current, total)
+        if self.attempt is not None:
+            self.attempt.progress(current, total)
+        if self.usage is not None:
+            self.usage.progress(current)
+            self.check_budget()
+        self._on_progress(current, total)
+
+    def on_usage(self, counters):
+        """pdf2zh 进程报告的累计用量"""
+        if self.usage is not None:
+            self.usage.update(counters)
+            self.check_budget()
+
+    def observe(self, text):
+        """统计输出中的限流、超时和错误信息"""
+        if self.lease is not None:
+            self.lease.observe(text)
+        if self.attempt is not None:
+            self.attempt.observe(text)
+
+    def check_budget(self):
+        """超出预算时停止任务"""
+        reason = self.usage.check()
+        if reason and self.budget_reason is None:
+            self.budget_reason = reason
+            self.usage.stopped = reason
+            self.on_log(f"{reason}，停止翻译")
+            self.stop()
+
+    def set_mode(self, mode):
+        if self.telemetry is not None:
+            self.telemetry.set_mode(mode)
+
+    def run(self):
+        """执行任务，返回 (是否成功, 消息)"""
+        success, message = self.run_job()
+        if success and self.postprocessor is not None and "shard_index" not in self.params:
+            self.postprocessor.process(self.params, self.on_log, self.telemetry)
+        if self.telemetry is not None:
+            if self.lease is not None:
+                self.telemetry.extra.update(rate_limited=self.lease.rate_limited,
+                                            timeouts=self.lease.timeouts, errors=self.lease.errors)
+            self.telemetry.finish(success, message)
+        self.finish_usage(success)
+        return success, message
+
+    def finish_usage(self, success):
+        if self.usage is None:
+            return
+        tokens_in, tokens_out = self.usage.tokens()
+        if self.usage.started and tokens_in + tokens_out:
+            source = "计量" if self.usage.metered else "按预检估算"
+            label = provider_label({"service": self.usage.service, "model": self.usage.model})
+            self.on_log(f"用量 ({source}, {label}): "
+                        f"{tokens_in + tokens_out:,} token，约 ${self.usage.cost():.4f}")
+        self.usage.finish(success)
+
+    def run_job(self):
+        try:
+            # 分片任务不重复输出预检摘要
+            if self.params.get("preflight_summary") and "shard_index" not in self.params:
+                self.on_log(f"预检: {self.params['preflight_summary']}")
+
+            # 检查点中已完成的分片无需重新翻译
+            if self.params.get("checkpoint_done") and all(map(os.path.exists, output_paths(self.params))):
+                pages = len(parse_pages(self.params["pages"]) or [])
+                self.on_progress(pages, pages)
+                self.set_mode("checkpoint")
+                self.on_log("分片已在之前的运行中完成，从检查点恢复")
+                return True, "翻译完成 (检查点)"
+
+            # 相同文件和设置已翻译过时直接使用缓存结果；忽略缓存时重新翻译并更新缓存
+            cache_key = None
+            if self.result_cache is not None:
+                cache_key = self.result_cache.make_key(self.params)
+                if (cache_key and not self.params.get("ignore_cache")
+                        and self.result_cache.restore(cache_key, *output_paths(self.params))):
+                    self.set_mode("cache")
+                    self.on_log("命中翻译结果缓存，跳过翻译")
+                    return True, "翻译完成 (缓存)"
+
+            if self.usage is not None:
+                reason = self.usage.check_estimate(len(parse_pages(self.params["pages"]) or []))
+                if reason:
+                    self.usage.stopped = reason
+                    return False, reason
+            job_params = self.params
+            success, message = self.run_routed()
+            if self.budget_reason:
+                success, message = False, self.budget_reason
+
+            if success and cache_key:
+                if provider_key(self.params) != provider_key(job_params):
+                    # 结果由备用服务生成，按实际使用的服务缓存
+                    cache_key = self.result_cache.make_key(self.params)
+                self.result_cache.store(cache_key, *output_paths(self.params))
+            if success and self.params.get("checkpoint_journal"):
+                CheckpointJournal(self.params["checkpoint_journal"]).mark_done(
+                    self.params["shard_index"], *output_paths(self.params))
+            return success, message
+        except Exception as e:
+            return False, f"发生错误: {str(e)}"
+
+    def run_routed(self):
+        """依次尝试主服务和备用服务，返回 (是否成功, 消息)"""
+        routes = self.router.candidates(self.params) if self.router is not None else [self.params]
+        if provider_key(routes[0]) != provider_key(self.params):
+            self.on_log(f"{provider_label(self.params)} 近期失败率过高，先使用 {provider_label(routes[0])}")
+        tried = set()
+        success, message = False, "翻译已取消"
+        for index, params in enumerate(routes):
+            if provider_key(params) in tried:
+                continue
+            if self.cancel_event.is_set() or self.budget_reason:
+                break
+            if tried:
+                self.on_log(f"{message.splitlines()[0]}，切换到备用服务: {provider_label(params)}")
+                if self.usage is not None:
+                    self.finish_usage(False)
+                    self.usage = self.usage.fork(params)
+            tried.add(provider_key(params))
+            spare = [route for route in routes[index + 1:] if provider_key(route) not in tried]
+            success, message = self.run_attempt(params, spare)
+            if self.hedge is not None:
+                tried.add(provider_key(self.hedge.params))
+            if success or self.cancel_event.is_set() or self.budget_reason:
+                break
+        return success, message
+
+    def run_attempt(self, params, spare):
+        """使用一个服务翻译，spare 为可用于切换或对冲的其余服务"""
+        self.params = params
+        self.attempt = None
+        self.failover_reason = None
+        self.hedge = None
+        self.attempt_event = threading.Event()
+        if not self.acquire_threads():
+            return False, "翻译已取消"
+        if self.usage is not None:
+            self.usage.started = True
+        if self.router is not None:
+            expected_pages = len(parse_pages(self.params["pages"]) or []) or \
+                (self.params.get("estimate") or {}).get("pages", 0)
+            self.attempt = self.router.start(self.params, expected_pages)
+        done = threading.Event()
+        if self.attempt is not None and spare:
+            threading.Thread(target=self.watch_attempt, args=(self.attempt, spare[0], done), daemon=True).start()
+        success = False
+        try:
+            if self.cancel_event.is_set():
+                success, message = False, "翻译已取消"
+            elif self.worker_pool is not None:
+                success, message = self.run_in_pool()
+            else:
+                success, message = self.run_subprocess()
+        finally:
+            done.set()
+            self.release_threads(success)
+        if self.failover_reason:
+            success, message = False, self.failover_reason
+
+        hedge = self.hedge
+        hedge_won = hedge is not None and hedge.settle(success)
+        if self.attempt is not None:
+            if hedge_won or self.cancel_event.is_set() or self.budget_reason:
+                result = None
+            else:
+                result = success
+            self.router.finish(self.attempt, result, message, failover=bool(self.failover_reason),
+                               hedge=hedge is not None, hedge_won=hedge_won)
+        if hedge_won:
+            # 只换成对冲使用的服务，输出目录、检查点和分片序号仍按主任务
+            self.params = dict(self.params, **{key: hedge.params.get(key, "") for key in ROUTE_KEYS})
+            self.on_progress(hedge.runner.pages_done, hedge.runner.pages_done)
+            return True, f"翻译完成 (对冲: {provider_label(hedge.params)})"
+        if hedge is not None and not success and not hedge.cancelled:
+            message = f"{message}\n对冲 ({provider_label(hedge.params)}): {hedge.message}"
+        return success, message
+
+    def watch_attempt(self, attempt, spare, done):
+        """运行期间检查是否需要切换服务或启动对冲"""
+        while not done.wait(1.0):
+            if self.hedge is not None or self.suspended_at is not None:
+                continue
+            if self.params.get("hedge") and self.router.should_hedge(attempt):
+                self.on_log(f"{provider_label(attempt.params)} 慢于预期，同时使用 {provider_label(spare)} 翻译")
+                self.hedge = HedgedRun(self, spare)
+                self.hedge.start()
+                continue
+            reason = self.router.check(attempt)
+            if reason:
+                self.failover_reason = f"{provider_label(attempt.params)} {reason}"
+                self.stop_attempt()
+                return
+
+    def acquire_threads(self):
+        """按服务的并发额度确定本任务的线程数，等待期间被取消时返回 False"""
+        if self.concurrency is None:
+            return True
+        if self.telemetry is not None:
+            self.telemetry.enter("wait")
+        self.lease = self.concurrency.acquire(self.params, self.cancel_event)
+        if self.lease is None:
+            return False
+        self.params = dict(self.params, threads=self.lease.threads)
+        if self.telemetry is not None:
+            self.telemetry.set_threads(self.lease.threads)
+            self.telemetry.enter("startup")
+        mode = "自适应" if self.lease.adaptive else "手动"
+        self.on_log(f"线程数: {self.lease.threads} ({mode})")
+        return True
+
+    def release_threads(self, success):
+        if self.lease is None:
+            return
+        note = self.lease.release(success, self.pages_done)
+        if note:
+            self.on_log(f"调整并发: {note}")
+
+    def run_subprocess(self):
+        """启动 pdf2zh 子进程翻译，返回 (是否成功, 消息)"""
+        command = build_launch_command(self.params)
+        env = build_env(self.params)
+        if self.gateway is not None:
+            self.gateway.apply(self.params, env)
+        if self.params.get("translation_memory") and command[0] == "pdf2zh":
+            self.on_log("当前 Python 环境中找不到 pdf2zh，本任务不使用翻译记忆 (可改用常驻工作进程模式)")
+
+        # 显示命令
+        command_str = " ".join(command)
+        self.on_log(f"执行命令: {command_str}")
+
+        # 执行命令，以二进制方式读取，由输出管道负责解码
+        self.process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env
+        )
+        process = self.process
+        if self.telemetry is not None:
+            self.telemetry.attach_process(process.pid)
+        pipeline = OutputPipeline(process)
+
+        # 同时读取 stdout 和 stderr，进度可能来自任意一个流
+        for line in pipeline.lines():
+            usage_match = USAGE_PATTERN.search(line.text)
+            if usage_match:
+                self.on_usage(json.loads(usage_match.group(1)))
+                continue
+            self.on_log(line.format())
+
+            # 解析进度
+            page_match = PAGE_PATTERN.search(line.text) or TQDM_PATTERN.search(line.text)
+            if page_match:
+                current_page = int(page_match.group(1))
+                total_pages = int(page_match.group(2))
+                self.on_progress(current_page, total_pages)
+                continue
+
+            # 统计限流、超时等信息，用于调整后续任务的并发和切换服务
+            self.observe(line.text)
+
+            # 翻译批次进度
+            trans_match = TRANSLATION_PATTERN.search(line.text)
+            if trans_match:
+                current_batch, total_batches = int(trans_match.group(1)), int(trans_match.group(2))
+                if self.telemetry is not None:
+                    self.telemetry.batch(current_batch, total_batches)
+                if current_batch == 1:
+                    self.on_log(f"共有 {total_batches} 个翻译批次需要处理")
+                continue
+
+        # 获取返回码
+        return_code = process.wait()
+        self.exit_code = return_code
+
+        if return_code == 0:
+            return True, "翻译完成"
+        return False, f"翻译失败: {pipeline.tail(stream=STDERR)}"
+
+    def run_in_pool(self):
+        """在常驻工作进程中翻译，省去每篇文档的启动和模型加载开销"""
+        service = self.params["service"]
+        if self.params["model"]:
+            service = f"{service}:{self.params['model']}"
+        env = service_env(self.params)
+        if self.gateway is not None:
+            self.gateway.apply(self.params, env)
+        request = dict(self.params, service=service, env=env)
+
+        self.set_mode("pool")
+        self.on_log(f"使用常驻工作进程翻译: {self.params['file_path']}")
+        try:
+            return self.worker_pool.run(request, self.handle_worker_event, self.attempt_event)
+        finally:
+            self.worker_pid = None
+
+    def handle_worker_event(self, kind, *args):
+        if kind == "progress":
+            self.on_progress(*args)
+        elif kind == "usage":
+            self.on_usage(args[0])
+        elif kind == "pid":
+            self.worker_pid = args[0]
+            if self.telemetry is not None:
+                self.telemetry.attach_process(args[0], existing=True)
+        elif kind == "log":
+            self.on_log(args[0])
+            self.observe(args[0])
+
+    def running_pid(self):
+        process = self.process
+        if process is not None and process.poll() is None:
+            return process.pid
+        return self.worker_pid
+
+    def suspend(self):
+        """挂起正在运行的翻译进程（包括对冲），返回是否成功；进程尚未启动时返回 False"""
+        with self._suspend_lock:
+            if not SUSPEND_SUPPORTED or self.suspended_at is not None or self.cancel_event.is_set():
+                return False
+            pid = self.running_pid()
+            if pid is None:
+                return False
+            try:
+                os.kill(pid, signal.SIGSTOP)
+            except OSError:
+                return False
+            self.suspended_pid = pid
+            self.suspended_at = time.time()
+        # 挂起期间归还并发额度，耗时统计和服务切换检查不计挂起时间
+        if self.lease is not None:
+            self.lease.suspend()
+        if self.telemetry is not None:
+            self.telemetry.suspend()
+        hedge = self.hedge
+        if hedge is not None:
+            hedge.runner.suspend()
+        self.on_log("任务被挂起，让位于更重要的任务")
+        return True
+
+    def resume(self):
+        with self._suspend_lock:
+            if self.suspended_at is None:
+                return
+            paused = time.time() - self.suspended_at
+            self.suspended_at = None
+            try:
+                os.kill(self.suspended_pid, signal.SIGCONT)
+            except OSError:
+                pass
+        if self.lease is not None:
+            self.lease.resume()
+        if self.telemetry is not None:
+            self.telemetry.resume()
+        if self.attempt is not None:
+            self.attempt.exclude(paused)
+        hedge = self.hedge
+        if hedge is not None:
+            hedge.runner.resume()
+        if not self.cancel_event.is_set():
+            self.on_log(f"恢复翻译 (挂起 {paused:.0f} 秒)")
+
+    def stop_attempt(self):
+        """停止当前服务的翻译，任务本身继续（切换服务或对冲已胜出）"""
+        # 挂起的进程收不到终止信号，先恢复
+        self.resume()
+        self.attempt_event.set()
+        process = self.process
+        if process:
+            process.terminate()
+            self.process = None
+
+    def stop(self):
+        self.cancel_event.set()
+        self.stop_attempt()
+        hedge = self.hedge
+        if hedge is not None:
+            hedge.cancel()
+
+
+class HedgedRun:
+    """
+    对冲：用备用服务把同一任务翻译到临时目录
+
+    先完成的一方胜出：对冲先成功时停止主服务并把结果移到输出目录，主服务先成功时取消对冲。
+    """
+
+    def __init__(self, owner, params):
+        self.owner = owner
+        self.output_dir = os.path.join(owner.params["output_dir"], f".hedge-{os.getpid()}-{id(self):x}")
+        self.params = dict(params, output_dir=self.output_dir, fallbacks=[], hedge=False,
+                           checkpoint_journal="", checkpoint_done=False)
+        usage = owner.usage.fork(self.params) if owner.usage is not None else None
+        if usage is not None:
+            usage.started = True
+        self.runner = TranslationRunner(
+            self.params, on_log=lambda message: owner.on_log(f"[对冲] {message}"),
+            concurrency=owner.concurrency, usage=usage, router=owner.router, gateway=owner.gateway)
+        self.success = False
+        self.message = ""
+        self.cancelled = False
+        self.won = False
+        self._lock = threading.Lock()
+        self._owner_done = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._thread.start()
+
+    def _run(self):
+        success, message = self.runner.run()
+        with self._lock:
+            self.success, self.message = success, message
+            if success and not self._owner_done:
+                self.won = True
+        if self.won:
+            self.owner.on_log("对冲先完成，停止主服务")
+            self.owner.stop_attempt()
+
+    def cancel(self):
+        self.cancelled = True
+        self.runner.stop()
+
+    def settle(self, owner_success):
+        """主服务结束后调用：返回对冲是否胜出，胜出时把结果移到主任务的输出目录"""
+        with self._lock:
+            self._owner_done = True
+            won = self.won
+        if owner_success and not won:
+            self.cancel()
+        self._thread.join()
+        won = self.won or (not owner_success and self.success and not self.cancelled)
+        try:
+            if won:
+                targets = output_paths(dict(self.params, output_dir=self.owner.params["output_dir"]))
+                for source, target in zip(output_paths(self.params), targets):
+                    os.replace(source, target)
+        finally:
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+        return won
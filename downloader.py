@@ -0,0 +1,335 @@
+"""
+URL 输入的下载缓存
+
+pdf2zh 自己下载 URL 时每次运行都要重新下载，输出文件名也只能从 URL 猜测。这里在任务
+派发之前先把 URL 流式下载到本地缓存（每个 URL 一个目录，文件名由 url_file_name 决定），
+之后按本地文件翻译，因此同一 URL 可以命中翻译结果缓存、使用预检和分片：
+
+- 再次使用时用 ETag / Last-Modified 发送条件请求，服务器返回 304 时直接使用缓存；
+- 下载中断后保留 .part 文件，重试或下次运行时用 Range 请求续传（If-Range 保证文件未变）；
+- 超过单个文件大小上限的下载会被中止，缓存总大小超过上限时按最近使用时间淘汰；
+- 多个下载并发进行（数量有上限），与已下载文件的翻译同时进行。
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import urllib.request
+import urllib.error
+
+from core import is_url, url_file_name
+
+DEFAULT_DOWNLOAD_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdf-translator", "downloads")
+
+CHUNK_SIZE = 256 * 1024
+USER_AGENT = "Mozilla/5.0 (compatible; PDF-Translator)"
+META_NAME = "meta.json"
+
+
+class DownloadError(Exception):
+    pass
+
+
+class DownloadCancelled(DownloadError):
+    pass
+
+
+def _format_mb(size):
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+class DownloadCache:
+    """
+    线程安全的 URL 下载缓存
+
+    max_file_mb：单个文件的大小上限；max_cache_mb：缓存总大小上限；max_concurrent：
+    同时进行的下载数；retries：网络错误时的重试次数（每次从已下载的位置续传）。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_DOWNLOAD_DIR, max_file_mb=200, max_cache_mb=2048,
+                 max_concurrent=3, timeout=60, retries=3):
+        self.cache_dir = cache_dir
+        self.max_file_bytes = max_file_mb * 1024 * 1024
+        self.max_cache_bytes = max_cache_mb * 1024 * 1024
+        self.timeout = timeout
+        self.retries = retries
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrent))
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        self._holds = []  # (缓存目录, released)，released() 返回 True 之前不淘汰该目录
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ---- 缓存目录 ----
+    def entry_dir(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest()[:16])
+
+    def _load_meta(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, META_NAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self, entry_dir, meta):
+        path = os.path.join(entry_dir, META_NAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _url_lock(self, url):
+        """同一 URL 同时只有一个下载，其他任务等待后直接使用结果"""
+        with self._lock:
+            lock = self._url_locks.get(url)
+            if lock is None:
+                lock = self._url_locks[url] = threading.Lock()
+            return lock
+
+    def hold(self, path, released):
+        """path 所在的条目在 released() 返回 True 之前不会被淘汰，用于已下载但还没有翻译完的任务"""
+        with self._lock:
+            self._holds.append((os.path.dirname(path), released))
+
+    def _busy_entries(self):
+        """正在下载或被任务使用的条目"""
+        with self._lock:
+            self._holds = [(entry_dir, released) for entry_dir, released in self._holds if not released()]
+            busy = {entry_dir for entry_dir, _ in self._holds}
+            busy.update(self.entry_dir(url) for url, lock in self._url_locks.items() if lock.locked())
+        return busy
+
+    def cached_path(self, url):
+        """已完整下载的本地文件，没有时返回 None（不检查服务器上是否有更新）"""
+        entry_dir = self.entry_dir(url)
+        meta = self._load_meta(entry_dir)
+        path = os.path.join(entry_dir, url_file_name(url))
+        return path if meta.get("complete") and os.path.exists(path) else None
+
+    # ---- 下载 ----
+    def fetch(self, url, cancel_event=None, on_progress=None):
+        """
+        返回 (本地路径, 状态)，状态为 "downloaded"、"not_modified" 或 "offline"（无法连接服务器，
+        使用之前下载的文件）。on_progress(已下载字节数, 总字节数或0) 在下载线程中被调用。
+        """
+        with self._url_lock(url):
+            while not self._slots.acquire(timeout=0.2):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise DownloadCancelled("下载已取消")
+            try:
+                return self._fetch(url, cancel_event, on_progress or (lambda done, total: None))
+            finally:
+                self._slots.release()
+
+    def _fetch(self, url, cancel_event, on_progress):
+        entry_dir = self.entry_dir(url)
+        os.makedirs(entry_dir, exist_ok=True)
+        meta = self._load_meta(entry_dir)
+        path = os.path.join(entry_dir, url_file_name(url))
+        part_path = path + ".part"
+        cached = meta.get("complete") and os.path.exists(path)
+
+        error = None
+        for attempt in range(self.retries):
+            if cancel_event is not None and cancel_event.is_set():
+                raise DownloadCancelled("下载已取消")
+            headers = {"User-Agent": USER_AGENT, "Accept": "application/pdf,*/*"}
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if offset and (meta.get("partial_etag") or meta.get("partial_last_modified")):
+                # 续传，文件已变化时服务器会返回完整内容
+                headers["Range"] = f"bytes={offset}-"
+                headers["If-Range"] = meta.get("partial_etag") or meta["partial_last_modified"]
+            else:
+                offset = 0
+                if cached and meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if cached and meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+            try:
+                response = urllib.request.urlopen(urllib.request.Request(url, headers=headers),
+                                                  timeout=self.timeout)
+            except urllib.error.HTTPError as e:
+                if e.code == 304 and cached:
+                    meta["checked_at"] = time.time()
+                    self._save_meta(entry_dir, meta)
+                    os.utime(path)
+                    return path, "not_modified"
+                if e.code == 416 and offset:
+                    # 续传位置无效，重新下载
+                    os.remove(part_path)
+                    continue
+                if e.code >= 500 or e.code == 429:
+                    error = f"HTTP {e.code}"
+                    self._backoff(attempt)
+                    continue
+                raise DownloadError(f"下载失败: HTTP {e.code} {e.reason}")
+            except (urllib.error.URLError, OSError) as e:
+                error = str(getattr(e, "reason", e))
+                if cached and not offset:
+                    # 无法连接服务器时直接使用之前下载的文件
+                    break
+                self._backoff(attempt)
+                continue
+
+            try:
+                with response:
+                    self._receive(response, url, meta, entry_dir, part_path, offset,
+                                  cancel_event, on_progress)
+            except (OSError, urllib.error.URLError) as e:
+                # 连接中断，保留已下载的部分，下一次循环续传
+                error = str(getattr(e, "reason", e))
+                continue
+
+            self._check_pdf(part_path)
+            os.replace(part_path, path)
+            meta.update(url=url, name=os.path.basename(path), complete=True, size=os.path.getsize(path),
+                        fetched_at=time.time(), checked_at=time.time(),
+                        etag=meta.pop("partial_etag", ""), last_modified=meta.pop("partial_last_modified", ""))
+            self._save_meta(entry_dir, meta)
+            self.prune(keep=entry_dir)
+            return path, "downloaded"
+
+        if cached:
+            return path, "offline"
+        raise DownloadError(f"下载失败: {error}")
+
+    def _backoff(self, attempt):
+        if attempt + 1 < self.retries:
+            time.sleep(min(2 ** attempt, 10))
+
+    def _receive(self, response, url, meta, entry_dir, part_path, offset, cancel_event, on_progress):
+        """把响应写入 .part 文件，206 时追加，否则从头写"""
+        if response.status != 206:
+            offset = 0
+        length = response.headers.get("Content-Length")
+        total = offset + int(length) if length and length.isdigit() else 0
+        if total > self.max_file_bytes:
+            raise DownloadError(f"文件大小 {_format_mb(total)} 超过上限 {_format_mb(self.max_file_bytes)}")
+        # 记录用于续传和条件请求的校验信息
+        meta["partial_etag"] = response.headers.get("ETag", "")
+        meta["partial_last_modified"] = response.headers.get("Last-Modified", "")
+        meta["complete"] = meta.get("complete", False)
+        self._save_meta(entry_dir, meta)
+
+        received = offset
+        with open(part_path, "ab" if offset else "wb") as f:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise DownloadCancelled("下载已取消")
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if received > self.max_file_bytes:
+                    f.close()
+                    os.remove(part_path)
+                    raise DownloadError(f"文件超过大小上限 {_format_mb(self.max_file_bytes)}")
+                f.write(chunk)
+                on_progress(received, total)
+        if total and received < total:
+            raise OSError(f"连接中断 ({_format_mb(received)}/{_format_mb(total)})")
+
+    @staticmethod
+    def _check_pdf(path):
+        with open(path, "rb") as f:
+            head = f.read(1024)
+        if b"%PDF" not in head:
+            os.remove(path)
+            raise DownloadError("下载的内容不是 PDF（可能需要登录或该链接指向网页）")
+
+    # ---- 淘汰 ----
+    def prune(self, keep=None):
+        """缓存总大小超过上限时按最近使用时间删除最旧的条目，正在下载或使用中的条目除外"""
+        busy = self._busy_entries()
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            size, used = 0, 0.0
+            try:
+                file_names = os.listdir(entry_dir)
+            except OSError:
+                # 不是目录，或已被另一次淘汰删除
+                continue
+            for file_name in file_names:
+                try:
+                    stat = os.stat(os.path.join(entry_dir, file_name))
+                except OSError:
+                    # 其他下载刚把 .part 或 meta.json.tmp 替换为正式文件
+                    continue
+                size += stat.st_size
+                used = max(used, stat.st_mtime)
+            entries.append((used, size, entry_dir))
+            total += size
+        for used, size, entry_dir in sorted(entries):
+            if total <= self.max_cache_bytes:
+                break
+            if entry_dir == keep or entry_dir in busy:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+
+class _DownloadHandle:
+    def __init__(self):
+        self.cancel_event = threading.Event()
+
+    def stop(self):
+        self.cancel_event.set()
+
+
+class UrlPreparer:
+    """
+    调度器的 preparer：URL 任务加入队列后在后台线程中下载，完成后把 file_path 换成本地文件
+
+    原 URL 保存在 params["source_url"]。call(函数, *参数) 决定回调在哪个线程执行，
+    图形界面用它把回调转到主线程；on_log(任务, 文本) 接收下载日志。
+    """
+
+    def __init__(self, cache, on_log=None, call=None):
+        self.cache = cache
+        self.on_log = on_log or (lambda job, message: None)
+        self.call = call or (lambda function, *args: function(*args))
+
+    def __call__(self, job, done, report):
+        url = job.params.get("file_path", "")
+        if not is_url(url):
+            return None
+        handle = _DownloadHandle()
+        thread = threading.Thread(target=self._download, args=(job, url, handle, done, report), daemon=True)
+        thread.start()
+        return handle
+
+    def _download(self, job, url, handle, done, report):
+        last_report = [0.0]
+
+        def on_progress(received, total):
+            now = time.time()
+            if now - last_report[0] < 0.5:
+                return
+            last_report[0] = now
+            text = f"下载中 {_format_mb(received)}" + (f" / {_format_mb(total)}" if total else "")
+            self.call(report, text)
+
+        self.call(report, "等待下载")
+        try:
+            started = time.time()
+            path, status = self.cache.fetch(url, handle.cancel_event, on_progress)
+        except DownloadCancelled:
+            return
+        except Exception as e:
+            self.call(done, f"{str(e)}\n{url}")
+            return
+        job.params["source_url"] = url
+        job.params["file_path"] = path
+        # 任务可能还要排队一段时间，翻译结束前文件不能被其他下载淘汰
+        self.cache.hold(path, lambda: job.finished)
+        size = _format_mb(os.path.getsize(path))
+        if status == "downloaded":
+            message = f"已下载 {url} ({size}，{time.time() - started:.1f} 秒)"
+        elif status == "not_modified":
+            message = f"{url} 未变化，使用下载缓存 ({size})"
+        else:
+            message = f"无法连接 {url}，使用之前下载的文件 ({size})"
+        self.call(self.on_log, job, message)
+        self.call(done, None)
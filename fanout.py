@@ -0,0 +1,133 @@
+"""
+多目标语言任务
+
+一篇文档同时翻译为多种语言时，ShardPlanner 把任务展开为每种语言一个子任务：预检只在
+父任务上做一次，各语言由调度器并发执行，并共用版面检测缓存（见 layout_cache），每页
+只检测一次。子任务的输出写在临时目录中，全部完成后由 FanoutRunner 按语言重命名为
+{base_name}-{语言}-mono.pdf / {base_name}-{语言}-dual.pdf，互不覆盖。
+
+多语言任务不再按页分片，也不使用增量模式。
+"""
+import os
+import shutil
+import hashlib
+
+from core import LANGUAGES, output_paths
+from layout_cache import DEFAULT_LAYOUT_DIR
+
+FANOUT_DIR_NAME = ".fanout"
+
+
+def language_name(code):
+    for name, value in LANGUAGES.items():
+        if value == code:
+            return name
+    return code
+
+
+def target_languages(params):
+    """去重后的目标语言代码列表，不足两种时返回空列表（按普通任务处理）"""
+    languages = []
+    for lang in params.get("target_langs") or []:
+        code = LANGUAGES.get(lang, lang)
+        if code and code not in languages:
+            languages.append(code)
+    return languages if len(languages) > 1 else []
+
+
+def parse_languages(text):
+    """把 "zh-CN,ja,韩语" 形式的列表转换为语言代码列表"""
+    languages = []
+    for part in text.replace("，", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if part not in LANGUAGES and part not in LANGUAGES.values():
+            raise ValueError(f"未知的目标语言: {part}")
+        languages.append(LANGUAGES.get(part, part))
+    return languages
+
+
+def fanout_dir(params):
+    """各语言中间结果的临时目录"""
+    mono_path = output_paths(dict(params, output_lang=""))[0]
+    base_name = os.path.splitext(os.path.basename(mono_path))[0][:-len("-mono")]
+    digest = hashlib.sha1(repr((params["file_path"], target_languages(params))).encode("utf-8")).hexdigest()[:10]
+    return os.path.join(params["output_dir"], FANOUT_DIR_NAME, f"{base_name}-{digest}")
+
+
+def expand_languages(params):
+    """
+    为每种目标语言生成子任务，不是多语言任务时返回 None
+
+    父任务的 target_lang 和 output_lang 设为第一种语言，output_paths(父任务) 即该语言的输出。
+    """
+    languages = target_languages(params)
+    if not languages:
+        return None
+    params["target_lang"] = languages[0]
+    params["output_lang"] = languages[0]
+    root = fanout_dir(params)
+    children = []
+    for index, lang in enumerate(languages):
+        child = dict(
+            params,
+            target_lang=lang,
+            target_langs=[],
+            output_lang="",
+            output_dir=os.path.join(root, lang),
+            shard_size=0,
+            shard_index=index,
+            shard_label=language_name(lang),
+            checkpoint=False,
+            incremental=False,
+            layout_cache=params.get("layout_cache") or DEFAULT_LAYOUT_DIR,
+        )
+        child.pop("reuse", None)
+        children.append(child)
+    return children
+
+
+class FanoutRunner:
+    """把各语言子任务的结果移动到最终位置的任务，接口与 TranslationRunner 相同"""
+
+    def __init__(self, params, language_params, on_log=None, telemetry=None, postprocessor=None):
+        self.params = params
+        self.language_params = sorted(language_params, key=lambda p: p["shard_index"])
+        self.telemetry = telemetry
+        self.postprocessor = postprocessor
+        self.on_log = on_log or (lambda message: None)
+
+    def run(self):
+        if self.telemetry is not None:
+            self.telemetry.set_mode("fanout")
+        success, message = self.collect()
+        if success and self.postprocessor is not None:
+            self.postprocessor.process(self.params, self.on_log, self.telemetry)
+        if self.telemetry is not None:
+            self.telemetry.extra["languages"] = len(self.language_params)
+            self.telemetry.finish(success, message)
+        return success, message
+
+    def collect(self):
+        try:
+            os.makedirs(self.params["output_dir"], exist_ok=True)
+            names = []
+            for child in self.language_params:
+                lang = child["target_lang"]
+                for source, target in zip(output_paths(child), output_paths(dict(self.params, output_lang=lang))):
+                    os.replace(source, target)
+                names.append(language_name(lang))
+            self.on_log(f"已生成 {len(names)} 种语言的翻译结果: {', '.join(names)}")
+            root = fanout_dir(self.params)
+            shutil.rmtree(root, ignore_errors=True)
+            try:
+                os.rmdir(os.path.dirname(root))
+            except OSError:
+                pass
+            return True, f"翻译完成 ({len(names)} 种语言)"
+        except Exception as e:
+            return False, f"整理多语言结果失败: {str(e)}"
+
+    def stop(self):
+        pass
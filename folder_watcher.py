@@ -0,0 +1,378 @@
+"""
+监视文件夹
+
+监视一个或多个输入目录（含子目录），新出现的 PDF 写入完成后自动交给任务队列。
+Linux 上通过 ctypes 使用 inotify，空闲时不消耗资源；其他系统或 inotify 不可用时退回
+轮询，但只检查目录自身的修改时间，只重新列出发生变化的目录，不会反复扫描整棵目录树。
+
+以下文件会被跳过：翻译结果（-mono/-dual）、translated 目录中的文件、输出文件已存在
+的文件，以及内容哈希已经处理过的文件（记录在 watch-processed.jsonl 中）。
+"""
+import os
+import json
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from collections import deque
+
+from core import default_output_dir, output_paths
+from result_cache import file_digest
+
+DEFAULT_STATE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "pdf-translator", "watch-processed.jsonl")
+
+# 不进入的目录
+SKIP_DIRS = ("translated", ".shards", ".fanout")
+
+# inotify 事件
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+               | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_candidate(path):
+    """是否为需要翻译的 PDF（跳过翻译结果）"""
+    lower = os.path.basename(path).lower()
+    return lower.endswith(".pdf") and not lower.endswith(("-mono.pdf", "-dual.pdf"))
+
+
+def _has_pdf_trailer(path):
+    """PDF 文件末尾应有 %%EOF，复制到一半的文件通常没有"""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - 2048))
+            return b"%%EOF" in f.read()
+    except OSError:
+        return False
+
+
+class _Inotify:
+    """通过 ctypes 调用 libc 的 inotify 接口"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.paths = {}  # wd -> 目录
+
+    def add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"无法监视 {path}: {os.strerror(error)}")
+        self.paths[wd] = path
+        return wd
+
+    def read_events(self):
+        """读取当前可用的事件，返回 [(目录, 文件名, mask), ...]"""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                directory = self.paths.get(wd)
+                if mask & IN_IGNORED:
+                    self.paths.pop(wd, None)
+                events.append((directory, os.fsdecode(name), mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    监视目录并在新的 PDF 写入完成后提供给调用方
+
+    文件大小和修改时间保持 settle_seconds 不变且末尾有 %%EOF 后才视为写入完成。
+    take_ready() 返回 [(文件路径, 内容哈希), ...]；任务成功后调用 mark_processed()，
+    以后不再处理相同内容的文件。output_dir_for(文件路径) 给出输出目录，用于判断
+    翻译结果是否已存在。
+    """
+
+    def __init__(self, directories, output_dir_for=default_output_dir, settle_seconds=2.0,
+                 poll_interval=2.0, state_file=DEFAULT_STATE_FILE, use_inotify=True,
+                 include_existing=True, on_log=None):
+        self.directories = [os.path.abspath(path) for path in directories]
+        self.output_dir_for = output_dir_for
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.state_file = state_file
+        self.include_existing = include_existing
+        self.on_log = on_log or (lambda message: None)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify = None
+        self._use_inotify = use_inotify
+        self._dir_mtimes = {}  # 轮询模式：目录 -> 修改时间
+        self._dir_entries = {}  # 轮询模式：目录 -> 已知的 PDF 文件名
+        self._pending = {}  # 文件 -> [大小, 修改时间, 开始稳定的时间, 首次发现的时间]
+        self._ready = deque()
+        self._in_flight = set()  # 已交给调用方但尚未完成的内容哈希
+        self._processed = set()
+        self._known_files = {}  # 文件 -> (大小, 修改时间, 哈希)，避免重复计算哈希
+        self._load_state()
+
+    @property
+    def mode(self):
+        return "inotify" if self._inotify is not None else "轮询"
+
+    # ---- 已处理记录 ----
+    def _load_state(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._processed.add(entry["digest"])
+                    self._known_files[entry["path"]] = (entry["size"], entry["mtime"], entry["digest"])
+        except OSError:
+            pass
+
+    def mark_processed(self, path, digest):
+        """记录已成功处理的文件"""
+        with self._lock:
+            self._in_flight.discard(digest)
+            self._processed.add(digest)
+        if not self.state_file:
+            return
+        try:
+            stat = os.stat(path)
+            entry = {"path": path, "size": stat.st_size, "mtime": stat.st_mtime_ns, "digest": digest,
+                     "processed_at": time.time()}
+            os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+            with open(self.state_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+
+    def release(self, digest):
+        """任务失败或取消时调用，相同内容的文件可以再次被提供"""
+        with self._lock:
+            self._in_flight.discard(digest)
+
+    # ---- 启动与停止 ----
+    def start(self):
+        if self._use_inotify:
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError) as e:
+                self._inotify = None
+                self.on_log(f"inotify 不可用，改为轮询: {str(e)}")
+        for directory in self.directories:
+            self._add_tree(directory, initial=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def take_ready(self):
+        """取出已写入完成、需要翻译的文件"""
+        with self._lock:
+            items = list(self._ready)
+            self._ready.clear()
+        return items
+
+    # ---- 目录 ----
+    def _add_tree(self, root, initial=False):
+        """登记目录及其子目录，initial 为 False 时目录中已有的 PDF 视为新文件"""
+        for directory, dirs, files in os.walk(root):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+            self._add_directory(directory)
+            if initial and not self.include_existing:
+                continue
+            for name in files:
+                path = os.path.join(directory, name)
+                if is_candidate(path):
+                    self._add_pending(path, settled=initial)
+
+    def _add_directory(self, directory):
+        if self._inotify is not None:
+            try:
+                self._inotify.add_watch(directory)
+                return
+            except OSError as e:
+                if e.errno != errno.ENOSPC:
+                    self.on_log(str(e))
+                    return
+                # 超过 max_user_watches，全部改为轮询
+                self.on_log("inotify 监视数量达到系统上限，改为轮询")
+                self._inotify.close()
+                self._inotify = None
+                for path in self.directories:
+                    for sub, dirs, _ in os.walk(path):
+                        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+                        self._index_directory(sub)
+                return
+        self._index_directory(directory)
+
+    def _index_directory(self, directory):
+        try:
+            stat = os.stat(directory)
+            names = {entry.name for entry in os.scandir(directory)
+                     if entry.is_file() and is_candidate(entry.name)}
+        except OSError:
+            return
+        self._dir_mtimes[directory] = stat.st_mtime_ns
+        self._dir_entries[directory] = names
+
+    def _poll_directories(self):
+        """轮询模式：只重新列出修改时间变化的目录"""
+        for directory, mtime in list(self._dir_mtimes.items()):
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                self._dir_mtimes.pop(directory, None)
+                self._dir_entries.pop(directory, None)
+                continue
+            if current == mtime:
+                continue
+            known = self._dir_entries.get(directory, set())
+            self._dir_mtimes[directory] = current
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            names = set()
+            for entry in entries:
+                path = entry.path
+                if entry.is_dir() and entry.name not in SKIP_DIRS and path not in self._dir_mtimes:
+                    self._add_tree(path)
+                elif entry.is_file() and is_candidate(entry.name):
+                    names.add(entry.name)
+                    if entry.name not in known:
+                        self._add_pending(path)
+            self._dir_entries[directory] = names
+
+    def _handle_events(self):
+        for directory, name, mask in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出时只能重新登记一次
+                self.on_log("inotify 事件队列溢出，重新检查监视目录")
+                for root in self.directories:
+                    self._add_tree(root)
+                continue
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and name not in SKIP_DIRS:
+                    self._add_tree(path)
+            elif is_candidate(path):
+                self._add_pending(path)
+
+    # ---- 写入完成判断 ----
+    def _add_pending(self, path, settled=False):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        now = time.time()
+        entry = self._pending.get(path)
+        if entry is None:
+            stable_since = now - self.settle_seconds if settled else now
+            self._pending[path] = [stat.st_size, stat.st_mtime_ns, stable_since, now]
+        elif (entry[0], entry[1]) != (stat.st_size, stat.st_mtime_ns):
+            entry[0], entry[1], entry[2] = stat.st_size, stat.st_mtime_ns, now
+
+    def _check_pending(self):
+        now = time.time()
+        for path, entry in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (entry[0], entry[1]):
+                entry[0], entry[1], entry[2] = stat.st_size, stat.st_mtime_ns, now
+                continue
+            if stat.st_size == 0 or now - entry[2] < self.settle_seconds:
+                continue
+            # 没有 %%EOF 时多等一会儿，长时间不变则照常处理
+            if not _has_pdf_trailer(path) and now - entry[2] < self.settle_seconds * 30:
+                continue
+            del self._pending[path]
+            self._accept(path, stat)
+
+    def _accept(self, path, stat):
+        if any(part in SKIP_DIRS for part in path.split(os.sep)):
+            return
+        # 按设置只保留单语版或双语版时只有其中一个文件
+        outputs = output_paths({"file_path": path, "output_dir": self.output_dir_for(path)})
+        if any(map(os.path.exists, outputs)):
+            return
+        known = self._known_files.get(path)
+        if known and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            digest = known[2]
+        else:
+            try:
+                digest = file_digest(path)
+            except OSError:
+                return
+            self._known_files[path] = (stat.st_size, stat.st_mtime_ns, digest)
+        with self._lock:
+            if digest in self._processed or digest in self._in_flight:
+                return
+            self._in_flight.add(digest)
+            self._ready.append((path, digest))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._inotify is not None:
+                    # 有待确认的文件时频繁检查，空闲时只等待事件
+                    timeout = 0.5 if self._pending else 1.0
+                    readable, _, _ = select.select([self._inotify.fd], [], [], timeout)
+                    if readable:
+                        self._handle_events()
+                else:
+                    self._stop.wait(min(self.poll_interval, 0.5) if self._pending else self.poll_interval)
+                    self._poll_directories()
+                self._check_pending()
+            except Exception as e:
+                self.on_log(f"监视文件夹出错: {str(e)}")
+                self._stop.wait(self.poll_interval)
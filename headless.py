@@ -0,0 +1,491 @@
+"""
+无界面批量翻译入口
+
+不导入 Qt，适合没有显示器的服务器。读取界面“保存配置”生成的 JSON，把给定的
+PDF 文件、文件夹或 URL 交给与图形界面相同的任务调度器执行：
+
+    python main.py --headless -c config.json paper1.pdf papers/ -j 4
+    python headless.py -c config.json paper1.pdf
+    python main.py --headless -c config.json --watch inbox/     # 持续监视文件夹
+    python main.py --headless -c config.json --preflight papers/  # 只预检，估算费用
+    python main.py --headless -c config.json --serve --port 8765  # 本地 HTTP 任务接口
+    python main.py --headless -c config.json --resume            # 继续上次中断的任务
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+
+from core import (TranslationRunner, params_from_config, validate_params, default_output_dir,
+                  find_pdfs, is_url, setup_console_encoding)
+from scheduler import JobScheduler, JobState, JOB_STATE_LABELS
+from sharding import ShardPlanner, estimate_pages, merge_runner
+from fanout import parse_languages
+from llm_gateway import LlmGateway, DEFAULT_CAP, DEFAULT_BATCH_WINDOW, format_stats as format_gateway_stats
+from resource_governor import ResourceGovernor, DEFAULT_RESERVE_PERCENT
+from postprocess import OutputProcessor, DEFAULT_WORKERS as DEFAULT_OPTIMIZE_WORKERS
+from preflight import Preflight, plan, format_report
+from concurrency import ConcurrencyController
+from telemetry import TelemetryLog, DEFAULT_TELEMETRY_FILE, format_rollup
+from usage import UsageLedger
+from routing import ProviderRouter, format_health
+from downloader import DownloadCache, UrlPreparer
+from job_store import JobStore, JobRecorder
+from page_diff import VersionIndex
+
+
+class _ThreadHandle:
+    """在普通线程中运行 TranslationRunner，供调度器取消"""
+
+    def __init__(self, runner, on_finished):
+        self.runner = runner
+        self.thread = threading.Thread(target=self._run, args=(on_finished,), daemon=True)
+
+    def _run(self, on_finished):
+        success, message = self.runner.run()
+        on_finished(success, message, getattr(self.runner, "exit_code", None))
+
+    def stop(self):
+        self.runner.stop()
+
+    def suspend(self):
+        return self.runner.suspend() if hasattr(self.runner, "suspend") else False
+
+    def resume(self):
+        if hasattr(self.runner, "resume"):
+            self.runner.resume()
+
+
+def collect_inputs(inputs):
+    """展开命令行给出的文件、文件夹和 URL"""
+    files = []
+    for item in inputs:
+        if is_url(item):
+            files.append(item)
+        elif os.path.isdir(item):
+            files.extend(find_pdfs(item))
+        elif os.path.isfile(item):
+            files.append(os.path.abspath(item))
+        else:
+            raise ValueError(f"找不到输入文件: {item}")
+    return files
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="PDF科学论文翻译工具 (无界面模式)")
+    parser.add_argument("inputs", nargs="*", help="PDF文件、包含PDF的文件夹或URL；--watch 时为要监视的文件夹")
+    parser.add_argument("-c", "--config", required=True, help="界面保存的配置文件(JSON)")
+    parser.add_argument("-o", "--output-dir", help="输出目录，默认为每个PDF所在目录下的translated文件夹")
+    parser.add_argument("-j", "--jobs", type=int, help="并行任务数，默认读取配置中的 max_concurrent_jobs")
+    parser.add_argument("--workers", type=int, help="使用常驻工作进程并指定进程数")
+    parser.add_argument("--no-cache", action="store_true", help="不使用翻译结果缓存")
+    parser.add_argument("--watch", action="store_true", help="持续监视文件夹，新的PDF写入完成后自动翻译")
+    parser.add_argument("--preflight", action="store_true", help="只分析PDF并输出预检报告和费用估算，不翻译")
+    parser.add_argument("--serve", action="store_true", help="启动 HTTP 任务接口，由其他程序提交任务，直到按下 Ctrl+C")
+    parser.add_argument("--host", default="127.0.0.1", help="HTTP 接口监听的地址，局域网访问时使用 0.0.0.0 (必须同时设置访问令牌)")
+    parser.add_argument("--port", type=int, default=8765, help="HTTP 接口的端口")
+    parser.add_argument("--token", help="HTTP 接口的访问令牌，默认读取配置中的 server_token")
+    parser.add_argument("--allow-dir", action="append", metavar="DIR",
+                        help="HTTP 客户端可以按路径提交文件和指定输出目录的目录，可重复，默认读取配置中的 "
+                             "server_allowed_dirs；未设置时只接受上传和 URL")
+    parser.add_argument("--memory", metavar="PATH", help="使用指定的翻译记忆数据库（可多台电脑共用）")
+    parser.add_argument("--job-budget", type=float, metavar="USD",
+                        help="单任务费用上限(美元)，超出后停止该任务，默认读取配置中的 budget_job_usd")
+    parser.add_argument("--session-budget", type=float, metavar="USD",
+                        help="本次运行的费用上限(美元)，超出后取消剩余任务，默认读取配置中的 budget_session_usd")
+    parser.add_argument("--incremental", action="store_true",
+                        help="文档的新版本只翻译与上一版本相比有变化的页（上一版本需在同一输出目录中以此模式翻译）")
+    parser.add_argument("--gateway", action="store_true",
+                        help="通过本地 LLM 网关访问 OpenAI 兼容接口、Ollama 和 Xinference（连接复用、合并相同请求、"
+                             "并发上限），默认读取配置中的 llm_gateway")
+    parser.add_argument("--only", choices=["mono", "dual"],
+                        help="只保留单语版或双语版，默认读取配置中的 output_variant")
+    parser.add_argument("--optimize", action="store_true",
+                        help="翻译完成后压缩输出文件（合并字体子集、去重、重新压缩），默认读取配置中的 optimize_output")
+    parser.add_argument("--targets", metavar="LANGS",
+                        help="同时翻译为多种语言，逗号分隔的语言代码或名称，如 zh-CN,ja,ko（版面分析只做一次）")
+    parser.add_argument("--priority", type=int, help="本次提交任务的优先级，越大越先执行，默认为0")
+    parser.add_argument("--shortest-first", action="store_true", help="页数少的任务优先执行")
+    parser.add_argument("--fair-share", action="store_true", help="在不同来源（文件夹、网站、HTTP 客户端）之间平均分配并行任务")
+    parser.add_argument("--preempt", action="store_true",
+                        help="挂起低优先级的长任务，让高优先级任务和短任务立即执行（Windows 不支持）")
+    parser.add_argument("--hedge", action="store_true",
+                        help="任务慢于预期时同时用配置中的备用服务(fallbacks)翻译，先完成的结果胜出")
+    parser.add_argument("--resume", action="store_true",
+                        help="重新执行上次中断的任务（--serve 时为上次服务中未完成的任务）")
+    parser.add_argument("--history", type=int, nargs="?", const=50, metavar="N",
+                        help="列出最近 N 个任务的记录（默认50）后退出")
+    parser.add_argument("--telemetry", default=DEFAULT_TELEMETRY_FILE,
+                        help="任务统计记录(JSON Lines)的保存路径，传入空字符串时不保存")
+    return parser
+
+
+def create_scheduler(max_concurrent=1, worker_pool=None, result_cache=None, concurrency=None,
+                     telemetry=None, log=None, usage=None, router=None, downloads=None, policy=None,
+                     recorder=None, gateway=None, governor=None, postprocessor=None):
+    """
+    创建与图形界面行为相同的调度器，任务在普通线程中运行
+
+    传入 usage（UsageLedger）时记录用量，超出会话预算后取消全部任务；传入 router
+    （ProviderRouter）时按配置的备用服务切换或对冲；传入 downloads（DownloadCache）时
+    URL 任务先下载到本地缓存再翻译，下载与其他任务的翻译同时进行。policy 为
+    JobScheduler.set_policy() 的参数（短任务优先、公平分配、抢占）。传入 recorder（JobRecorder）
+    时任务记录到任务数据库。传入 gateway（已启动的 LlmGateway）时各任务通过本地网关访问大模型服务。
+    传入 governor（ResourceGovernor）时按内存情况限制派发、挂起或停止任务。传入 postprocessor
+    （OutputProcessor）时任务完成后按设置删除不需要的版本并压缩输出文件。
+    """
+    log = log or (lambda job_id, message: None)
+
+    def launch(job):
+        os.makedirs(job.params["output_dir"], exist_ok=True)
+        shard_params = [child.params for child in scheduler.children(job)]
+        job_telemetry = telemetry.start(job.id, job.params) if telemetry is not None else None
+        if shard_params or job.params.get("reuse"):
+            runner = merge_runner(job.params, shard_params, result_cache,
+                                  on_log=lambda message: log(job.id, message),
+                                  telemetry=job_telemetry, postprocessor=postprocessor)
+            log(job.id, f"开始合并 {job.name} 的 {len(shard_params)} 个子任务" if shard_params
+                else f"{job.name} 没有需要重新翻译的页，使用上一版本的翻译结果")
+        else:
+            runner = TranslationRunner(
+                job.params, worker_pool, result_cache,
+                on_log=lambda message: log(job.id, message),
+                on_progress=lambda current, total: scheduler.update_progress(job.id, current, total),
+                concurrency=concurrency,
+                telemetry=job_telemetry,
+                usage=usage.start(job.id, job.params) if usage is not None else None,
+                router=router,
+                gateway=gateway,
+                postprocessor=postprocessor
+            )
+            log(job.id, f"开始翻译 {job.name}，输出目录: {job.params['output_dir']}")
+        handle = _ThreadHandle(runner, lambda success, message, exit_code:
+                               scheduler.job_finished(job.id, success, message, exit_code))
+        handle.thread.start()
+        return handle
+
+    def on_job_changed(job):
+        if job.state == JobState.DONE:
+            log(job.id, f"翻译完成，用时 {job.duration():.1f} 秒")
+        elif job.state == JobState.FAILED:
+            log(job.id, job.message)
+
+    def on_session_exceeded(reason):
+        # 无界面模式无法手动恢复，暂停与取消都结束剩余任务
+        log("budget", f"{reason}，取消剩余任务")
+        scheduler.cancel_all()
+
+    preparer = UrlPreparer(downloads, on_log=lambda job, message: log(job.id, message)) \
+        if downloads is not None else None
+    scheduler = JobScheduler(launch, max_concurrent, expander=ShardPlanner(Preflight(), VersionIndex()),
+                             preparer=preparer, estimator=estimate_pages)
+    scheduler.set_policy(**(policy or {}))
+    scheduler.add_listener(on_job_changed)
+    if recorder is not None:
+        recorder.attach(scheduler)
+    if governor is not None:
+        governor.attach(scheduler)
+    if usage is not None:
+        usage.on_session_exceeded = on_session_exceeded
+    return scheduler
+
+
+def run_jobs(params_list, max_concurrent=1, worker_pool=None, result_cache=None, concurrency=None,
+             telemetry=None, log=None, usage=None, router=None, downloads=None, policy=None, recorder=None,
+             gateway=None, governor=None, postprocessor=None):
+    """
+    用与图形界面相同的调度器执行一批任务，全部结束后返回调度器
+
+    log(任务id, 文本) 接收各任务的日志；在主线程中调用时 Ctrl+C 会取消全部任务，
+    未完成的任务在任务数据库中保持中断状态，可以用 --resume 继续。
+    """
+    done = threading.Event()
+    scheduler = create_scheduler(max_concurrent, worker_pool, result_cache, concurrency, telemetry, log, usage,
+                                 router, downloads, policy, recorder, gateway, governor, postprocessor)
+    scheduler.add_listener(
+        lambda job: done.set() if job.finished and not job.is_shard and scheduler.is_idle() else None)
+    if not params_list:
+        return scheduler
+    for params in params_list:
+        scheduler.submit(params)
+
+    if threading.current_thread() is threading.main_thread():
+        # Ctrl+C 时取消全部任务
+        signal.signal(signal.SIGINT, lambda signum, frame: interrupt(scheduler, recorder))
+    scheduler.start()
+    while not done.wait(0.5):
+        pass
+    return scheduler
+
+
+def interrupt(scheduler, recorder=None):
+    """停止全部任务，任务数据库中保留它们的中断状态"""
+    if recorder is not None:
+        recorder.detach()
+    scheduler.cancel_all()
+
+
+def watch_folders(directories, base_params, max_concurrent=1, worker_pool=None, result_cache=None,
+                  concurrency=None, telemetry=None, log=None, output_dir=None, usage=None, router=None,
+                  downloads=None, policy=None, recorder=None, gateway=None, governor=None,
+                  postprocessor=None):
+    """
+    监视文件夹模式：新的 PDF 写入完成后自动翻译，直到按下 Ctrl+C，返回调度器
+
+    output_dir 为空时输出到每个文件所在目录下的 translated 文件夹。
+    """
+    from folder_watcher import FolderWatcher
+
+    log = log or (lambda job_id, message: None)
+    stop = threading.Event()
+    digests = {}  # 任务 id -> 内容哈希
+    output_dir_for = (lambda path: output_dir) if output_dir else default_output_dir
+    watcher = FolderWatcher(directories, output_dir_for, on_log=lambda message: log("watch", message))
+    scheduler = create_scheduler(max_concurrent, worker_pool, result_cache, concurrency, telemetry, log, usage,
+                                 router, downloads, policy, recorder, gateway, governor, postprocessor)
+
+    def on_job_changed(job):
+        if not job.finished or job.id not in digests:
+            return
+        if job.state == JobState.DONE:
+            watcher.mark_processed(job.params["file_path"], digests.pop(job.id))
+        else:
+            watcher.release(digests.pop(job.id))
+
+    scheduler.add_listener(on_job_changed)
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    watcher.start()
+    scheduler.start()
+    log("watch", f"正在监视 ({watcher.mode}): {', '.join(watcher.directories)}，按 Ctrl+C 停止")
+    try:
+        while not stop.wait(0.5):
+            for path, digest in watcher.take_ready():
+                log("watch", f"发现新文件: {path}")
+                job = scheduler.submit(dict(base_params, file_path=path, output_dir=output_dir_for(path)))
+                digests[job.id] = digest
+    finally:
+        watcher.stop()
+        interrupt(scheduler, recorder)
+    return scheduler
+
+
+def print_preflight(files, base_params):
+    """输出每个文件的预检报告，全部分析成功时返回 0"""
+    preflight = Preflight()
+    failed = 0
+    for file_path in files:
+        print(f"== {file_path}", flush=True)
+        if is_url(file_path):
+            print("URL 无法预检", flush=True)
+            continue
+        try:
+            report = preflight.analyze(file_path)
+        except Exception as e:
+            print(f"预检失败: {str(e)}", flush=True)
+            failed += 1
+            continue
+        print(format_report(report, plan(report, base_params)), flush=True)
+    return 0 if not failed else 1
+
+
+def print_history(store, limit):
+    """输出任务数据库中最近的任务"""
+    for row in reversed(store.query(limit=limit)):
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["created"]))
+        duration = f"{row['finished'] - row['started']:.0f}s" if row["started"] and row["finished"] else "-"
+        exit_code = "" if row["exit_code"] is None else f" 返回码 {row['exit_code']}"
+        print(f"{row['id']:>6} {created} {row['source']:<8} {JOB_STATE_LABELS.get(row['state'], row['state']):<4} "
+              f"{duration:>6} {row['file']}{exit_code}", flush=True)
+        if row["state"] != JobState.DONE and row["message"]:
+            print(f"       {row['message'].splitlines()[-1]}", flush=True)
+    counts = store.counts()
+    print("共 " + "，".join(f"{JOB_STATE_LABELS.get(state, state)} {count}" for state, count in sorted(counts.items())),
+          flush=True)
+    return 0
+
+
+def run(args):
+    with open(args.config, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    store = None
+    if config.get("job_store", True) or args.resume or args.history is not None:
+        store = JobStore()
+    if args.history is not None:
+        return print_history(store, args.history)
+
+    base_params = params_from_config(config)
+    if args.priority is not None:
+        base_params["priority"] = args.priority
+    if args.hedge:
+        base_params["hedge"] = True
+    if args.incremental:
+        base_params["incremental"] = True
+    if args.only:
+        base_params["output_variant"] = args.only
+    if args.optimize:
+        base_params["optimize_output"] = True
+    if args.targets:
+        base_params["target_langs"] = parse_languages(args.targets)
+    if args.memory:
+        base_params["translation_memory"] = os.path.abspath(args.memory)
+    error = validate_params(base_params)
+    if error:
+        raise ValueError(error)
+    if args.serve:
+        pass
+    elif not args.inputs and not args.resume:
+        raise ValueError("请指定要翻译的PDF文件、文件夹或URL")
+    elif args.watch:
+        missing = [path for path in args.inputs if not os.path.isdir(path)]
+        if missing:
+            raise ValueError(f"监视模式只接受文件夹: {', '.join(missing)}")
+    else:
+        files = collect_inputs(args.inputs)
+        if not files and not args.resume:
+            raise ValueError("没有找到需要翻译的PDF文件")
+        if args.preflight:
+            return print_preflight(files, base_params)
+
+    worker_pool = None
+    worker_count = args.workers or (config.get("worker_count", 2) if config.get("worker_mode") else 0)
+    if worker_count:
+        from worker_pool import WorkerPool
+        worker_pool = WorkerPool(worker_count,
+                                 config.get("worker_max_jobs", 20),
+                                 config.get("worker_max_memory_mb", 0))
+
+    result_cache = None
+    if not args.no_cache and config.get("result_cache", True):
+        from result_cache import ResultCache
+        try:
+            result_cache = ResultCache(max_bytes=config.get("result_cache_mb", 2048) * 1024 * 1024)
+        except OSError:
+            result_cache = None
+
+    concurrency = ConcurrencyController()
+    telemetry = TelemetryLog(args.telemetry)
+    usage = UsageLedger(
+        job_budget=args.job_budget if args.job_budget is not None else config.get("budget_job_usd", 0.0),
+        session_budget=(args.session_budget if args.session_budget is not None
+                        else config.get("budget_session_usd", 0.0)))
+    router = ProviderRouter(stall_seconds=config.get("failover_stall_seconds", 300),
+                            max_page_seconds=config.get("failover_max_page_seconds", 0))
+    downloads = DownloadCache(max_file_mb=config.get("download_max_mb", 200),
+                              max_cache_mb=config.get("download_cache_mb", 2048),
+                              max_concurrent=config.get("download_concurrency", 3))
+    policy = {"shortest_first": args.shortest_first or config.get("schedule_shortest_first", False),
+              "fair_share": args.fair_share or config.get("schedule_fair_share", False),
+              "preemption": args.preempt or config.get("schedule_preempt", False)}
+    print_lock = threading.Lock()
+
+    def log(job_id, message):
+        with print_lock:
+            print(f"[#{job_id}] {message}", flush=True)
+
+    def resume(source, requeue=True):
+        resumed, completed = store.reconcile([source], requeue)
+        if completed:
+            log("jobs", f"{completed} 个中断的任务在程序退出期间已完成")
+        if resumed:
+            log("jobs", f"重新执行 {len(resumed)} 个中断的任务")
+        return [params for row_id, params in resumed]
+
+    source = "server" if args.serve else "watch" if args.watch else "headless"
+    recorder = JobRecorder(store, source, on_error=lambda message: log("jobs", message)) \
+        if store is not None else None
+    jobs = args.jobs or config.get("max_concurrent_jobs", 1)
+    gateway = None
+    governor = ResourceGovernor(config.get("memory_reserve_percent", DEFAULT_RESERVE_PERCENT),
+                                on_log=lambda message: log("resources", message)) \
+        if config.get("resource_governor", True) else None
+    postprocessor = OutputProcessor(config.get("optimize_workers", DEFAULT_OPTIMIZE_WORKERS))
+    try:
+        if args.gateway or config.get("llm_gateway", False):
+            gateway = LlmGateway(cap=config.get("llm_gateway_cap", DEFAULT_CAP),
+                                 batch_window=config.get("llm_gateway_batch_ms", DEFAULT_BATCH_WINDOW * 1000) / 1000)
+            log("gateway", f"LLM 网关: {gateway.start()}")
+        if args.serve:
+            from job_server import JobServer
+            # 客户端的参数覆盖服务端配置，命令行选项也写入配置
+            server_config = dict(config)
+            if args.hedge:
+                server_config["hedge"] = True
+            if args.incremental:
+                server_config["incremental"] = True
+            if args.only:
+                server_config["output_variant"] = args.only
+            if args.optimize:
+                server_config["optimize_output"] = True
+            if args.targets:
+                server_config["target_langs"] = parse_languages(args.targets)
+            if args.memory:
+                server_config.update(translation_memory=True, translation_memory_path=os.path.abspath(args.memory))
+            server = JobServer(
+                server_config,
+                lambda server_log: create_scheduler(jobs, worker_pool, result_cache, concurrency, telemetry,
+                                                    server_log, usage, router, downloads, policy, recorder,
+                                                    gateway, governor, postprocessor),
+                log=log, token=args.token or config.get("server_token", ""),
+                max_upload_mb=config.get("server_max_upload_mb", 512),
+                on_shutdown=recorder.detach if recorder is not None else None,
+                roots=args.allow_dir or config.get("server_allowed_dirs", []))
+            if args.resume:
+                for params in resume("server"):
+                    server.scheduler.submit(params)
+            scheduler = server.run(args.host, args.port)
+        elif args.watch:
+            if store is not None:
+                # 未完成的文件会被文件夹监视重新发现，这里只整理记录
+                resume("watch", requeue=False)
+            scheduler = watch_folders(args.inputs, base_params, jobs, worker_pool, result_cache,
+                                      concurrency, telemetry, log, args.output_dir, usage, router, downloads,
+                                      policy, recorder, gateway, governor, postprocessor)
+        else:
+            params_list = resume("headless") if args.resume else []
+            params_list += [dict(base_params, file_path=file_path,
+                                 output_dir=args.output_dir or default_output_dir(file_path))
+                            for file_path in files]
+            scheduler = run_jobs(params_list, jobs, worker_pool, result_cache, concurrency, telemetry, log,
+                                 usage, router, downloads, policy, recorder, gateway, governor, postprocessor)
+    finally:
+        if worker_pool is not None:
+            worker_pool.shutdown()
+        if gateway is not None:
+            gateway.stop()
+        if governor is not None:
+            governor.stop()
+        postprocessor.shutdown()
+
+    stats = scheduler.stats()
+    counts = stats["counts"]
+    print(f"完成 {counts[JobState.DONE]}，失败 {counts[JobState.FAILED]}，"
+          f"取消 {counts[JobState.CANCELLED]}，用时 {stats['elapsed']:.1f} 秒", flush=True)
+    print(f"统计: {format_rollup(telemetry.rollup())}", flush=True)
+    cost, tokens = usage.session_totals()
+    if tokens:
+        print(f"用量: {tokens:,} token，约 ${cost:.4f}", flush=True)
+    if gateway is not None and gateway.stats["requests"]:
+        print(f"LLM 网关: {format_gateway_stats(gateway.stats)}", flush=True)
+    if base_params["fallbacks"]:
+        print(f"服务状态:\n{format_health(router.stats())}", flush=True)
+    if args.watch or args.serve:
+        return 0 if not counts[JobState.FAILED] else 1
+    return 0 if counts[JobState.DONE] == stats["total"] else 1
+
+
+def main(argv=None):
+    setup_console_encoding()
+    args = build_parser().parse_args(argv)
+    try:
+        return run(args)
+    except (OSError, ValueError) as e:
+        print(f"错误: {str(e)}", file=sys.stderr)
+        return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,616 @@
+"""
+本地 HTTP 任务接口
+
+基于 asyncio 的小型 HTTP/1.1 服务（不依赖第三方库），让其他程序或其他电脑通过网络
+提交翻译任务，与图形界面、无界面模式共用同一个任务调度器：
+
+    POST   /jobs                 提交任务：JSON {"path": 本地路径或URL, "params": {...}, "output_dir": ...}，
+                                 或直接上传 PDF（Content-Type: application/pdf，?filename=a.pdf&params=JSON）
+    GET    /jobs                 任务列表
+    GET    /jobs/<id>            任务状态；?wait=秒&version=上次的version 时长轮询，状态变化后才返回
+    GET    /jobs/<id>/events     Server-Sent Events：日志 (log)、状态 (status)，结束时发送 end
+    POST   /jobs/<id>/cancel     取消任务（也可用 DELETE /jobs/<id>）
+    GET    /jobs/<id>/mono       下载单语版（/dual 为双语版），支持 Range 断点续传
+
+已结束的任务在没有 SSE 客户端后保留 FINISHED_JOB_TTL 秒，之后不再出现在列表中（输出文件不受影响）。
+
+params 与界面“保存配置”的 JSON 格式相同，但只能覆盖 CLIENT_PARAM_KEYS 中的项（语言、页码、模型和
+保留的版本），服务地址、密钥和各种路径只能由服务端配置。JSON 中（上传时为查询参数）可以带
+priority（优先级，越大越先）和 owner（公平分配的单位，默认为客户端地址）。按路径提交的文件和指定的
+output_dir 必须位于服务端允许的目录（roots）中，没有设置时只接受上传和 URL。上传和下载都按块
+流式读写，不会把整个 PDF 读入内存。设置 token 后请求需带 "Authorization: Bearer <token>"
+（或 ?token=，供浏览器的 EventSource 使用）；没有设置 token 时只能监听本机地址。
+"""
+import os
+import re
+import hmac
+import json
+import time
+import uuid
+import signal
+import asyncio
+import ipaddress
+import urllib.parse
+from collections import deque
+
+from core import params_from_config, validate_params, default_output_dir, output_paths, is_url
+from scheduler import JobState, JOB_STATE_LABELS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_UPLOAD_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdf-translator", "uploads")
+
+CHUNK_SIZE = 256 * 1024
+MAX_HEADER_BYTES = 64 * 1024
+MAX_JSON_BYTES = 1024 * 1024
+LOG_LINES_PER_JOB = 2000  # 每个任务保留的日志行数，SSE 客户端可从中断处继续
+KEEPALIVE_SECONDS = 15
+MAX_WAIT_SECONDS = 60
+
+# 已结束的任务在没有 SSE 客户端后保留的秒数，之后从调度器和日志缓冲中移除，长期运行时内存不会一直增长
+FINISHED_JOB_TTL = 3600
+
+# 客户端可以覆盖的配置项
+CLIENT_PARAM_KEYS = ("source_lang", "target_lang", "target_langs", "pages", "model", "output_variant")
+
+STATUS_TEXT = {
+    200: "OK", 201: "Created", 206: "Partial Content", 400: "Bad Request", 401: "Unauthorized",
+    403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 411: "Length Required",
+    413: "Payload Too Large", 416: "Range Not Satisfiable", 431: "Request Header Fields Too Large",
+    500: "Internal Server Error", 502: "Bad Gateway",
+}
+
+_RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+_UNSAFE_NAME = re.compile(r"[^\w.\- ]+")
+
+
+def is_loopback(host):
+    """host 是否只能从本机访问"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=""):
+        super().__init__(message or STATUS_TEXT.get(status, ""))
+        self.status = status
+
+
+class Request:
+    """解析后的请求头，请求体按需从 reader 中读取"""
+
+    def __init__(self, reader, method, target, headers):
+        self.reader = reader
+        self.method = method
+        self.target = target
+        url = urllib.parse.urlsplit(target)
+        self.path = urllib.parse.unquote(url.path)
+        self.query = dict(urllib.parse.parse_qsl(url.query))
+        self.headers = headers
+        self.remaining = int(headers.get("content-length") or 0)
+        self.client = ""  # 客户端地址，由连接处理方设置
+        self.keep_alive = headers.get("connection", "").lower() != "close"
+        if headers.get("transfer-encoding"):
+            # 只支持 Content-Length
+            self.keep_alive = False
+            raise HTTPError(411)
+
+    async def read_json(self):
+        if self.remaining > MAX_JSON_BYTES:
+            raise HTTPError(413)
+        data = await self.reader.readexactly(self.remaining) if self.remaining else b""
+        self.remaining = 0
+        try:
+            return json.loads(data or b"{}")
+        except ValueError:
+            raise HTTPError(400, "请求体不是有效的 JSON")
+
+    async def chunks(self):
+        while self.remaining:
+            chunk = await self.reader.read(min(CHUNK_SIZE, self.remaining))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b"", self.remaining)
+            self.remaining -= len(chunk)
+            yield chunk
+
+
+async def read_request(reader):
+    """读取一个请求的请求行和请求头，连接关闭时返回 None"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431)
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return Request(reader, method.upper(), target, headers)
+
+
+def write_head(writer, status, headers, keep_alive=True):
+    lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("utf-8"))
+
+
+def write_json(writer, status, data, keep_alive=True, headers=None):
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    write_head(writer, status, dict(headers or {}, **{"Content-Type": "application/json; charset=utf-8",
+                                                      "Content-Length": len(body)}), keep_alive)
+    writer.write(body)
+
+
+class _JobChannel:
+    """一个任务的日志缓冲与状态版本号，只在事件循环线程中使用"""
+
+    def __init__(self):
+        self.lines = deque(maxlen=LOG_LINES_PER_JOB)  # (序号, 文本)
+        self.next_seq = 1
+        self.version = 0
+        self.changed = asyncio.Condition()
+        self.listeners = 0  # 正在接收 SSE 的客户端数
+        self.expiry = None  # 移除任务的定时器
+
+    def since(self, seq):
+        """序号大于 seq 的日志"""
+        if not self.lines:
+            return []
+        start = max(0, seq + 1 - self.lines[0][0])
+        return list(self.lines)[start:]
+
+    async def notify(self):
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def wait(self, predicate, timeout):
+        """等待 predicate() 成立，超时返回 False"""
+        async with self.changed:
+            try:
+                await asyncio.wait_for(self.changed.wait_for(predicate), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+
+class JobServer:
+    """
+    HTTP 任务接口
+
+    create_scheduler(log) 返回使用该 log 回调的任务调度器；config 为服务端的配置，
+    客户端提交的 params 覆盖其中 CLIENT_PARAM_KEYS 的项。roots 为客户端可以按路径提交文件和
+    指定输出目录的目录。log(任务id, 文本) 另外接收所有任务日志。
+    on_shutdown() 在停止服务、取消剩余任务之前调用。
+    """
+
+    def __init__(self, config, create_scheduler, log=None, token="", upload_dir=DEFAULT_UPLOAD_DIR,
+                 max_upload_mb=512, on_shutdown=None, roots=()):
+        self.config = config
+        self.token = token
+        self.roots = [os.path.realpath(os.path.expanduser(root)) for root in roots]
+        self.upload_dir = upload_dir
+        self.max_upload_bytes = max_upload_mb * 1024 * 1024
+        self._log = log or (lambda job_id, message: None)
+        self.on_shutdown = on_shutdown or (lambda: None)
+        self.scheduler = create_scheduler(self.log)
+        self.scheduler.add_listener(self._on_job_changed)
+        self.loop = None
+        self._channels = {}
+        self._tasks = set()
+
+    # ---- 调度器回调（任意线程） ----
+    def _root_id(self, job_id):
+        job = self.scheduler.get(job_id) if isinstance(job_id, int) else None
+        if job is not None and job.is_shard:
+            return job.parent_id, f"[{job.params.get('shard_label', '')}] "
+        return job_id, ""
+
+    def log(self, job_id, message):
+        self._log(job_id, message)
+        root_id, prefix = self._root_id(job_id)
+        self._call_soon(self._append, root_id, prefix + message)
+
+    def _on_job_changed(self, job):
+        if job.is_shard:
+            self._call_soon(self._touch, job.parent_id, False)
+        else:
+            self._call_soon(self._touch, job.id, job.finished)
+
+    def _call_soon(self, callback, *args):
+        loop = self.loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    # ---- 事件循环线程 ----
+    def channel(self, job_id):
+        channel = self._channels.get(job_id)
+        if channel is None:
+            channel = self._channels[job_id] = _JobChannel()
+        return channel
+
+    def _append(self, job_id, message):
+        if not isinstance(job_id, int):
+            return
+        channel = self.channel(job_id)
+        channel.lines.append((channel.next_seq, message))
+        channel.next_seq += 1
+        self._spawn(channel.notify())
+
+    def _touch(self, job_id, finished):
+        channel = self.channel(job_id)
+        channel.version += 1
+        self._spawn(channel.notify())
+        if finished:
+            self._schedule_expiry(job_id)
+
+    def _schedule_expiry(self, job_id):
+        channel = self._channels.get(job_id)
+        if self.loop is None or channel is None or channel.listeners or channel.expiry is not None:
+            return
+        channel.expiry = self.loop.call_later(FINISHED_JOB_TTL, self._expire, job_id)
+
+    def _expire(self, job_id):
+        channel = self._channels.get(job_id)
+        if channel is None:
+            return
+        channel.expiry = None
+        if channel.listeners:
+            return
+        del self._channels[job_id]
+        self.loop.run_in_executor(None, self.scheduler.remove, job_id)
+
+    def _spawn(self, coroutine):
+        task = self.loop.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def job_json(self, job):
+        data = {
+            "id": job.id,
+            "name": job.name,
+            "file_path": job.params.get("file_path", ""),
+            "output_dir": job.params.get("output_dir", ""),
+            "state": job.state,
+            "state_label": JOB_STATE_LABELS[job.state],
+            "progress": round(job.progress(), 4),
+            "current_page": job.current_page,
+            "total_pages": job.total_pages,
+            "shards": len(job.children),
+            "priority": job.priority,
+            "suspended": job.suspended,
+            "message": job.message,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+            "duration": round(job.duration(), 3),
+            "version": self.channel(job.id).version,
+        }
+        if job.state == JobState.DONE:
+            data["outputs"] = {"mono": f"/jobs/{job.id}/mono", "dual": f"/jobs/{job.id}/dual"}
+        return data
+
+    def find_job(self, job_id):
+        job = self.scheduler.get(int(job_id)) if job_id.isdigit() else None
+        if job is None or job.is_shard:
+            raise HTTPError(404, "任务不存在")
+        return job
+
+    # ---- 连接 ----
+    async def handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    request.client = (writer.get_extra_info("peername") or ("",))[0]
+                    keep_alive = await self.dispatch(request, writer)
+                except HTTPError as e:
+                    # 请求体可能没有读完，返回错误后关闭连接
+                    write_json(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    keep_alive = False
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            try:
+                write_json(writer, 500, {"error": str(e)}, keep_alive=False)
+                await writer.drain()
+            except ConnectionError:
+                pass
+        finally:
+            self._tasks.discard(task)
+            writer.close()
+
+    def authorized(self, request):
+        if not self.token:
+            return True
+        header = request.headers.get("authorization", "")
+        supplied = header[7:] if header.startswith("Bearer ") else request.query.get("token", "")
+        return hmac.compare_digest(supplied.encode("utf-8"), self.token.encode("utf-8"))
+
+    async def dispatch(self, request, writer):
+        """处理一个请求，返回连接能否继续使用"""
+        if not self.authorized(request):
+            raise HTTPError(401)
+        parts = [part for part in request.path.split("/") if part]
+        method = request.method
+
+        if not parts and method == "GET":
+            stats = self.scheduler.stats()
+            write_json(writer, 200, {"jobs": stats["total"], "counts": stats["counts"],
+                                     "pages_per_minute": round(stats["pages_per_minute"], 2)},
+                       request.keep_alive)
+            return request.keep_alive
+        if not parts or parts[0] != "jobs":
+            raise HTTPError(404)
+
+        if len(parts) == 1:
+            if method == "GET":
+                jobs = [self.job_json(job) for job in self.scheduler.jobs() if not job.is_shard]
+                write_json(writer, 200, {"jobs": jobs}, request.keep_alive)
+                return request.keep_alive
+            if method == "POST":
+                job = await self.submit(request)
+                write_json(writer, 201, self.job_json(job), request.keep_alive,
+                           {"Location": f"/jobs/{job.id}"})
+                return request.keep_alive
+            raise HTTPError(405)
+
+        job = self.find_job(parts[1])
+        action = parts[2] if len(parts) > 2 else ""
+        if not action and method == "GET":
+            await self.wait_for_change(request, job)
+            write_json(writer, 200, self.job_json(job), request.keep_alive)
+            return request.keep_alive
+        if (not action and method == "DELETE") or (action == "cancel" and method == "POST"):
+            await self.loop.run_in_executor(None, self.scheduler.cancel, job.id)
+            write_json(writer, 200, self.job_json(job), request.keep_alive)
+            return request.keep_alive
+        if action == "events" and method == "GET":
+            await self.stream_events(request, writer, job)
+            return False
+        if action in ("mono", "dual") and method == "GET":
+            await self.download(request, writer, job, action)
+            return request.keep_alive
+        raise HTTPError(404 if action not in ("cancel", "events", "mono", "dual") else 405)
+
+    # ---- 提交 ----
+    def local_path(self, path, label):
+        """客户端给出的本地路径，不在允许的目录中时拒绝"""
+        path = os.path.realpath(os.path.expanduser(path))
+        if not any(os.path.commonpath([root, path]) == root for root in self.roots):
+            raise HTTPError(403, f"{label}不在服务端允许的目录中: {path}")
+        return path
+
+    def build_params(self, overrides, file_path, output_dir, priority=0, owner=""):
+        if not isinstance(overrides, dict):
+            raise HTTPError(400, "params 必须是 JSON 对象")
+        rejected = sorted(set(overrides) - set(CLIENT_PARAM_KEYS))
+        if rejected:
+            raise HTTPError(400, f"params 只能包含 {', '.join(CLIENT_PARAM_KEYS)}，不能包含 {', '.join(rejected)}")
+        try:
+            priority = int(priority or 0)
+        except (ValueError, TypeError):
+            raise HTTPError(400, "priority 必须是整数")
+        try:
+            params = params_from_config(dict(self.config, **overrides))
+        except (ValueError, TypeError) as e:
+            raise HTTPError(400, str(e))
+        error = validate_params(params)
+        if error:
+            raise HTTPError(400, error)
+        params["file_path"] = file_path
+        params["output_dir"] = self.local_path(output_dir, "输出目录") if output_dir else default_output_dir(file_path)
+        params["priority"] = priority
+        params["owner"] = str(owner)
+        return params
+
+    async def submit(self, request):
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type == "application/json":
+            body = await request.read_json()
+            file_path = body.get("path") or body.get("file_path") or ""
+            if not file_path:
+                raise HTTPError(400, "缺少 path")
+            if not is_url(file_path):
+                file_path = self.local_path(file_path, "文件")
+                if not os.path.isfile(file_path):
+                    raise HTTPError(400, f"找不到文件: {file_path}")
+            params = self.build_params(body.get("params") or {}, file_path, body.get("output_dir"),
+                                       body.get("priority"), body.get("owner") or request.client)
+        else:
+            try:
+                overrides = json.loads(request.query.get("params") or "{}")
+            except ValueError:
+                raise HTTPError(400, "params 不是有效的 JSON")
+            # 先检查参数，避免上传完才发现配置错误
+            priority, owner = request.query.get("priority"), request.query.get("owner") or request.client
+            output_dir = request.query.get("output_dir")
+            self.build_params(overrides, "upload.pdf", output_dir, priority, owner)
+            file_path = await self.receive_upload(request)
+            params = self.build_params(overrides, file_path, output_dir, priority, owner)
+
+        def submit():
+            job = self.scheduler.submit(params)
+            self.scheduler.start()
+            return job
+
+        # 派发时可能需要预检和分片，不在事件循环中执行
+        return await self.loop.run_in_executor(None, submit)
+
+    async def receive_upload(self, request):
+        """把上传的 PDF 流式写入上传目录，返回保存路径"""
+        if "content-length" not in request.headers:
+            raise HTTPError(411)
+        if request.remaining > self.max_upload_bytes:
+            raise HTTPError(413, f"文件超过 {self.max_upload_bytes // (1024 * 1024)} MB")
+        name = _UNSAFE_NAME.sub("_", os.path.basename(request.query.get("filename", ""))).strip() or "upload.pdf"
+        if not name.lower().endswith(".pdf"):
+            name += ".pdf"
+        directory = os.path.join(self.upload_dir, time.strftime("%Y%m%d"), uuid.uuid4().hex[:12])
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        received = 0
+        try:
+            with open(path, "wb") as f:
+                async for chunk in request.chunks():
+                    if not received and b"%PDF" not in chunk[:1024]:
+                        raise HTTPError(400, "上传的文件不是 PDF")
+                    received += len(chunk)
+                    await self.loop.run_in_executor(None, f.write, chunk)
+            if not received:
+                raise HTTPError(400, "上传的文件为空")
+        except BaseException:
+            try:
+                os.remove(path)
+                os.rmdir(directory)
+            except OSError:
+                pass
+            raise
+        return path
+
+    # ---- 状态与事件 ----
+    async def wait_for_change(self, request, job):
+        """长轮询：客户端给出的 version 与当前相同时等待变化"""
+        if "wait" not in request.query or "version" not in request.query:
+            return
+        try:
+            timeout = min(float(request.query["wait"]), MAX_WAIT_SECONDS)
+            version = int(request.query["version"])
+        except ValueError:
+            raise HTTPError(400, "wait 和 version 必须是数字")
+        channel = self.channel(job.id)
+        if channel.version == version and not job.finished:
+            await channel.wait(lambda: channel.version != version, timeout)
+
+    async def stream_events(self, request, writer, job):
+        channel = self.channel(job.id)
+        try:
+            last = int(request.headers.get("last-event-id") or request.query.get("since") or 0)
+        except ValueError:
+            last = 0
+        write_head(writer, 200, {"Content-Type": "text/event-stream; charset=utf-8",
+                                 "Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, keep_alive=False)
+        channel.listeners += 1
+        try:
+            version = None
+            while True:
+                for seq, message in channel.since(last):
+                    data = "\n".join(f"data: {line}" for line in message.split("\n"))
+                    writer.write(f"id: {seq}\nevent: log\n{data}\n\n".encode("utf-8"))
+                    last = seq
+                if channel.version != version:
+                    version = channel.version
+                    writer.write(f"event: status\ndata: {json.dumps(self.job_json(job), ensure_ascii=False)}\n\n"
+                                 .encode("utf-8"))
+                await writer.drain()
+                if job.finished:
+                    writer.write(b"event: end\ndata: {}\n\n")
+                    await writer.drain()
+                    return
+                changed = await channel.wait(
+                    lambda: channel.version != version or channel.next_seq > last + 1, KEEPALIVE_SECONDS)
+                if not changed:
+                    writer.write(b": keep-alive\n\n")
+        finally:
+            channel.listeners -= 1
+            if job.finished:
+                self._schedule_expiry(job.id)
+
+    # ---- 下载 ----
+    async def download(self, request, writer, job, kind):
+        if job.state != JobState.DONE:
+            raise HTTPError(409, "任务尚未完成")
+        mono_path, dual_path = output_paths(job.params)
+        path = mono_path if kind == "mono" else dual_path
+        if not os.path.isfile(path):
+            raise HTTPError(404, "找不到输出文件")
+        size = os.path.getsize(path)
+        start, end, status = 0, size - 1, 200
+        range_header = request.headers.get("range")
+        if range_header:
+            match = _RANGE_PATTERN.match(range_header.strip())
+            if not match or not (match.group(1) or match.group(2)):
+                raise HTTPError(416)
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(size - int(match.group(2)), 0)
+            if start > end:
+                raise HTTPError(416)
+            status = 206
+        filename = urllib.parse.quote(os.path.basename(path))
+        headers = {"Content-Type": "application/pdf", "Content-Length": end - start + 1,
+                   "Accept-Ranges": "bytes", "Content-Disposition": f"attachment; filename*=UTF-8''{filename}"}
+        if status == 206:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        write_head(writer, status, headers, request.keep_alive)
+        remaining = end - start + 1
+        with open(path, "rb") as f:
+            f.seek(start)
+            while remaining:
+                chunk = await self.loop.run_in_executor(None, f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                writer.write(chunk)
+                await writer.drain()
+
+    # ---- 运行 ----
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, stop=None):
+        """在当前事件循环中运行，直到 stop（asyncio.Event）被设置；没有 token 时只能监听本机地址"""
+        if not self.token and not is_loopback(host):
+            raise ValueError(f"监听 {host or '所有地址'} 时必须设置访问令牌 (--token 或配置中的 server_token)")
+        self.loop = asyncio.get_running_loop()
+        stop = stop or asyncio.Event()
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        self.scheduler.start()
+        address = server.sockets[0].getsockname()
+        self._log("http", f"HTTP 接口: http://{address[0]}:{address[1]}/，按 Ctrl+C 停止")
+        try:
+            await stop.wait()
+        finally:
+            server.close()
+            for task in list(self._tasks):
+                task.cancel()
+            self.on_shutdown()
+            await self.loop.run_in_executor(None, self.scheduler.cancel_all)
+            self.loop = None
+
+    def run(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """阻塞运行直到按下 Ctrl+C，返回调度器"""
+        async def main():
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            try:
+                loop.add_signal_handler(signal.SIGINT, stop.set)
+            except (NotImplementedError, RuntimeError):
+                # Windows 的事件循环不支持 add_signal_handler
+                signal.signal(signal.SIGINT, lambda signum, frame: loop.call_soon_threadsafe(stop.set))
+            await self.serve(host, port, stop)
+
+        asyncio.run(main())
+        return self.scheduler
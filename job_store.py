@@ -0,0 +1,372 @@
+"""
+持久化任务数据库
+
+SQLite（WAL 模式）记录每个顶层任务的参数、状态、时间、输出路径和退出码，程序或电脑
+重启后队列不会丢失：
+
+- 参数中的密钥不写入数据库，只保存引用 "secret:<摘要>"，密钥本身保存在系统密钥环
+  （安装了 keyring 时）或仅当前用户可读的 secrets.json 中；
+- 启动时 reconcile() 检查上次未结束的任务：运行中断但输出文件已生成（在退出前或宕机
+  期间完成）的标记为完成，其余的重新加入队列。仍在运行的其他进程的任务不受影响，
+  进程按 PID 加启动时间识别，重启后被复用的 PID 不算；
+- 按状态、创建时间和文件建有索引，数万条历史记录下查询仍然很快。
+
+JobRecorder 作为调度器的 listener，只在任务状态变化时写入，分片子任务不单独记录。
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from core import kept_output_paths
+
+DEFAULT_JOB_DB = os.path.join(os.path.expanduser("~"), ".cache", "pdf-translator", "jobs.db")
+DEFAULT_SECRETS_FILE = os.path.join(os.path.expanduser("~"), ".cache", "pdf-translator", "secrets.json")
+
+SECRET_PREFIX = "secret:"
+KEYRING_SERVICE = "pdf-translator"
+
+# 连续中断这么多次的任务不再自动恢复，避免反复导致程序崩溃的任务一直重试
+MAX_INTERRUPTIONS = 3
+
+# 旧版本数据库中没有的列，打开时补上
+_ADDED_COLUMNS = {"owner_start": "TEXT DEFAULT ''"}
+
+
+def _process_identity(pid):
+    """
+    进程的启动标识："<boot_id>:<启动时间>"，用于识别重启后被其他进程复用的 PID
+
+    读取 /proc，不支持的系统或进程不存在时返回空字符串。
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id", "r") as f:
+            boot_id = f.read().strip()
+        with open(f"/proc/{pid}/stat", "r") as f:
+            # 进程名可能包含空格和括号，从最后一个 ")" 之后开始按空格分隔，启动时间是第 22 项
+            starttime = f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return ""
+    return f"{boot_id}:{starttime}"
+
+
+def _process_alive(pid, identity=""):
+    """pid 对应的进程是否仍在运行；给出 identity 时还要求进程的启动标识一致"""
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # Windows 上 os.kill(pid, 0) 会结束进程，改用 OpenProcess 查询
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    # 重启后 PID 可能分配给了无关的进程
+    if identity:
+        current = _process_identity(pid)
+        if current and current != identity:
+            return False
+    return True
+
+
+class SecretStore:
+    """按摘要保存密钥，数据库中只出现引用"""
+
+    def __init__(self, path=DEFAULT_SECRETS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            import keyring
+            keyring.get_keyring()
+            self._keyring = keyring
+        except Exception:
+            self._keyring = None
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def put(self, value):
+        """保存密钥并返回引用，空值原样返回"""
+        if not value or value.startswith(SECRET_PREFIX):
+            return value
+        digest = hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+        if self._keyring is not None:
+            try:
+                self._keyring.set_password(KEYRING_SERVICE, digest, value)
+                return SECRET_PREFIX + digest
+            except Exception:
+                pass
+        with self._lock:
+            secrets = self._load()
+            if secrets.get(digest) != value:
+                secrets[digest] = value
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                # 只有当前用户可读写
+                fd = os.open(self.path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(secrets, f)
+                os.replace(self.path + ".tmp", self.path)
+        return SECRET_PREFIX + digest
+
+    def get(self, reference):
+        """按引用取回密钥，找不到时返回空字符串"""
+        if not reference or not reference.startswith(SECRET_PREFIX):
+            return reference
+        digest = reference[len(SECRET_PREFIX):]
+        if self._keyring is not None:
+            try:
+                value = self._keyring.get_password(KEYRING_SERVICE, digest)
+                if value:
+                    return value
+            except Exception:
+                pass
+        with self._lock:
+            return self._load().get(digest, "")
+
+
+def _secret_fields(params):
+    """参数中需要按引用保存的字段：API 密钥，腾讯云的 Secret Key 填在 api_url 中"""
+    fields = ["api_key"]
+    if params.get("service") == "tencent":
+        fields.append("api_url")
+    return fields
+
+
+class JobStore:
+    """任务数据库，可在多个线程中同时使用"""
+
+    def __init__(self, path=DEFAULT_JOB_DB, secrets=None):
+        self.path = path
+        self.secrets = secrets or SecretStore(os.path.join(os.path.dirname(os.path.abspath(path)),
+                                                           "secrets.json"))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._adopted = {}  # id(params) -> 数据库 id，恢复的任务重新提交时沿用原记录
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT, owner_pid INTEGER,
+                owner_start TEXT DEFAULT '', file TEXT, output_dir TEXT, params TEXT, state TEXT,
+                message TEXT, priority INTEGER DEFAULT 0, created REAL, started REAL, finished REAL, pages INTEGER DEFAULT 0,
+                mono_path TEXT, dual_path TEXT, exit_code INTEGER, attempts INTEGER DEFAULT 0)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_file ON jobs (file)")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, definition in _ADDED_COLUMNS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+        self.owner_start = _process_identity(os.getpid())
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # 每次状态变化都落盘，断电后也不会丢失已提交的记录
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    # ---- 参数 ----
+    def _dump_params(self, params):
+        data = dict(params)
+        for field in _secret_fields(data):
+            data[field] = self.secrets.put(data.get(field, ""))
+        data["fallbacks"] = [dict(route, api_key=self.secrets.put(route.get("api_key", "")))
+                             for route in data.get("fallbacks") or []]
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+    def load_params(self, text):
+        """数据库中的参数，密钥引用替换为密钥本身"""
+        params = json.loads(text)
+        for field in _secret_fields(params):
+            params[field] = self.secrets.get(params.get(field, ""))
+        params["fallbacks"] = [dict(route, api_key=self.secrets.get(route.get("api_key", "")))
+                               for route in params.get("fallbacks") or []]
+        return params
+
+    # ---- 写入 ----
+    def add(self, params, source="", state="queued"):
+        mono_path, dual_path = kept_output_paths(params)
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (source, owner_pid, owner_start, file, output_dir, params, state, message, "
+                "priority, created, mono_path, dual_path) VALUES (?, ?, ?, ?, ?, ?, ?, '', ?, ?, ?, ?)",
+                (source, os.getpid(), self.owner_start, params.get("file_path", ""), params.get("output_dir", ""),
+                 self._dump_params(params), state, int(params.get("priority", 0) or 0), time.time(),
+                 mono_path, dual_path))
+            return cursor.lastrowid
+
+    def update(self, row_id, **fields):
+        if not fields:
+            return
+        columns = ", ".join(f"{key} = ?" for key in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), row_id))
+
+    def adopt(self, params, row_id):
+        """登记恢复的任务，提交到调度器后由 JobRecorder 沿用原记录"""
+        with self._lock:
+            self._adopted[id(params)] = (params, row_id)
+
+    def claim(self, params):
+        with self._lock:
+            item = self._adopted.pop(id(params), None)
+        return item[1] if item is not None and item[0] is params else None
+
+    # ---- 恢复 ----
+    def reconcile(self, sources, requeue=True):
+        """
+        检查 sources 中来源的未结束任务，返回 (需要重新排队的 [(数据库 id, 参数)], 已完成的任务数)
+
+        运行中断且保留的输出文件都在开始之后生成的任务标记为完成；其他进程仍在运行的任务跳过；
+        已中断 MAX_INTERRUPTIONS 次的任务标记为失败。
+        返回的任务已登记，直接提交到带 JobRecorder 的调度器即可沿用原记录。requeue 为 False 时
+        （如文件夹监视会自己重新发现文件）其余任务标记为取消，返回的列表为空。
+        """
+        placeholders = ", ".join("?" for _ in sources)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id, owner_pid, owner_start, params, state, started, mono_path, dual_path, attempts "
+                f"FROM jobs "
+                f"WHERE state IN ('queued', 'running') AND source IN ({placeholders}) ORDER BY id",
+                tuple(sources)).fetchall()
+        resumed = []
+        completed = 0
+        owner = {"owner_pid": os.getpid(), "owner_start": self.owner_start}
+        for row_id, owner_pid, owner_start, text, state, started, mono_path, dual_path, attempts in rows:
+            if owner_pid != os.getpid() and _process_alive(owner_pid, owner_start):
+                continue
+            # 按设置只保留一个版本的任务，另一项路径为空
+            outputs = [path for path in (mono_path, dual_path) if path]
+            if state == "running" and started and outputs and all(
+                    os.path.exists(path) and os.path.getmtime(path) >= started for path in outputs):
+                self.update(row_id, state="done", finished=max(map(os.path.getmtime, outputs)),
+                            message="程序退出期间已完成，输出文件已生成", **owner)
+                completed += 1
+                continue
+            if not requeue:
+                self.update(row_id, state="cancelled", finished=time.time(), message="程序中断，未自动恢复",
+                            **owner)
+                continue
+            if state == "running":
+                attempts += 1
+                if attempts >= MAX_INTERRUPTIONS:
+                    self.update(row_id, state="failed", attempts=attempts, finished=time.time(),
+                                message=f"任务已中断 {attempts} 次，不再自动恢复")
+                    continue
+            try:
+                params = self.load_params(text)
+            except ValueError:
+                self.update(row_id, state="failed", message="任务参数无法读取", finished=time.time())
+                continue
+            self.update(row_id, state="queued", attempts=attempts,
+                        message="程序重启后重新排队" if state == "running" else "", **owner)
+            self.adopt(params, row_id)
+            resumed.append((row_id, params))
+        return resumed, completed
+
+    # ---- 查询 ----
+    def query(self, state=None, search="", limit=200, offset=0):
+        """按创建时间倒序列出任务，state 为状态或状态列表，search 匹配文件路径"""
+        conditions, args = [], []
+        if state:
+            states = [state] if isinstance(state, str) else list(state)
+            conditions.append(f"state IN ({', '.join('?' for _ in states)})")
+            args.extend(states)
+        if search:
+            conditions.append("file LIKE ?")
+            args.append(f"%{search}%")
+        sql = ("SELECT id, source, file, output_dir, state, message, priority, created, started, finished, "
+               "pages, mono_path, dual_path, exit_code, attempts FROM jobs")
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY created DESC LIMIT ? OFFSET ?"
+        args.extend((limit, offset))
+        with self._connect() as conn:
+            rows = conn.execute(sql, args).fetchall()
+        keys = ("id", "source", "file", "output_dir", "state", "message", "priority", "created", "started",
+                "finished", "pages", "mono_path", "dual_path", "exit_code", "attempts")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def counts(self):
+        """各状态的任务数"""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def params(self, row_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT params FROM jobs WHERE id = ?", (row_id,)).fetchone()
+        return self.load_params(row[0]) if row else None
+
+
+class JobRecorder:
+    """
+    把调度器中顶层任务的状态变化写入 JobStore
+
+    detach() 之后不再写入，程序退出时先调用它，未结束的任务保持原状态，下次启动时恢复。
+    """
+
+    def __init__(self, store, source="", on_error=None):
+        self.store = store
+        self.source = source
+        self.on_error = on_error or (lambda message: None)
+        self._rows = {}  # 调度器任务 id -> (数据库 id, 上次记录的状态)
+        self._lock = threading.Lock()
+        self._detached = False
+
+    def attach(self, scheduler):
+        scheduler.add_listener(self.on_job_changed)
+
+    def detach(self):
+        self._detached = True
+
+    def row_id(self, job_id):
+        with self._lock:
+            item = self._rows.get(job_id)
+        return item[0] if item else None
+
+    def on_job_changed(self, job):
+        if self._detached or job.is_shard:
+            return
+        with self._lock:
+            row_id, last_state = self._rows.get(job.id, (None, None))
+            if last_state == job.state:
+                # 进度变化不写入数据库
+                return
+            self._rows[job.id] = (row_id, job.state)
+        try:
+            if row_id is None:
+                row_id = self.store.claim(job.params) or self.store.add(job.params, self.source, job.state)
+                with self._lock:
+                    self._rows[job.id] = (row_id, job.state)
+            fields = {"state": job.state, "message": job.message, "priority": job.priority}
+            if job.state == "running":
+                fields.update(started=job.started_at or time.time())
+            elif job.finished:
+                fields.update(finished=job.finished_at or time.time(), pages=job.total_pages,
+                              exit_code=job.exit_code, owner_pid=os.getpid(),
+                              owner_start=self.store.owner_start)
+                if job.state == "done":
+                    fields.update(zip(("mono_path", "dual_path"), kept_output_paths(job.params)))
+            self.store.update(row_id, **fields)
+        except (sqlite3.Error, OSError) as e:
+            self.on_error(f"写入任务数据库失败: {str(e)}")
@@ -0,0 +1,34 @@
+"""
+pdf2zh 子进程入口
+
+在与本程序相同的 Python 环境中运行 pdf2zh 命令行，运行前按环境变量启用翻译记忆和
+版面检测缓存，并启用用量计量（用量以 "[usage] {...}" 行写到 stderr）：
+
+    python launcher.py <pdf2zh 参数>
+"""
+import os
+import sys
+
+import usage
+import layout_cache
+import translation_memory
+
+
+def main(argv):
+    from pdf2zh.pdf2zh import main as pdf2zh_main
+    translation_memory.activate(
+        os.environ.get(translation_memory.MEMORY_ENV),
+        int(os.environ.get(translation_memory.MEMORY_MAX_ENV, translation_memory.DEFAULT_MAX_ENTRIES)))
+    layout_cache.activate(os.environ.get(layout_cache.LAYOUT_CACHE_ENV))
+    usage.activate_metering(usage.print_usage)
+    try:
+        return pdf2zh_main(argv)
+    finally:
+        usage.flush()
+        for message in (translation_memory.report(), layout_cache.report()):
+            if message:
+                print(message, file=sys.stderr, flush=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
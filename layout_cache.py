@@ -0,0 +1,147 @@
+"""
+版面检测结果缓存
+
+pdf2zh 为每一页渲染图像后用 DocLayout-YOLO（ONNX）检测版面，这一步与目标语言无关，
+却是翻译以外最耗时的阶段。启用后在 pdf2zh 进程中替换 OnnxModel.predict：以页面图像
+和模型为键，把检测结果保存在本地目录中，同一文档再次翻译（例如多目标语言任务的各个
+语言）时直接读取。
+
+多个进程同时需要同一页时，第一个进程创建锁文件负责检测，其余进程等待结果写入，
+因此各语言可以并发运行，而每页只检测一次。
+"""
+import os
+import time
+import hashlib
+import logging
+
+DEFAULT_LAYOUT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdf-translator", "layout")
+
+# pdf2zh 子进程通过环境变量获得缓存目录
+LAYOUT_CACHE_ENV = "PDF_TRANSLATOR_LAYOUT_CACHE"
+
+# 锁文件超过这个时间（秒）视为持有者已退出
+LOCK_TIMEOUT = 300
+
+_POLL_INTERVAL = 0.1
+
+logger = logging.getLogger("pdf_translator.layout")
+
+_state = {"dir": None, "hits": 0, "misses": 0}
+
+
+def page_key(model, image, imgsz):
+    digest = hashlib.sha1()
+    digest.update(os.path.basename(getattr(model, "model_path", "") or "").encode("utf-8"))
+    digest.update(f"|{image.shape}|{image.dtype}|{imgsz}|".encode("ascii"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def _result_rows(result):
+    """把 YoloResult 还原为 predict 内部的 (N, 6) 数组：x1, y1, x2, y2, conf, cls"""
+    import numpy as np
+    rows = [np.concatenate([box.xyxy, [box.conf, box.cls]]) for box in result.boxes]
+    return np.array(rows, dtype=np.float32).reshape(-1, 6)
+
+
+def _load(path):
+    import numpy as np
+    try:
+        return np.load(path, allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+
+
+def _save(path, rows):
+    import numpy as np
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, rows, allow_pickle=False)
+    os.replace(tmp_path, path)
+
+
+def _acquire(lock_path):
+    """创建锁文件，已被其他进程持有时返回 False"""
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def _wait(path, lock_path):
+    """等待其他进程写入检测结果；锁已释放或超时后返回已有的结果（可能为 None）"""
+    while True:
+        rows = _load(path) if os.path.exists(path) else None
+        if rows is not None:
+            return rows
+        try:
+            if time.time() - os.path.getmtime(lock_path) > LOCK_TIMEOUT:
+                os.remove(lock_path)
+                return None
+        except OSError:
+            # 锁已释放
+            return _load(path) if os.path.exists(path) else None
+        time.sleep(_POLL_INTERVAL)
+
+
+def cached_predict(original):
+    def predict(self, image, imgsz=1024, **kwargs):
+        cache_dir = _state["dir"]
+        if not cache_dir or kwargs:
+            return original(self, image, imgsz, **kwargs)
+        from pdf2zh.doclayout import YoloResult
+
+        key = page_key(self, image, imgsz)
+        path = os.path.join(cache_dir, key[:2], f"{key}.npy")
+        lock_path = path + ".lock"
+        rows = _load(path) if os.path.exists(path) else None
+        if rows is None and not _acquire(lock_path):
+            rows = _wait(path, lock_path)
+        if rows is not None:
+            _state["hits"] += 1
+            return [YoloResult(boxes=rows, names=self._names)]
+
+        _state["misses"] += 1
+        try:
+            results = original(self, image, imgsz, **kwargs)
+            try:
+                _save(path, _result_rows(results[0]))
+            except Exception as e:
+                logger.warning(f"无法保存版面检测结果: {str(e)}")
+            return results
+        finally:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+    predict._layout_cache = True
+    return predict
+
+
+def activate(cache_dir):
+    """在当前进程中启用版面检测缓存，cache_dir 为空时停用"""
+    _state.update(dir=cache_dir or None, hits=0, misses=0)
+    if not cache_dir:
+        return False
+    try:
+        from pdf2zh.doclayout import OnnxModel
+    except Exception as e:
+        logger.warning(f"无法启用版面检测缓存: {str(e)}")
+        _state["dir"] = None
+        return False
+    if not getattr(OnnxModel.predict, "_layout_cache", False):
+        OnnxModel.predict = cached_predict(OnnxModel.predict)
+    return True
+
+
+def report():
+    """返回本次任务的缓存命中统计并清零，未启用或没有检测时返回空字符串"""
+    hits, misses = _state["hits"], _state["misses"]
+    _state.update(hits=0, misses=0)
+    if not _state["dir"] or not hits + misses:
+        return ""
+    return f"版面检测: {hits} 页复用缓存结果，{misses} 页重新检测"
@@ -0,0 +1,375 @@
+"""
+本地 LLM 网关
+
+多个任务同时使用 OpenAI 兼容接口、Ollama 或 Xinference 时，每个 pdf2zh 进程各自建立
+到服务端的连接：重复的 TLS 握手，没有共享的长连接，不同任务中相同的请求（重复的图表
+标题、页眉）也会各发一次。启用网关后，程序在本机启动一个 asyncio 反向代理，通过
+OPENAI_BASE_URL、OLLAMA_HOST、XINFERENCE_HOST 把 pdf2zh 进程指向它：
+
+- 到每个上游的连接放在连接池中复用；
+- 正在进行的相同请求（方法、地址、请求体和密钥都相同）只发送一次，响应分发给所有请求方；
+- 每个上游有全局并发上限，所有任务共享；
+- 本机的上游（如 Ollama）在很短的时间窗口内到达的请求凑成一批同时放行，服务端可以在
+  同一个推理批次中处理它们，而不是逐个到达、逐个排队。
+
+网关在后台线程中运行自己的事件循环，只监听 127.0.0.1。
+"""
+import ssl
+import time
+import asyncio
+import hashlib
+import threading
+import urllib.parse
+
+from job_server import read_request, write_json, HTTPError
+
+# 服务 -> (pdf2zh 读取上游地址的环境变量, 默认地址)
+GATEWAY_UPSTREAMS = {
+    "openai": ("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+    "ollama": ("OLLAMA_HOST", "http://127.0.0.1:11434"),
+    "xinference": ("XINFERENCE_HOST", "http://127.0.0.1:9997"),
+}
+OLLAMA_DEFAULT_PORT = 11434
+
+DEFAULT_CAP = 8  # 每个上游同时进行的请求数
+DEFAULT_BATCH_WINDOW = 0.01  # 本机上游凑批的时间窗口（秒）
+
+MAX_BODY_BYTES = 32 * 1024 * 1024
+MAX_IDLE_SECONDS = 60  # 连接池中的空闲连接超过这个时间后不再使用
+UPSTREAM_TIMEOUT = 600
+
+# 不转发的逐跳请求头，Content-Length 和 Host 由网关重新生成
+HOP_BY_HOP = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "proxy-connection",
+              "te", "trailer", "transfer-encoding", "upgrade", "expect", "content-length", "host"}
+
+# 参与判断请求是否相同的请求头
+COALESCE_HEADERS = ("authorization", "api-key", "x-api-key", "accept-encoding", "content-type")
+
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+async def _read_chunked(reader):
+    parts = []
+    while True:
+        line = await reader.readline()
+        size = int(line.split(b";")[0].strip() or b"0", 16)
+        if not size:
+            break
+        parts.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+    # 跳过 trailer
+    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+        pass
+    return b"".join(parts)
+
+
+class _Upstream:
+    """一个上游服务器（scheme://host:port）的连接池、并发上限和凑批状态，只在事件循环线程中使用"""
+
+    def __init__(self, scheme, host, port, cap, batch_window, stats):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.host_header = host if port in (80, 443) else f"{host}:{port}"
+        self.cap = cap
+        self.batch_window = batch_window if host in LOCAL_HOSTS else 0
+        self.stats = stats
+        self.semaphore = asyncio.Semaphore(cap)
+        self.ssl_context = ssl.create_default_context() if scheme == "https" else None
+        self.idle = []  # [((reader, writer), 放回时间)]
+        self._batch = None
+        self._batch_size = 0
+        self._batch_timer = None
+
+    async def _wait_batch(self):
+        loop = asyncio.get_running_loop()
+        if self._batch is None:
+            self._batch = loop.create_future()
+            self._batch_size = 0
+            self._batch_timer = loop.call_later(self.batch_window, self._release_batch)
+        batch = self._batch
+        self._batch_size += 1
+        if self._batch_size >= self.cap:
+            self._release_batch()
+        await asyncio.shield(batch)
+
+    def _release_batch(self):
+        if self._batch is None:
+            return
+        self._batch_timer.cancel()
+        if self._batch_size > 1:
+            self.stats["batches"] += 1
+            self.stats["batched"] += self._batch_size
+        self._batch.set_result(None)
+        self._batch = None
+
+    async def _connect(self):
+        """返回 (连接, 是否为复用的连接)"""
+        now = time.monotonic()
+        while self.idle:
+            (reader, writer), since = self.idle.pop()
+            if writer.is_closing() or reader.at_eof() or now - since > MAX_IDLE_SECONDS:
+                writer.close()
+                continue
+            self.stats["reused"] += 1
+            return (reader, writer), True
+        connection = await asyncio.open_connection(self.host, self.port, ssl=self.ssl_context)
+        self.stats["connections"] += 1
+        return connection, False
+
+    async def fetch(self, method, target, headers, body):
+        """发送请求并读取完整响应，返回 (状态码, 原因短语, 响应头列表, 响应体)"""
+        if self.batch_window:
+            await self._wait_batch()
+        async with self.semaphore:
+            for attempt in range(2):
+                connection, reused = await self._connect()
+                try:
+                    response, keep_alive = await asyncio.wait_for(
+                        self._exchange(connection, method, target, headers, body), UPSTREAM_TIMEOUT)
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    connection[1].close()
+                    if reused and attempt == 0:
+                        # 空闲连接已被服务端关闭，换一个新连接重试
+                        continue
+                    raise ConnectionError(str(e) or "上游连接中断")
+                except BaseException:
+                    connection[1].close()
+                    raise
+                if keep_alive and len(self.idle) < self.cap:
+                    self.idle.append((connection, time.monotonic()))
+                else:
+                    connection[1].close()
+                return response
+
+    async def _exchange(self, connection, method, target, headers, body):
+        reader, writer = connection
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {self.host_header}"]
+        lines += [f"{name}: {value}" for name, value in headers]
+        if body or method in ("POST", "PUT", "PATCH"):
+            lines.append(f"Content-Length: {len(body)}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+        head = await reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        version, status, reason = (status_line.split(" ", 2) + [""])[:3]
+        status = int(status)
+        response_headers = []
+        for line in header_lines:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                response_headers.append((name.strip(), value.strip()))
+        lookup = {name.lower(): value for name, value in response_headers}
+        keep_alive = version == "HTTP/1.1" and lookup.get("connection", "").lower() != "close"
+
+        if method == "HEAD" or status in (204, 304) or status < 200:
+            content = b""
+        elif "chunked" in lookup.get("transfer-encoding", "").lower():
+            content = await _read_chunked(reader)
+        elif "content-length" in lookup:
+            content = await reader.readexactly(int(lookup["content-length"]))
+        else:
+            content = await reader.read()
+            keep_alive = False
+        response_headers = [(name, value) for name, value in response_headers if name.lower() not in HOP_BY_HOP]
+        return (status, reason, response_headers, content), keep_alive
+
+    def close(self):
+        for (_, writer), _ in self.idle:
+            writer.close()
+        self.idle.clear()
+
+
+class LlmGateway:
+    """
+    在后台线程中运行的本地反向代理
+
+    start() 后用 apply(params, env) 把 pdf2zh 的环境变量指向网关；各任务共用同一个网关，
+    因此连接池、相同请求合并和并发上限在所有任务之间生效。
+    """
+
+    def __init__(self, cap=DEFAULT_CAP, batch_window=DEFAULT_BATCH_WINDOW):
+        self.cap = max(1, int(cap))
+        self.batch_window = max(0.0, batch_window)
+        self.port = None
+        self.loop = None
+        self.stats = {"requests": 0, "coalesced": 0, "connections": 0, "reused": 0,
+                      "batches": 0, "batched": 0, "errors": 0}
+        self._routes = {}  # 路由键 -> 上游基地址
+        self._lock = threading.Lock()
+        self._upstreams = {}  # (scheme, host, port) -> _Upstream，只在事件循环线程中使用
+        self._inflight = {}  # 请求摘要 -> 首个请求的 Future，只在事件循环线程中使用
+        self._thread = None
+        self._stop = None
+
+    # ---- 启动与停止 ----
+    def start(self):
+        """启动网关并返回本地地址，已启动时直接返回"""
+        if self._thread is not None:
+            return self.address
+        ready = threading.Event()
+        errors = []
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve(ready, errors)),
+                                        name="llm-gateway", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if errors:
+            self._thread = None
+            raise errors[0]
+        return self.address
+
+    @property
+    def address(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    async def _serve(self, ready, errors):
+        self.loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        try:
+            server = await asyncio.start_server(self.handle_connection, "127.0.0.1", 0)
+        except OSError as e:
+            errors.append(e)
+            ready.set()
+            return
+        self.port = server.sockets[0].getsockname()[1]
+        ready.set()
+        try:
+            await self._stop.wait()
+        finally:
+            server.close()
+            for upstream in self._upstreams.values():
+                upstream.close()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join(5)
+        self._thread = None
+        self.port = None
+
+    # ---- 路由 ----
+    def route(self, url):
+        """登记上游基地址，返回 pdf2zh 进程应使用的本地地址"""
+        if "://" not in url:
+            url = f"http://{url}"
+        url = url.rstrip("/")
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:10]
+        with self._lock:
+            self._routes[key] = url
+        return f"{self.address}/{key}"
+
+    def apply(self, params, env):
+        """把 env 中该任务翻译服务的上游地址替换为网关地址，网关不支持的服务不修改"""
+        upstream = GATEWAY_UPSTREAMS.get(params["service"])
+        if upstream is None or self.port is None:
+            return env
+        variable, default = upstream
+        url = env.get(variable) or default
+        if "://" not in url:
+            url = f"http://{url}"
+        if params["service"] == "ollama" and not urllib.parse.urlsplit(url).port:
+            # Ollama 客户端在地址不带端口时使用 11434
+            parts = urllib.parse.urlsplit(url)
+            url = urllib.parse.urlunsplit(parts._replace(netloc=f"{parts.netloc}:{OLLAMA_DEFAULT_PORT}"))
+        env[variable] = self.route(url)
+        return env
+
+    def _upstream(self, base):
+        url = urllib.parse.urlsplit(base)
+        scheme = url.scheme.lower()
+        port = url.port or (443 if scheme == "https" else 80)
+        key = (scheme, url.hostname, port)
+        upstream = self._upstreams.get(key)
+        if upstream is None:
+            upstream = _Upstream(scheme, url.hostname, port, self.cap, self.batch_window, self.stats)
+            self._upstreams[key] = upstream
+        return upstream, url.path
+
+    # ---- 请求处理 ----
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    keep_alive = await self.forward(request, writer)
+                except HTTPError as e:
+                    write_json(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    keep_alive = False
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def forward(self, request, writer):
+        key, _, rest = request.target.lstrip("/").partition("/")
+        with self._lock:
+            base = self._routes.get(key)
+        if base is None:
+            raise HTTPError(404)
+        if request.remaining > MAX_BODY_BYTES:
+            raise HTTPError(413)
+        body = await request.reader.readexactly(request.remaining) if request.remaining else b""
+        request.remaining = 0
+
+        upstream, base_path = self._upstream(base)
+        target = f"{base_path}/{rest}" if rest else base_path or "/"
+        headers = [(name, value) for name, value in request.headers.items() if name not in HOP_BY_HOP]
+        digest = hashlib.sha256()
+        for part in [request.method, upstream.scheme, upstream.host_header, target] + \
+                [request.headers.get(name, "") for name in COALESCE_HEADERS]:
+            digest.update(part.encode("utf-8") + b"\0")
+        digest.update(body)
+
+        self.stats["requests"] += 1
+        try:
+            status, reason, response_headers, content = await self._coalesced(
+                digest.hexdigest(), lambda: upstream.fetch(request.method, target, headers, body))
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as e:
+            self.stats["errors"] += 1
+            write_json(writer, 502, {"error": f"上游服务不可用: {str(e) or type(e).__name__}"},
+                       keep_alive=request.keep_alive)
+            return request.keep_alive
+
+        lines = [f"HTTP/1.1 {status} {reason}"]
+        lines += [f"{name}: {value}" for name, value in response_headers]
+        lines.append(f"Content-Length: {len(content)}")
+        lines.append(f"Connection: {'keep-alive' if request.keep_alive else 'close'}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + content)
+        return request.keep_alive
+
+    async def _coalesced(self, key, fetch):
+        """相同的请求正在进行时等待它的响应，否则由本请求发送"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+        future = self.loop.create_future()
+        self._inflight[key] = future
+        try:
+            response = await fetch()
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e if isinstance(e, Exception) else ConnectionError("请求已取消"))
+            # 没有其他等待者时避免“异常未被获取”的警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+
+def format_stats(stats):
+    text = (f"请求 {stats['requests']} 次，合并相同请求 {stats['coalesced']} 次，"
+            f"上游连接 {stats['connections']} 个 (复用 {stats['reused']} 次)")
+    if stats["batches"]:
+        text += f"，{stats['batches']} 批共 {stats['batched']} 个请求同时放行"
+    if stats["errors"]:
+        text += f"，失败 {stats['errors']} 次"
+    return text
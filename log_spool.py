@@ -0,0 +1,83 @@
+"""
+翻译日志缓冲
+
+翻译线程写入的每一行先进入待刷新队列，由界面定时批量取出显示；界面只保留固定
+行数，完整日志同时写入磁盘文件，长时间运行也不会占用越来越多的内存。
+"""
+import os
+import time
+import threading
+from collections import deque
+
+DEFAULT_LOG_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdf-translator", "logs")
+
+
+class LogSpool:
+    """线程安全的日志缓冲：待刷新队列 + 固定容量的最近日志 + 完整日志文件"""
+
+    def __init__(self, log_dir=DEFAULT_LOG_DIR, capacity=5000, keep_files=20):
+        self.capacity = capacity
+        self.ring = deque(maxlen=capacity)
+        self.total_lines = 0
+        self.dropped = 0  # 两次刷新之间超出容量而未显示的行数
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._file = None
+        self.path = None
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            self._prune(log_dir, keep_files)
+            self.path = os.path.join(log_dir, time.strftime("pdf2zh-%Y%m%d-%H%M%S.log"))
+            self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+        except OSError:
+            self._file = None
+            self.path = None
+
+    @staticmethod
+    def _prune(log_dir, keep_files):
+        """只保留最近的若干个日志文件"""
+        names = sorted(name for name in os.listdir(log_dir) if name.startswith("pdf2zh-") and name.endswith(".log"))
+        for name in names[:max(len(names) - keep_files + 1, 0)]:
+            try:
+                os.remove(os.path.join(log_dir, name))
+            except OSError:
+                pass
+
+    def append(self, line):
+        with self._lock:
+            self.total_lines += 1
+            self.ring.append(line)
+            if len(self._pending) >= self.capacity:
+                self._pending.popleft()
+                self.dropped += 1
+            self._pending.append(line)
+            if self._file is not None:
+                try:
+                    self._file.write(line + "\n")
+                except (OSError, ValueError):
+                    self._file = None
+
+    def drain(self):
+        """取出所有待显示的行，返回 (行列表, 被丢弃的行数)"""
+        with self._lock:
+            lines = list(self._pending)
+            self._pending.clear()
+            dropped, self.dropped = self.dropped, 0
+        return lines, dropped
+
+    def is_empty(self):
+        return self.total_lines == 0
+
+    def clear(self):
+        """清空界面缓冲，完整日志文件保留"""
+        with self._lock:
+            self.ring.clear()
+            self._pending.clear()
+            self.total_lines = 0
+            self.dropped = 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
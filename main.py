@@ -1,219 +1,191 @@
 import os
 import sys
-import subprocess
 import json
-import re
+import time
+import sqlite3
+import multiprocessing
 from pathlib import Path
+
+# 无界面模式：不导入 Qt
+if __name__ == '__main__' and '--headless' in sys.argv[1:]:
+    from headless import main as headless_main
+    sys.exit(headless_main([arg for arg in sys.argv[1:] if arg != '--headless']))
+
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QLabel, 
                             QFileDialog, QComboBox, QLineEdit, QProgressBar, 
                             QTabWidget, QWidget, QVBoxLayout, QHBoxLayout, 
-                            QGridLayout, QCheckBox, QSpinBox, QTextEdit, 
-                            QGroupBox, QFormLayout, QDialogButtonBox, QMessageBox)
-from PyQt5.QtCore import QThread, pyqtSignal, Qt
-from PyQt5.QtGui import QIcon, QFont, QTextCursor
+                            QGridLayout, QCheckBox, QSpinBox, QDoubleSpinBox, QPlainTextEdit, 
+                            QGroupBox, QFormLayout, QDialogButtonBox, QMessageBox,
+                            QTableWidget, QTableWidgetItem, QHeaderView,
+                            QAbstractItemView, QDialog, QMenu)
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal, Qt
+from PyQt5.QtGui import QIcon, QFont, QTextCursor, QTextCharFormat, QColor
 import sys
 import os
 
-# 翻译服务配置
-TRANSLATION_SERVICES = {
-    "Google (默认)": "google",
-    "Bing": "bing",
-    "DeepL": "deepl",
-    "OpenAI": "openai",
-    "Azure OpenAI": "azure-openai",
-    "智谱 AI": "zhipu",
-    "魔搭 ModelScope": "modelscope",
-    "Ollama (本地模型)": "ollama",
-    "Xinference (本地模型)": "xinference",
-    "Gemini": "gemini",
-    "DeepSeek": "deepseek",
-    "阿里千问翻译": "qwen-mt",
-    "硅基流动": "silicon",  # 新增 Silicon 服务
-    "腾讯云翻译": "tencent"  # 新增 腾讯云翻译 服务
-}
-
-# 模型配置
-MODEL_OPTIONS = {
-    "openai": ["gpt-4o-mini", "gpt-4o", "gpt-3.5-turbo"],
-    "azure-openai": ["gpt-4o-mini", "gpt-4o", "gpt-3.5-turbo"],
-    "zhipu": ["glm-4-flash", "glm-4", "glm-3-turbo"],
-    "modelscope": ["Qwen/Qwen2.5-Coder-32B-Instruct", "Qwen/Qwen2.5-7B-Instruct"],
-    "ollama": ["gemma2", "llama3", "mixtral"],
-    "xinference": ["gemma-2-it", "llama3", "qwen2"],
-    "gemini": ["gemini-1.5-flash", "gemini-1.5-pro"],
-    "deepseek": ["deepseek-chat", "deepseek-coder"],
-    "qwen-mt": ["qwen-mt-turbo"],
-    "silicon": ["deepseek-ai/DeepSeek-V3", "Qwen/Qwen2.5-7B-Instruct"],  # 新增 Silicon 模型选项
-    "tencent": []  # 腾讯云翻译不需要选择模型
-}
+from core import (TRANSLATION_SERVICES, MODEL_OPTIONS, LANGUAGES, TranslationRunner,
+                  default_output_dir, kept_output_paths, find_pdfs, validate_params, normalize_route,
+                  service_display_name, setup_console_encoding, OUTPUT_VARIANTS)
+from scheduler import JobScheduler, JobState, JOB_STATE_LABELS
+from worker_pool import WorkerPool
+from result_cache import ResultCache
+from log_spool import LogSpool
+from sharding import ShardPlanner, estimate_pages, merge_runner
+from llm_gateway import LlmGateway, format_stats as format_gateway_stats
+from resource_governor import ResourceGovernor, DEFAULT_RESERVE_PERCENT
+from postprocess import OutputProcessor, DEFAULT_WORKERS as DEFAULT_OPTIMIZE_WORKERS
+from concurrency import ConcurrencyController
+from telemetry import TelemetryLog, format_rollup, format_seconds
+from translation_memory import TranslationMemory
+from folder_watcher import FolderWatcher
+from preflight import Preflight, plan, format_report
+from usage import UsageLedger, format_summary
+from routing import ProviderRouter, format_health
+from downloader import DownloadCache, UrlPreparer
+from job_store import JobStore, JobRecorder
+from page_diff import VersionIndex
 
-# 语言映射
-LANGUAGES = {
-    "英语": "en", 
-    "中文(简体)": "zh-CN",
-    "中文(繁体)": "zh-TW",
-    "日语": "ja",
-    "韩语": "ko",
-    "法语": "fr",
-    "德语": "de",
-    "西班牙语": "es",
-    "俄语": "ru"
-}
-# 设置编码
-if sys.stdout.encoding != 'utf-8':
-    if hasattr(sys.stdout, 'reconfigure'):
-        sys.stdout.reconfigure(encoding='utf-8')
-    elif hasattr(sys.stdout, 'buffer'):
-        import io
-        sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+setup_console_encoding()
 
-os.environ['PYTHONIOENCODING'] = 'utf-8'
 
 class TranslationThread(QThread):
     progress_signal = pyqtSignal(str)
     progress_update = pyqtSignal(int, int)  # 当前页数，总页数
     finished_signal = pyqtSignal(bool, str)
     
-    def __init__(self, params):
+    def __init__(self, params, worker_pool=None, result_cache=None, shard_params=None, concurrency=None,
+                 telemetry=None, usage=None, router=None, gateway=None, postprocessor=None):
         super().__init__()
         self.params = params
-        self.process = None
+        if shard_params or params.get("reuse"):
+            # 全部分片完成后合并结果，增量翻译时与上一版本中未变化的页拼接，多语言任务整理各语言的结果
+            self.runner = merge_runner(params, shard_params, result_cache,
+                                       on_log=self.progress_signal.emit, telemetry=telemetry,
+                                       postprocessor=postprocessor)
+        else:
+            self.runner = TranslationRunner(
+                params, worker_pool, result_cache,
+                on_log=self.progress_signal.emit,
+                on_progress=self.progress_update.emit,
+                concurrency=concurrency,
+                telemetry=telemetry,
+                usage=usage,
+                router=router,
+                gateway=gateway,
+                postprocessor=postprocessor
+            )
         
     def run(self):
-        try:
-            command = ["pdf2zh"]
-            
-            # 文件或URL
-            if self.params["file_path"]:
-                command.append(self.params["file_path"])
-            
-            # 翻译服务和模型
-            if self.params["service"]:
-                if self.params["model"]:
-                    command.extend(["-s", f"{self.params['service']}:{self.params['model']}"])
-                else:
-                    command.extend(["-s", self.params["service"]])
-            
-            # 语言设置
-            if self.params["source_lang"]:
-                command.extend(["-li", self.params["source_lang"]])
-            if self.params["target_lang"]:
-                command.extend(["-lo", self.params["target_lang"]])
-            
-            # 线程数
-            if self.params["threads"] > 0:
-                command.extend(["-t", str(self.params["threads"])])
-            
-            # 输出目录
-            if self.params["output_dir"]:
-                command.extend(["-o", self.params["output_dir"]])
-            
-            # 特定页面
-            if self.params["pages"]:
-                command.extend(["-p", self.params["pages"]])
-            
-            # 兼容模式
-            if self.params["compatible_mode"]:
-                command.append("-cp")
-            
-            # 跳过字体子集化
-            if self.params["skip_subset_fonts"]:
-                command.append("--skip-subset-fonts")
-            
-            # 设置环境变量
-            env = os.environ.copy()
-            if self.params["api_key"]:
-                service_upper = self.params["service"].upper().replace("-", "_")
-                env[f"{service_upper}_API_KEY"] = self.params["api_key"]
-                
-                # 特殊处理OpenAI和其他服务
-                if self.params["service"] == "openai":
-                    env["OPENAI_API_KEY"] = self.params["api_key"]
-                elif self.params["service"] == "azure-openai":
-                    env["AZURE_OPENAI_API_KEY"] = self.params["api_key"]
-                elif self.params["service"] == "deepseek":
-                    env["DEEPSEEK_API_KEY"] = self.params["api_key"]
-                elif self.params["service"] == "silicon":
-                    env["SILICON_API_KEY"] = self.params["api_key"]
-                elif self.params["service"] == "tencent":
-                    env["TENCENTCLOUD_SECRET_ID"] = self.params["api_key"]
-                    env["TENCENTCLOUD_SECRET_KEY"] = self.params["api_url"]  # 腾讯云使用API URL字段作为SECRET_KEY
-            
-            if self.params["api_url"] and self.params["service"] in ["openai", "azure-openai", "xinference", "ollama"]:
-                if self.params["service"] == "openai":
-                    env["OPENAI_BASE_URL"] = self.params["api_url"]
-                elif self.params["service"] == "azure-openai":
-                    env["AZURE_OPENAI_BASE_URL"] = self.params["api_url"]
-                elif self.params["service"] == "xinference":
-                    env["XINFERENCE_HOST"] = self.params["api_url"]
-                elif self.params["service"] == "ollama":
-                    env["OLLAMA_HOST"] = self.params["api_url"]
-            
-            # 如果有选择模型，设置对应环境变量
-            if self.params["model"] and self.params["service"] in ["openai", "azure-openai", "deepseek", "zhipu", "modelscope", "ollama", "xinference", "gemini", "silicon"]:
-                service_upper = self.params["service"].upper().replace("-", "_")
-                env[f"{service_upper}_MODEL"] = self.params["model"]
-            
-            # 显示命令
-            command_str = " ".join(command)
-            self.progress_signal.emit(f"执行命令: {command_str}")
-            
-            # 执行命令
-            self.process = subprocess.Popen(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                env=env,
-                bufsize=1,
-                universal_newlines=True
-            )
-            
-            # 正则表达式匹配进度
-            page_pattern = re.compile(r'Processing page (\d+) of (\d+)')
-            translation_pattern = re.compile(r'Translating batch \d+/(\d+)')
-            
-            # 读取输出
-            for line in iter(self.process.stdout.readline, ''):
-                if not line:
-                    break
-                
-                self.progress_signal.emit(line.strip())
-                
-                # 解析进度
-                page_match = page_pattern.search(line)
-                if page_match:
-                    current_page = int(page_match.group(1))
-                    total_pages = int(page_match.group(2))
-                    self.progress_update.emit(current_page, total_pages)
-                    continue
-                
-                # 翻译批次进度
-                trans_match = translation_pattern.search(line)
-                if trans_match:
-                    total_batches = int(trans_match.group(1))
-                    if 'Translating batch 1/' in line:
-                        self.progress_signal.emit(f"共有 {total_batches} 个翻译批次需要处理")
-            
-            # 获取返回码
-            return_code = self.process.wait()
-            
-            if return_code == 0:
-                self.finished_signal.emit(True, "翻译完成")
-            else:
-                stderr = self.process.stderr.read()
-                self.finished_signal.emit(False, f"翻译失败: {stderr}")
-                
-        except Exception as e:
-            self.finished_signal.emit(False, f"发生错误: {str(e)}")
+        success, message = self.runner.run()
+        self.finished_signal.emit(success, message)
     
     def stop(self):
-        if self.process:
-            self.process.terminate()
-            self.process = None
+        self.runner.stop()
+    
+    def suspend(self):
+        """抢占时挂起 pdf2zh 进程，合并任务不能挂起"""
+        return self.runner.suspend() if hasattr(self.runner, "suspend") else False
+    
+    def resume(self):
+        if hasattr(self.runner, "resume"):
+            self.runner.resume()
+
+
+class JobHistoryDialog(QDialog):
+    """任务数据库中的历史任务，可按状态和文件名筛选，选中的任务可以重新加入队列"""
+    
+    ROW_LIMIT = 500
+    
+    def __init__(self, store, on_requeue, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.on_requeue = on_requeue
+        self.setWindowTitle("历史任务")
+        self.resize(900, 500)
+        layout = QVBoxLayout()
+        
+        filter_layout = QHBoxLayout()
+        self.state_combo = QComboBox()
+        self.state_combo.addItem("全部", None)
+        for state, label in JOB_STATE_LABELS.items():
+            self.state_combo.addItem(label, state)
+        self.state_combo.currentIndexChanged.connect(self.refresh)
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("按文件路径搜索，回车确认")
+        self.search_edit.returnPressed.connect(self.refresh)
+        filter_layout.addWidget(QLabel("状态:"))
+        filter_layout.addWidget(self.state_combo)
+        filter_layout.addWidget(self.search_edit, 1)
+        layout.addLayout(filter_layout)
+        
+        self.table = QTableWidget(0, 7)
+        self.table.setHorizontalHeaderLabels(["文件", "来源", "状态", "创建时间", "耗时", "返回码", "信息"])
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.horizontalHeader().setSectionResizeMode(6, QHeaderView.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table)
+        
+        button_layout = QHBoxLayout()
+        self.count_label = QLabel()
+        requeue_button = QPushButton("重新加入队列")
+        requeue_button.clicked.connect(self.requeue_selected)
+        close_button = QPushButton("关闭")
+        close_button.clicked.connect(self.accept)
+        button_layout.addWidget(self.count_label, 1)
+        button_layout.addWidget(requeue_button)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+        self.refresh()
+    
+    def refresh(self):
+        try:
+            rows = self.store.query(self.state_combo.currentData(), self.search_edit.text().strip(),
+                                    limit=self.ROW_LIMIT)
+            counts = self.store.counts()
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "警告", f"无法读取任务数据库: {str(e)}")
+            return
+        self.table.setRowCount(len(rows))
+        for index, row in enumerate(rows):
+            duration = (format_seconds(row["finished"] - row["started"])
+                        if row["started"] and row["finished"] else "")
+            message = (row["message"] or "").strip()
+            values = [row["file"], row["source"], JOB_STATE_LABELS.get(row["state"], row["state"]),
+                      time.strftime("%Y-%m-%d %H:%M", time.localtime(row["created"])), duration,
+                      "" if row["exit_code"] is None else str(row["exit_code"]),
+                      message.splitlines()[-1] if message else ""]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column == 0:
+                    item.setData(Qt.UserRole, row["id"])
+                    item.setToolTip(row["file"])
+                elif column == 6:
+                    item.setToolTip(message)
+                self.table.setItem(index, column, item)
+        self.count_label.setText(f"共 {sum(counts.values())} 个任务，显示最近 {len(rows)} 个")
+    
+    def requeue_selected(self):
+        rows = sorted({index.row() for index in self.table.selectedIndexes()})
+        params_list = []
+        for row in rows:
+            try:
+                params = self.store.params(self.table.item(row, 0).data(Qt.UserRole))
+            except (sqlite3.Error, ValueError):
+                params = None
+            if params is not None:
+                params_list.append(params)
+        if params_list:
+            self.on_requeue(params_list)
 
 
 class PDF2ZHTranslator(QMainWindow):
+    watch_log_signal = pyqtSignal(str)  # 监视线程的日志
+    budget_exceeded_signal = pyqtSignal(str)  # 翻译线程中触发的会话预算超限
+    invoke_signal = pyqtSignal(object)  # 在主线程中执行的回调（下载线程使用）
+    
     def __init__(self):
         super().__init__()
         self.initUI()
@@ -225,14 +197,79 @@ class PDF2ZHTranslator(QMainWindow):
         # 创建标签页
         self.tabs = QTabWidget()
         self.tab_basic = QWidget()
+        self.tab_queue = QWidget()
         self.tab_advanced = QWidget()
         self.tab_log = QWidget()
         
         self.tabs.addTab(self.tab_basic, "基本设置")
+        self.tabs.addTab(self.tab_queue, "任务队列")
         self.tabs.addTab(self.tab_advanced, "高级设置")
         self.tabs.addTab(self.tab_log, "翻译日志")
         
+        # 初始化任务调度器
+        self.preflight = Preflight()
+        self.invoke_signal.connect(lambda function: function())
+        try:
+            # URL 任务加入队列后立即在后台下载，调度器的回调转到主线程执行
+            preparer = UrlPreparer(DownloadCache(),
+                                   on_log=lambda job, message: self.append_log(f"[#{job.id}] {message}"),
+                                   call=lambda function, *args: self.invoke_signal.emit(lambda: function(*args)))
+        except OSError:
+            preparer = None
+        self.scheduler = JobScheduler(self.launch_job, expander=ShardPlanner(self.preflight, VersionIndex()),
+                                      preparer=preparer, estimator=estimate_pages)
+        self.scheduler.add_listener(self.on_job_changed)
+        # 采样各任务的内存和 CPU，内存不足时暂停派发、挂起或停止低优先级任务
+        self.governor = ResourceGovernor(on_log=self.append_log,
+                                         call=lambda function, *args: self.invoke_signal.emit(lambda: function(*args)))
+        self.governor.attach(self.scheduler)
+        try:
+            # 记录任务，程序退出或崩溃后未完成的任务在下次启动时恢复
+            self.job_store = JobStore()
+            self.job_recorder = JobRecorder(self.job_store, "gui", on_error=self.append_log)
+            self.job_recorder.attach(self.scheduler)
+        except (OSError, sqlite3.Error):
+            self.job_store = None
+            self.job_recorder = None
+        self.job_threads = {}
+        self.job_rows = {}
+        self.worker_pool = None
+        self.worker_pool_settings = None
+        self.gateway = None
+        self.postprocessor = OutputProcessor()
+        self.log_spool = LogSpool()
+        self.concurrency = ConcurrencyController()
+        self.router = ProviderRouter()
+        try:
+            self.translation_memory = TranslationMemory()
+        except (OSError, sqlite3.Error):
+            self.translation_memory = None
+        self.telemetry = TelemetryLog()
+        try:
+            self.usage_ledger = UsageLedger(on_session_exceeded=self.budget_exceeded_signal.emit)
+        except (OSError, sqlite3.Error):
+            # 无法写入用量数据库时仍统计本次会话并执行预算
+            self.usage_ledger = UsageLedger(path="", on_session_exceeded=self.budget_exceeded_signal.emit)
+        self.budget_exceeded_signal.connect(self.on_budget_exceeded)
+        try:
+            self.result_cache = ResultCache()
+        except OSError:
+            self.result_cache = None
+        self.queue_timer = QTimer(self)
+        self.queue_timer.setInterval(1000)
+        self.queue_timer.timeout.connect(self.refresh_queue_view)
+        
+        # 监视文件夹
+        self.watcher = None
+        self.watch_params = None
+        self.watch_digests = {}  # 任务 id -> 内容哈希
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setInterval(1000)
+        self.watch_timer.timeout.connect(self.poll_watch_folder)
+        self.watch_log_signal.connect(lambda message: self.append_log(f"[监视] {message}"))
+        
         self.setup_basic_tab()
+        self.setup_queue_tab()
         self.setup_advanced_tab()
         self.setup_log_tab()
         
@@ -273,8 +310,7 @@ class PDF2ZHTranslator(QMainWindow):
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
         
-        # 初始化翻译线程
-        self.translation_thread = None
+        self.resume_interrupted_jobs()
     
     def setup_basic_tab(self):
         layout = QFormLayout()
@@ -286,8 +322,12 @@ class PDF2ZHTranslator(QMainWindow):
         self.file_path.textChanged.connect(self.update_default_output_dir)
         browse_button = QPushButton("浏览...")
         browse_button.clicked.connect(self.browse_file)
+        preflight_button = QPushButton("预检")
+        preflight_button.setToolTip("分析PDF结构，查看需要翻译的页数、建议设置和各服务的费用估算")
+        preflight_button.clicked.connect(self.show_preflight_report)
         file_layout.addWidget(self.file_path)
         file_layout.addWidget(browse_button)
+        file_layout.addWidget(preflight_button)
         layout.addRow("PDF文件/URL:", file_layout)
         
         # 翻译服务选择
@@ -334,6 +374,19 @@ class PDF2ZHTranslator(QMainWindow):
         layout.addRow("源语言:", self.source_lang)
         layout.addRow("目标语言:", self.target_lang)
         
+        # 多目标语言：同时翻译为勾选的其他语言，版面分析只做一次
+        self.extra_langs_button = QPushButton()
+        self.extra_langs_menu = QMenu(self.extra_langs_button)
+        for lang_name in LANGUAGES:
+            action = self.extra_langs_menu.addAction(lang_name)
+            action.setCheckable(True)
+            action.toggled.connect(self.update_extra_langs_label)
+        self.extra_langs_button.setMenu(self.extra_langs_menu)
+        self.extra_langs_button.setToolTip("同时翻译为勾选的语言，输出文件名带语言代码，如 paper-ja-mono.pdf")
+        self.target_lang.currentTextChanged.connect(self.update_extra_langs_label)
+        self.update_extra_langs_label()
+        layout.addRow("其他目标语言:", self.extra_langs_button)
+        
         # 输出目录
         output_layout = QHBoxLayout()
         self.output_dir = QLineEdit()
@@ -349,6 +402,112 @@ class PDF2ZHTranslator(QMainWindow):
         # 初始化模型选项
         self.update_model_options()
     
+    def setup_queue_tab(self):
+        layout = QVBoxLayout()
+        
+        # 添加任务
+        add_layout = QHBoxLayout()
+        add_files_button = QPushButton("添加文件...")
+        add_files_button.clicked.connect(self.add_files_to_queue)
+        add_folder_button = QPushButton("添加文件夹...")
+        add_folder_button.clicked.connect(self.add_folder_to_queue)
+        add_layout.addWidget(add_files_button)
+        add_layout.addWidget(add_folder_button)
+        self.watch_button = QPushButton("监视文件夹...")
+        self.watch_button.setToolTip("新的PDF写入完成后按当前设置自动翻译")
+        self.watch_button.clicked.connect(self.toggle_watch_folder)
+        add_layout.addWidget(self.watch_button)
+        add_layout.addStretch()
+        
+        # 并行任务数
+        add_layout.addWidget(QLabel("并行任务数:"))
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 8)
+        self.concurrency_spin.setValue(1)
+        self.concurrency_spin.valueChanged.connect(self.scheduler.set_max_concurrent)
+        add_layout.addWidget(self.concurrency_spin)
+        layout.addLayout(add_layout)
+        
+        # 调度策略
+        policy_layout = QHBoxLayout()
+        self.shortest_first_check = QCheckBox("短任务优先")
+        self.shortest_first_check.setToolTip("按估计的剩余页数从少到多派发任务")
+        self.fair_share_check = QCheckBox("按来源公平分配")
+        self.fair_share_check.setToolTip("不同文件夹（或网站）的任务轮流占用并行槽位，避免一批长任务占满队列")
+        self.preempt_check = QCheckBox("允许抢占")
+        self.preempt_check.setToolTip("更高优先级的任务或几页的短任务到来时挂起正在运行的长任务，"
+                                      "之后从暂停处继续（Windows 不支持）")
+        for check in (self.shortest_first_check, self.fair_share_check, self.preempt_check):
+            check.toggled.connect(self.update_schedule_policy)
+            policy_layout.addWidget(check)
+        policy_layout.addStretch()
+        layout.addLayout(policy_layout)
+        
+        self.watch_label = QLabel("")
+        self.watch_label.setVisible(False)
+        layout.addWidget(self.watch_label)
+        
+        # 任务列表
+        self.queue_table = QTableWidget(0, 8)
+        self.queue_table.setHorizontalHeaderLabels(["文件", "状态", "优先级", "进度", "耗时", "剩余", "内存/CPU", "信息"])
+        self.queue_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.queue_table.horizontalHeader().setSectionResizeMode(7, QHeaderView.Stretch)
+        self.queue_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.queue_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.queue_table.verticalHeader().setVisible(False)
+        layout.addWidget(self.queue_table)
+        
+        # 吞吐量统计
+        self.throughput_label = QLabel("队列为空")
+        layout.addWidget(self.throughput_label)
+        
+        # 系统内存和资源管理状态
+        self.resource_label = QLabel("")
+        layout.addWidget(self.resource_label)
+        
+        # 各服务吞吐量、阶段耗时和资源占用汇总
+        telemetry_layout = QHBoxLayout()
+        self.telemetry_label = QLabel("暂无统计")
+        self.telemetry_label.setWordWrap(True)
+        open_telemetry_button = QPushButton("打开统计记录")
+        open_telemetry_button.setToolTip("每个任务的阶段耗时、吞吐量和资源占用 (JSON Lines)")
+        open_telemetry_button.clicked.connect(self.open_telemetry_log)
+        telemetry_layout.addWidget(self.telemetry_label, 1)
+        telemetry_layout.addWidget(open_telemetry_button)
+        layout.addLayout(telemetry_layout)
+        
+        # 本次费用
+        self.usage_label = QLabel()
+        layout.addWidget(self.usage_label)
+        self.update_usage_label()
+        
+        # 队列管理
+        manage_layout = QHBoxLayout()
+        cancel_selected_button = QPushButton("取消选中任务")
+        cancel_selected_button.clicked.connect(self.cancel_selected_jobs)
+        clear_finished_button = QPushButton("清除已结束任务")
+        clear_finished_button.clicked.connect(self.clear_finished_jobs)
+        retry_button = QPushButton("重试失败任务")
+        retry_button.clicked.connect(self.retry_failed_jobs)
+        raise_priority_button = QPushButton("提高优先级")
+        raise_priority_button.clicked.connect(lambda: self.change_selected_priority(1))
+        lower_priority_button = QPushButton("降低优先级")
+        lower_priority_button.clicked.connect(lambda: self.change_selected_priority(-1))
+        manage_layout.addWidget(cancel_selected_button)
+        manage_layout.addWidget(raise_priority_button)
+        manage_layout.addWidget(lower_priority_button)
+        manage_layout.addWidget(retry_button)
+        manage_layout.addWidget(clear_finished_button)
+        manage_layout.addStretch()
+        history_button = QPushButton("历史任务...")
+        history_button.setToolTip("查看以前的任务记录，可将其重新加入队列")
+        history_button.clicked.connect(self.show_job_history)
+        history_button.setEnabled(self.job_store is not None)
+        manage_layout.addWidget(history_button)
+        layout.addLayout(manage_layout)
+        
+        self.tab_queue.setLayout(layout)
+    
     def update_url_label(self):
         """更新API URL标签，为腾讯云翻译修改标签"""
         service_name = self.service_combo.currentText()
@@ -376,10 +535,42 @@ class PDF2ZHTranslator(QMainWindow):
         
         # 线程数
         self.threads_spin = QSpinBox()
-        self.threads_spin.setRange(1, 16)
-        self.threads_spin.setValue(4)
+        self.threads_spin.setRange(0, 64)
+        self.threads_spin.setValue(0)
+        self.threads_spin.setSpecialValueText("自动")
+        self.threads_spin.setToolTip("自动：按翻译服务的限流情况和吞吐量自适应调整；\n"
+                                     "同一服务和密钥下所有并行任务的线程数总和受服务额度限制")
         form_layout.addRow("线程数:", self.threads_spin)
         
+        # 分片翻译
+        self.shard_size_spin = QSpinBox()
+        self.shard_size_spin.setRange(0, 1000)
+        self.shard_size_spin.setValue(0)
+        self.shard_size_spin.setSuffix(" 页")
+        self.shard_size_spin.setSpecialValueText("不分片")
+        self.shard_size_spin.setToolTip("把长文档按页拆分为多个 pdf2zh 任务并行翻译，完成后自动合并")
+        form_layout.addRow("分片大小:", self.shard_size_spin)
+        
+        self.shard_parallel_spin = QSpinBox()
+        self.shard_parallel_spin.setRange(1, 16)
+        self.shard_parallel_spin.setValue(4)
+        form_layout.addRow("分片并行数:", self.shard_parallel_spin)
+        
+        # 断点续译
+        self.checkpoint_mode = QCheckBox("断点续译 (失败或取消后重新翻译时跳过已完成的分片)")
+        form_layout.addRow("", self.checkpoint_mode)
+        
+        # 增量翻译
+        self.incremental_mode = QCheckBox("增量翻译 (文档的新版本只翻译有变化的页，其余页复用上一版本的结果)")
+        self.incremental_mode.setToolTip("按文本和版面比较每一页，需要上一版本也是在同一输出目录中开启此选项翻译的；"
+                                         "文件名末尾的版本号（如 v2）不影响匹配")
+        form_layout.addRow("", self.incremental_mode)
+        
+        # 翻译前预检
+        self.preflight_mode = QCheckBox("翻译前预检 (自动选择兼容模式、字体子集化和线程上限，跳过无需翻译的页)")
+        self.preflight_mode.setChecked(True)
+        form_layout.addRow("", self.preflight_mode)
+        
         # 兼容模式
         self.compatible_mode = QCheckBox("使用兼容模式 (用于非PDF/A文档)")
         form_layout.addRow("", self.compatible_mode)
@@ -388,6 +579,224 @@ class PDF2ZHTranslator(QMainWindow):
         self.skip_subset_fonts = QCheckBox("跳过字体子集化 (解决某些兼容性问题)")
         form_layout.addRow("", self.skip_subset_fonts)
         
+        # 启用预检时这两项由预检决定
+        self.preflight_mode.toggled.connect(self.compatible_mode.setDisabled)
+        self.preflight_mode.toggled.connect(self.skip_subset_fonts.setDisabled)
+        self.compatible_mode.setDisabled(True)
+        self.skip_subset_fonts.setDisabled(True)
+        
+        # 输出文件
+        self.output_variant_combo = QComboBox()
+        for variant, label in OUTPUT_VARIANTS.items():
+            self.output_variant_combo.addItem(label, variant)
+        self.output_variant_combo.setToolTip("pdf2zh 总是生成两个版本，翻译完成后删除不需要的一个（增量模式保留两者）")
+        form_layout.addRow("输出文件:", self.output_variant_combo)
+        
+        optimize_layout = QHBoxLayout()
+        self.optimize_mode = QCheckBox("压缩输出文件")
+        self.optimize_mode.setToolTip("翻译完成后合并字体子集、去掉重复对象并重新压缩，减小文件体积")
+        self.linearize_mode = QCheckBox("线性化 (网页快速查看，需要 pikepdf)")
+        self.optimize_workers_spin = QSpinBox()
+        self.optimize_workers_spin.setRange(1, 8)
+        self.optimize_workers_spin.setValue(DEFAULT_OPTIMIZE_WORKERS)
+        self.optimize_workers_spin.setPrefix("进程数 ")
+        self.optimize_workers_spin.valueChanged.connect(lambda value: self.postprocessor.set_workers(value))
+        self.optimize_mode.toggled.connect(self.linearize_mode.setEnabled)
+        self.optimize_mode.toggled.connect(self.optimize_workers_spin.setEnabled)
+        self.linearize_mode.setEnabled(False)
+        self.optimize_workers_spin.setEnabled(False)
+        optimize_layout.addWidget(self.optimize_mode)
+        optimize_layout.addWidget(self.linearize_mode)
+        optimize_layout.addWidget(self.optimize_workers_spin)
+        optimize_layout.addStretch()
+        form_layout.addRow("", optimize_layout)
+        
+        # 常驻工作进程
+        self.worker_mode = QCheckBox("常驻工作进程模式 (预加载 pdf2zh 与版面模型，减少每篇文档的启动开销)")
+        form_layout.addRow("", self.worker_mode)
+        
+        self.worker_count_spin = QSpinBox()
+        self.worker_count_spin.setRange(1, 8)
+        self.worker_count_spin.setValue(2)
+        form_layout.addRow("工作进程数:", self.worker_count_spin)
+        
+        self.worker_max_jobs_spin = QSpinBox()
+        self.worker_max_jobs_spin.setRange(0, 1000)
+        self.worker_max_jobs_spin.setValue(20)
+        self.worker_max_jobs_spin.setSpecialValueText("不限制")
+        form_layout.addRow("进程回收任务数:", self.worker_max_jobs_spin)
+        
+        self.worker_max_memory_spin = QSpinBox()
+        self.worker_max_memory_spin.setRange(0, 65536)
+        self.worker_max_memory_spin.setSingleStep(512)
+        self.worker_max_memory_spin.setValue(4096)
+        self.worker_max_memory_spin.setSuffix(" MB")
+        self.worker_max_memory_spin.setSpecialValueText("不限制")
+        form_layout.addRow("进程内存上限:", self.worker_max_memory_spin)
+        
+        # 本地 LLM 网关
+        gateway_layout = QHBoxLayout()
+        self.gateway_mode = QCheckBox("LLM 网关")
+        self.gateway_mode.setToolTip("OpenAI 兼容接口、Ollama 和 Xinference 的请求经本地网关转发：各任务共用连接，"
+                                     "相同的请求只发送一次，本机服务的请求凑批发送")
+        self.gateway_cap_spin = QSpinBox()
+        self.gateway_cap_spin.setRange(1, 64)
+        self.gateway_cap_spin.setValue(8)
+        self.gateway_cap_spin.setPrefix("每个服务最多 ")
+        self.gateway_cap_spin.setSuffix(" 个并发请求")
+        gateway_layout.addWidget(self.gateway_mode)
+        gateway_layout.addWidget(self.gateway_cap_spin)
+        gateway_layout.addStretch()
+        form_layout.addRow("", gateway_layout)
+        
+        # 单个任务的资源限制（nice 和 CPU 只用于子进程模式）
+        limits_layout = QHBoxLayout()
+        self.job_memory_limit_spin = QSpinBox()
+        self.job_memory_limit_spin.setRange(0, 65536)
+        self.job_memory_limit_spin.setSingleStep(512)
+        self.job_memory_limit_spin.setPrefix("内存 ")
+        self.job_memory_limit_spin.setSuffix(" MB")
+        self.job_memory_limit_spin.setSpecialValueText("内存不限制")
+        self.job_memory_limit_spin.setToolTip("任务内存超过上限时停止该任务并标记为失败")
+        self.job_nice_spin = QSpinBox()
+        self.job_nice_spin.setRange(0, 19)
+        self.job_nice_spin.setPrefix("nice ")
+        self.job_nice_spin.setToolTip("翻译进程的优先级，数值越大越让着其他程序")
+        self.job_affinity_input = QLineEdit()
+        self.job_affinity_input.setPlaceholderText("CPU，如 0-3,6 (留空不限制)")
+        limits_layout.addWidget(self.job_memory_limit_spin)
+        limits_layout.addWidget(self.job_nice_spin)
+        limits_layout.addWidget(self.job_affinity_input)
+        form_layout.addRow("任务资源限制:", limits_layout)
+        
+        self.memory_reserve_spin = QSpinBox()
+        self.memory_reserve_spin.setRange(0, 50)
+        self.memory_reserve_spin.setValue(DEFAULT_RESERVE_PERCENT)
+        self.memory_reserve_spin.setSuffix(" %")
+        self.memory_reserve_spin.setSpecialValueText("不预留")
+        self.memory_reserve_spin.setToolTip("系统可用内存低于该比例时暂停派发新任务，更低时挂起或停止低优先级任务")
+        self.memory_reserve_spin.valueChanged.connect(lambda value: setattr(self.governor, "reserve_percent", value))
+        form_layout.addRow("系统内存预留:", self.memory_reserve_spin)
+        
+        # 翻译结果缓存
+        self.result_cache_enabled = QCheckBox("启用翻译结果缓存 (相同文件和设置不再重复翻译)")
+        self.result_cache_enabled.setChecked(self.result_cache is not None)
+        self.result_cache_enabled.setEnabled(self.result_cache is not None)
+        form_layout.addRow("", self.result_cache_enabled)
+        
+        cache_layout = QHBoxLayout()
+        self.cache_size_spin = QSpinBox()
+        self.cache_size_spin.setRange(64, 102400)
+        self.cache_size_spin.setSingleStep(256)
+        self.cache_size_spin.setValue(2048)
+        self.cache_size_spin.setSuffix(" MB")
+        self.cache_size_spin.valueChanged.connect(self.update_cache_limit)
+        clear_cache_button = QPushButton("清空缓存")
+        clear_cache_button.clicked.connect(self.clear_result_cache)
+        cache_layout.addWidget(self.cache_size_spin)
+        cache_layout.addWidget(clear_cache_button)
+        form_layout.addRow("缓存上限:", cache_layout)
+        
+        # 翻译记忆
+        self.memory_enabled = QCheckBox("启用翻译记忆 (按段落复用已翻译过的文本，跨文档共享)")
+        self.memory_enabled.setEnabled(self.translation_memory is not None)
+        form_layout.addRow("", self.memory_enabled)
+        
+        memory_layout = QHBoxLayout()
+        self.memory_size_spin = QSpinBox()
+        self.memory_size_spin.setRange(1, 1000)
+        self.memory_size_spin.setValue(50)
+        self.memory_size_spin.setSuffix(" 万条")
+        export_memory_button = QPushButton("导出...")
+        export_memory_button.clicked.connect(self.export_translation_memory)
+        import_memory_button = QPushButton("导入...")
+        import_memory_button.clicked.connect(self.import_translation_memory)
+        clear_memory_button = QPushButton("清空")
+        clear_memory_button.clicked.connect(self.clear_translation_memory)
+        memory_layout.addWidget(self.memory_size_spin)
+        memory_layout.addWidget(export_memory_button)
+        memory_layout.addWidget(import_memory_button)
+        memory_layout.addWidget(clear_memory_button)
+        form_layout.addRow("记忆上限:", memory_layout)
+        
+        self.memory_stats_label = QLabel()
+        form_layout.addRow("", self.memory_stats_label)
+        self.update_memory_stats()
+        
+        # 费用预算
+        budget_layout = QHBoxLayout()
+        self.job_budget_spin = QDoubleSpinBox()
+        self.job_budget_spin.setRange(0, 10000)
+        self.job_budget_spin.setDecimals(2)
+        self.job_budget_spin.setSingleStep(0.5)
+        self.job_budget_spin.setPrefix("$")
+        self.job_budget_spin.setSpecialValueText("不限制")
+        self.job_budget_spin.setToolTip("单个任务的费用上限，超出后停止该任务")
+        self.session_budget_spin = QDoubleSpinBox()
+        self.session_budget_spin.setRange(0, 100000)
+        self.session_budget_spin.setDecimals(2)
+        self.session_budget_spin.setSingleStep(1)
+        self.session_budget_spin.setPrefix("$")
+        self.session_budget_spin.setSpecialValueText("不限制")
+        self.session_budget_spin.setToolTip("本次运行的费用上限，超出后按右侧设置暂停或取消队列")
+        self.budget_action_combo = QComboBox()
+        self.budget_action_combo.addItem("暂停队列", "pause")
+        self.budget_action_combo.addItem("取消全部任务", "cancel")
+        self.job_budget_spin.valueChanged.connect(self.update_budgets)
+        self.session_budget_spin.valueChanged.connect(self.update_budgets)
+        self.budget_action_combo.currentIndexChanged.connect(self.update_budgets)
+        budget_layout.addWidget(QLabel("单任务:"))
+        budget_layout.addWidget(self.job_budget_spin)
+        budget_layout.addWidget(QLabel("本次会话:"))
+        budget_layout.addWidget(self.session_budget_spin)
+        budget_layout.addWidget(self.budget_action_combo)
+        form_layout.addRow("费用预算:", budget_layout)
+        
+        usage_layout = QHBoxLayout()
+        usage_summary_button = QPushButton("用量统计...")
+        usage_summary_button.clicked.connect(self.show_usage_summary)
+        edit_prices_button = QPushButton("编辑价格表...")
+        edit_prices_button.setToolTip("每百万 token 或每百万字符的美元价格，修改后重启程序生效")
+        edit_prices_button.clicked.connect(self.edit_price_table)
+        usage_layout.addWidget(usage_summary_button)
+        usage_layout.addWidget(edit_prices_button)
+        usage_layout.addStretch()
+        form_layout.addRow("", usage_layout)
+        
+        # 备用服务
+        self.fallback_table = QTableWidget(0, 4)
+        self.fallback_table.setHorizontalHeaderLabels(["服务", "模型", "API密钥", "API URL"])
+        self.fallback_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.fallback_table.verticalHeader().setVisible(False)
+        self.fallback_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.fallback_table.setMaximumHeight(110)
+        self.fallback_table.setToolTip("主服务失败、长时间没有进度或明显变慢时，按顺序切换到这些服务")
+        form_layout.addRow("备用服务:", self.fallback_table)
+        
+        fallback_layout = QHBoxLayout()
+        add_fallback_button = QPushButton("添加")
+        add_fallback_button.clicked.connect(lambda: self.add_fallback_row())
+        remove_fallback_button = QPushButton("删除")
+        remove_fallback_button.clicked.connect(self.remove_fallback_rows)
+        self.hedge_mode = QCheckBox("对冲")
+        self.hedge_mode.setToolTip("任务（或分片）明显慢于该服务平常水平时，同时用第一个备用服务翻译，先完成的结果胜出")
+        self.stall_spin = QSpinBox()
+        self.stall_spin.setRange(0, 3600)
+        self.stall_spin.setValue(300)
+        self.stall_spin.setSingleStep(30)
+        self.stall_spin.setSuffix(" 秒无进度时切换")
+        self.stall_spin.setSpecialValueText("不按进度切换")
+        self.stall_spin.valueChanged.connect(lambda value: self.router.set_thresholds(stall_seconds=value))
+        health_button = QPushButton("服务状态...")
+        health_button.clicked.connect(self.show_provider_health)
+        fallback_layout.addWidget(add_fallback_button)
+        fallback_layout.addWidget(remove_fallback_button)
+        fallback_layout.addWidget(self.hedge_mode)
+        fallback_layout.addWidget(self.stall_spin)
+        fallback_layout.addStretch()
+        fallback_layout.addWidget(health_button)
+        form_layout.addRow("", fallback_layout)
+        
         layout.addLayout(form_layout)
         
         # 保存/加载配置
@@ -407,15 +816,41 @@ class PDF2ZHTranslator(QMainWindow):
     def setup_log_tab(self):
         layout = QVBoxLayout()
         
-        self.log_text = QTextEdit()
+        # 纯文本视图，超过最大行数时自动丢弃最早的行
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.setUndoRedoEnabled(False)
+        self.log_text.setMaximumBlockCount(self.log_spool.capacity)
         
         layout.addWidget(self.log_text)
         
+        # 日志颜色
+        self.log_formats = {}
+        for name, color in [("default", None), ("blue", Qt.blue), ("red", Qt.red),
+                            ("green", Qt.darkGreen), ("gray", Qt.gray)]:
+            text_format = QTextCharFormat()
+            if color is not None:
+                text_format.setForeground(QColor(color))
+            self.log_formats[name] = text_format
+        
+        # 定时批量刷新日志
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(80)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start()
+        
+        button_layout = QHBoxLayout()
         # 清除日志按钮
         clear_button = QPushButton("清除日志")
         clear_button.clicked.connect(self.clear_log)
-        layout.addWidget(clear_button)
+        button_layout.addWidget(clear_button)
+        
+        # 打开完整日志文件
+        open_log_button = QPushButton("打开完整日志")
+        open_log_button.clicked.connect(self.open_full_log)
+        open_log_button.setEnabled(self.log_spool.path is not None)
+        button_layout.addWidget(open_log_button)
+        layout.addLayout(button_layout)
         
         self.tab_log.setLayout(layout)
     
@@ -439,6 +874,29 @@ class PDF2ZHTranslator(QMainWindow):
             # URL或空白，清空输出目录
             self.output_dir.setText("")
     
+    def show_preflight_report(self):
+        """分析当前选择的PDF并显示预检报告"""
+        file_path = self.file_path.text().strip()
+        if not file_path or not os.path.isfile(file_path):
+            QMessageBox.warning(self, "警告", "请先选择本地PDF文件")
+            return
+        params = {
+            "service": TRANSLATION_SERVICES[self.service_combo.currentText()],
+            "model": self.model_combo.currentText() if self.model_combo.isEnabled() else "",
+            "source_lang": LANGUAGES[self.source_lang.currentText()],
+            "target_lang": LANGUAGES[self.target_lang.currentText()],
+            "pages": self.pages_input.text().strip(),
+        }
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            report = self.preflight.analyze(file_path)
+        except Exception as e:
+            QMessageBox.warning(self, "预检失败", f"无法分析该文件: {str(e)}")
+            return
+        finally:
+            QApplication.restoreOverrideCursor()
+        QMessageBox.information(self, "预检报告", format_report(report, plan(report, params)))
+    
     def browse_output_dir(self):
         dir_path = QFileDialog.getExistingDirectory(self, "选择输出目录")
         if dir_path:
@@ -460,66 +918,211 @@ class PDF2ZHTranslator(QMainWindow):
         # 更新API URL标签
         self.update_url_label()
     
-    def start_translation(self):
-        # 检查必填参数
-        file_path = self.file_path.text().strip()
-        if not file_path:
-            QMessageBox.warning(self, "警告", "请选择PDF文件或输入URL")
-            return
-        
-        # 收集参数
+    def extra_target_langs(self):
+        """勾选的其他目标语言（显示名称），不含当前目标语言"""
+        return [action.text() for action in self.extra_langs_menu.actions()
+                if action.isChecked() and action.text() != self.target_lang.currentText()]
+    
+    def update_extra_langs_label(self):
+        names = self.extra_target_langs()
+        self.extra_langs_button.setText("、".join(names) if names else "无")
+    
+    def collect_params(self):
+        """从界面收集翻译参数（不含文件与输出目录），校验失败时返回None"""
         service_name = self.service_combo.currentText()
         service_code = TRANSLATION_SERVICES[service_name]
         
-        # 确保输出目录存在
-        output_dir = self.output_dir.text().strip()
-        if not output_dir:
-            # 如果未指定，使用默认目录（PDF所在目录/translated）
-            if not file_path.startswith(("http://", "https://")):
-                pdf_dir = os.path.dirname(file_path)
-                output_dir = os.path.join(pdf_dir, "translated")
-            else:
-                # 对于URL，使用当前工作目录下的translated子目录
-                output_dir = os.path.join(os.getcwd(), "translated")
-        
-        # 确保输出目录存在
-        try:
-            os.makedirs(output_dir, exist_ok=True)
-            self.output_dir.setText(output_dir)  # 更新界面显示
-        except Exception as e:
-            QMessageBox.warning(self, "警告", f"创建输出目录失败: {str(e)}")
-            return
-        
-        # 检查腾讯云翻译特殊情况
-        if service_code == "tencent" and not self.api_url.text().strip():
-            QMessageBox.warning(self, "警告", "使用腾讯云翻译时，需要填写Secret Key")
-            return
-        
         params = {
-            "file_path": file_path,
             "service": service_code,
             "model": self.model_combo.currentText() if self.model_combo.isEnabled() and self.model_combo.currentText() != "无需选择模型" else "",
             "source_lang": LANGUAGES[self.source_lang.currentText()],
             "target_lang": LANGUAGES[self.target_lang.currentText()],
             "api_key": self.api_key.text().strip(),
             "api_url": self.api_url.text().strip(),
-            "output_dir": output_dir,
             "pages": self.pages_input.text().strip(),
             "threads": self.threads_spin.value(),
             "compatible_mode": self.compatible_mode.isChecked(),
-            "skip_subset_fonts": self.skip_subset_fonts.isChecked()
+            "skip_subset_fonts": self.skip_subset_fonts.isChecked(),
+            "shard_size": self.shard_size_spin.value(),
+            "shard_parallel": self.shard_parallel_spin.value(),
+            "checkpoint": self.checkpoint_mode.isChecked(),
+            "incremental": self.incremental_mode.isChecked(),
+            "preflight": self.preflight_mode.isChecked(),
+            "translation_memory": self.translation_memory.path if self.memory_enabled.isChecked() else "",
+            "translation_memory_entries": self.memory_size_spin.value() * 10000,
+            "fallbacks": [normalize_route(route) for route in self.fallback_routes()],
+            "hedge": self.hedge_mode.isChecked(),
+            "memory_limit_mb": self.job_memory_limit_spin.value(),
+            "nice": self.job_nice_spin.value(),
+            "cpu_affinity": self.job_affinity_input.text().strip(),
+            "output_variant": self.output_variant_combo.currentData(),
+            "optimize_output": self.optimize_mode.isChecked(),
+            "optimize_linearize": self.linearize_mode.isChecked()
         }
+        extra_langs = self.extra_target_langs()
+        if extra_langs:
+            params["target_langs"] = [params["target_lang"]] + [LANGUAGES[name] for name in extra_langs]
         
-        # 检查是否需要但缺少API密钥
-        if service_code not in ["google", "bing", "argos"] and not params["api_key"]:
-            QMessageBox.warning(self, "警告", f"{service_name} 需要API密钥，请填写")
-            return
+        # 检查是否缺少必填的密钥
+        error = validate_params(params)
+        if error:
+            QMessageBox.warning(self, "警告", error)
+            return None
+        
+        return params
+    
+    def add_fallback_row(self, route=None):
+        """备用服务表格中添加一行，route 为保存的配置项"""
+        route = route or {}
+        row = self.fallback_table.rowCount()
+        self.fallback_table.insertRow(row)
+        service_combo = QComboBox()
+        service_combo.addItems(TRANSLATION_SERVICES.keys())
+        model_combo = QComboBox()
+        model_combo.setEditable(True)
         
-        # 启动翻译线程
-        self.translation_thread = TranslationThread(params)
-        self.translation_thread.progress_signal.connect(self.update_log)
-        self.translation_thread.progress_update.connect(self.update_progress)
-        self.translation_thread.finished_signal.connect(self.translation_finished)
+        def update_models():
+            model_combo.clear()
+            model_combo.addItems(MODEL_OPTIONS.get(TRANSLATION_SERVICES[service_combo.currentText()], []))
+        
+        service_combo.currentTextChanged.connect(update_models)
+        service = route.get("service", "")
+        service_combo.setCurrentText(service_display_name(TRANSLATION_SERVICES.get(service, service)))
+        update_models()
+        if route.get("model"):
+            model_combo.setCurrentText(route["model"])
+        api_key = QLineEdit(route.get("api_key", ""))
+        api_key.setEchoMode(QLineEdit.Password)
+        api_url = QLineEdit(route.get("api_url", ""))
+        for column, widget in enumerate((service_combo, model_combo, api_key, api_url)):
+            self.fallback_table.setCellWidget(row, column, widget)
+    
+    def remove_fallback_rows(self):
+        rows = sorted({index.row() for index in self.fallback_table.selectedIndexes()}, reverse=True)
+        if not rows and self.fallback_table.rowCount():
+            rows = [self.fallback_table.rowCount() - 1]
+        for row in rows:
+            self.fallback_table.removeRow(row)
+    
+    def fallback_routes(self):
+        """备用服务表格的内容，服务为显示名称"""
+        routes = []
+        for row in range(self.fallback_table.rowCount()):
+            widgets = [self.fallback_table.cellWidget(row, column) for column in range(4)]
+            routes.append({
+                "service": widgets[0].currentText(),
+                "model": widgets[1].currentText().strip(),
+                "api_key": widgets[2].text().strip(),
+                "api_url": widgets[3].text().strip(),
+            })
+        return routes
+    
+    def show_provider_health(self):
+        QMessageBox.information(self, "服务状态", format_health(self.router.stats(), service_display_name))
+    
+    def add_files_to_queue(self):
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "选择PDF文件", "", "PDF文件 (*.pdf)")
+        self.enqueue_files(file_paths)
+    
+    def add_folder_to_queue(self):
+        dir_path = QFileDialog.getExistingDirectory(self, "选择包含PDF的文件夹")
+        if dir_path:
+            file_paths = find_pdfs(dir_path)
+            if not file_paths:
+                QMessageBox.information(self, "提示", "该文件夹中没有找到PDF文件")
+                return
+            self.enqueue_files(file_paths)
+    
+    def enqueue_files(self, file_paths):
+        """按当前设置为每个文件创建任务，输出到各自所在目录下的translated文件夹"""
+        if not file_paths:
+            return
+        base_params = self.collect_params()
+        if base_params is None:
+            return
+        for file_path in file_paths:
+            params = dict(base_params, file_path=file_path, output_dir=default_output_dir(file_path))
+            self.scheduler.submit(params)
+        self.statusBar.setText(f"已添加 {len(file_paths)} 个任务")
+
+    def toggle_watch_folder(self):
+        if self.watcher is not None:
+            self.stop_watch_folder()
+            return
+        dir_path = QFileDialog.getExistingDirectory(self, "选择要监视的文件夹")
+        if dir_path:
+            self.start_watch_folder([dir_path])
+
+    def start_watch_folder(self, directories):
+        """按当前设置监视文件夹，新的PDF写入完成后自动加入队列"""
+        params = self.collect_params()
+        if params is None:
+            return
+        self.watch_params = params
+        self.watcher = FolderWatcher(directories, on_log=self.watch_log_signal.emit).start()
+        self.watch_timer.start()
+        self.watch_button.setText("停止监视")
+        self.watch_label.setText(f"正在监视 ({self.watcher.mode}): {', '.join(self.watcher.directories)}")
+        self.watch_label.setVisible(True)
+        self.append_log(f"开始监视 ({self.watcher.mode}): {', '.join(self.watcher.directories)}")
+
+    def stop_watch_folder(self):
+        """停止监视，已加入队列的任务照常执行"""
+        if self.watcher is None:
+            return
+        self.watch_timer.stop()
+        self.watcher.stop()
+        self.watcher = None
+        self.watch_digests = {}
+        self.watch_button.setText("监视文件夹...")
+        self.watch_label.setVisible(False)
+        self.append_log("已停止监视文件夹")
+
+    def poll_watch_folder(self):
+        """定时取出写入完成的文件并提交任务，调度器空闲时自动开始"""
+        ready = self.watcher.take_ready()
+        for file_path, digest in ready:
+            self.append_log(f"[监视] 发现新文件: {file_path}")
+            job = self.scheduler.submit(dict(self.watch_params, file_path=file_path,
+                                             output_dir=default_output_dir(file_path)))
+            self.watch_digests[job.id] = digest
+        if ready and not self.scheduler.running:
+            self.ensure_worker_pool()
+            self.ensure_gateway()
+            self.translate_button.setEnabled(False)
+            self.cancel_button.setEnabled(True)
+            self.statusBar.setText("正在翻译...")
+            self.scheduler.start()
+            self.queue_timer.start()
+
+    def finish_watch_job(self, job):
+        """监视任务结束：成功的文件记为已处理，失败或取消的文件以后还可以再次处理"""
+        digest = self.watch_digests.pop(job.id, None)
+        if digest is None or self.watcher is None:
+            return
+        if job.state == JobState.DONE:
+            self.watcher.mark_processed(job.params["file_path"], digest)
+        else:
+            self.watcher.release(digest)
+
+    def start_translation(self):
+        # 队列为空时，将当前选择的文件加入队列
+        if not self.scheduler.queued_jobs():
+            file_path = self.file_path.text().strip()
+            if not file_path:
+                QMessageBox.warning(self, "警告", "请选择PDF文件或输入URL，或在任务队列中添加文件")
+                return
+            
+            # 如果未指定，使用默认目录（PDF所在目录/translated）
+            output_dir = self.output_dir.text().strip() or default_output_dir(file_path)
+            self.output_dir.setText(output_dir)  # 更新界面显示
+            
+            params = self.collect_params()
+            if params is None:
+                return
+            params["file_path"] = file_path
+            params["output_dir"] = output_dir
+            self.scheduler.submit(params)
         
         # 更新UI状态
         self.translate_button.setEnabled(False)
@@ -529,105 +1132,543 @@ class PDF2ZHTranslator(QMainWindow):
         self.progress_bar.setFormat("准备中...")
         
         # 切换到日志标签页
-        self.tabs.setCurrentIndex(2)
+        self.tabs.setCurrentWidget(self.tab_log)
+        self.append_log("------ 翻译开始 ------")
+        
+        # 开始调度
+        if not self.scheduler.running:
+            self.ensure_worker_pool()
+            self.ensure_gateway()
+        self.scheduler.start()
+        self.queue_timer.start()
+    
+    def launch_job(self, job):
+        """调度器回调：为任务创建并启动翻译线程"""
+        # 确保输出目录存在，失败时由调度器将任务标记为失败
+        os.makedirs(job.params["output_dir"], exist_ok=True)
+        
+        job_id = job.id
+        worker_pool = self.worker_pool if self.worker_mode.isChecked() else None
+        result_cache = self.result_cache if self.result_cache_enabled.isChecked() else None
+        shard_params = [child.params for child in self.scheduler.children(job)]
+        merging = bool(shard_params or job.params.get("reuse"))
+        usage = None if merging else self.usage_ledger.start(job_id, job.params)
+        thread = TranslationThread(job.params, worker_pool, result_cache, shard_params, self.concurrency,
+                                   self.telemetry.start(job_id, job.params), usage, self.router, self.gateway,
+                                   self.postprocessor)
+        thread.progress_signal.connect(
+            lambda message, job_id=job_id: self.update_log(f"[#{job_id}] {message}"))
+        thread.progress_update.connect(
+            lambda current, total, job_id=job_id: self.scheduler.update_progress(job_id, current, total))
+        thread.finished_signal.connect(
+            lambda success, message, job_id=job_id: self.translation_finished(job_id, success, message))
+        # 线程真正退出后才释放引用
+        thread.finished.connect(lambda job_id=job_id: self.job_threads.pop(job_id, None))
+        self.job_threads[job_id] = thread
+        
+        if merging:
+            self.append_log(f"[#{job_id}] 开始合并 {job.name} 的 {len(shard_params)} 个子任务" if shard_params
+                            else f"[#{job_id}] {job.name} 没有需要重新翻译的页，使用上一版本的翻译结果")
+        else:
+            self.append_log(f"[#{job_id}] 开始翻译 {job.name}，输出目录: {job.params['output_dir']}")
+        thread.start()
+        return thread
+    
+    def ensure_worker_pool(self):
+        """按当前设置创建、重建或关闭常驻工作进程池，仅在没有运行中的任务时调用"""
+        if not self.worker_mode.isChecked():
+            if self.worker_pool is not None:
+                self.worker_pool.shutdown()
+                self.worker_pool = None
+            return
         
-        # 开始翻译
-        self.translation_thread.start()
-        self.log_text.append("------ 翻译开始 ------")
-        self.log_text.append(f"输出目录: {output_dir}")
+        settings = (self.worker_count_spin.value(),
+                    self.worker_max_jobs_spin.value(),
+                    self.worker_max_memory_spin.value())
+        if self.worker_pool is not None and self.worker_pool_settings == settings:
+            return
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
+        self.worker_pool = WorkerPool(*settings)
+        self.worker_pool_settings = settings
+        self.append_log(f"已启动 {settings[0]} 个常驻工作进程")
+    
+    def ensure_gateway(self):
+        """按当前设置启动、重启或停止 LLM 网关，仅在没有运行中的任务时调用"""
+        cap = self.gateway_cap_spin.value()
+        if self.gateway is not None and (not self.gateway_mode.isChecked() or self.gateway.cap != cap):
+            self.gateway.stop()
+            self.gateway = None
+        if not self.gateway_mode.isChecked() or self.gateway is not None:
+            return
+        gateway = LlmGateway(cap=cap)
+        try:
+            address = gateway.start()
+        except OSError as e:
+            self.append_log(f"无法启动 LLM 网关: {str(e)}")
+            return
+        self.gateway = gateway
+        self.append_log(f"LLM 网关: {address}")
+    
+    def update_cache_limit(self, value):
+        if self.result_cache is not None:
+            self.result_cache.set_max_bytes(value * 1024 * 1024)
+    
+    def clear_result_cache(self):
+        if self.result_cache is None:
+            return
+        reply = QMessageBox.question(self, "清空缓存", "确定要删除所有缓存的翻译结果吗？",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            self.result_cache.clear()
+            self.statusBar.setText("翻译结果缓存已清空")
+    
+    def update_memory_stats(self):
+        if self.translation_memory is None:
+            self.memory_stats_label.setText("翻译记忆不可用")
+            return
+        try:
+            stats = self.translation_memory.stats()
+        except sqlite3.Error as e:
+            self.memory_stats_label.setText(f"无法读取翻译记忆: {str(e)}")
+            return
+        self.memory_stats_label.setText(
+            f"共 {stats['entries']} 条，{stats['bytes'] / 1024 / 1024:.1f} MB，"
+            f"累计命中 {stats['hits']}/{stats['hits'] + stats['misses']} 段 ({stats['hit_rate'] * 100:.0f}%)")
+    
+    def export_translation_memory(self):
+        if self.translation_memory is None:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "导出翻译记忆", "translation-memory.jsonl",
+                                              "JSON Lines (*.jsonl)")
+        if not path:
+            return
+        try:
+            count = self.translation_memory.export(path)
+            self.statusBar.setText(f"已导出 {count} 条翻译记忆")
+        except (OSError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "错误", f"导出翻译记忆失败: {str(e)}")
+    
+    def import_translation_memory(self):
+        if self.translation_memory is None:
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "导入翻译记忆", "",
+                                              "翻译记忆 (*.jsonl *.db);;所有文件 (*)")
+        if not path:
+            return
+        try:
+            count = self.translation_memory.import_file(path)
+            self.statusBar.setText(f"已导入 {count} 条新的翻译记忆")
+        except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "错误", f"导入翻译记忆失败: {str(e)}")
+        self.update_memory_stats()
+    
+    def clear_translation_memory(self):
+        if self.translation_memory is None:
+            return
+        reply = QMessageBox.question(self, "清空翻译记忆", "确定要删除所有翻译记忆吗？",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            self.translation_memory.clear()
+            self.update_memory_stats()
+            self.statusBar.setText("翻译记忆已清空")
+    
+    def update_budgets(self):
+        self.usage_ledger.set_budgets(self.job_budget_spin.value(), self.session_budget_spin.value(),
+                                      self.budget_action_combo.currentData())
+    
+    def update_usage_label(self):
+        cost, tokens = self.usage_ledger.session_totals()
+        self.usage_label.setText(f"本次用量: {tokens:,} token，约 ${cost:.4f}")
+    
+    def on_budget_exceeded(self, reason):
+        """会话费用超出预算：暂停队列（已排队任务保留）或取消全部任务"""
+        if self.usage_ledger.budget_action == "cancel":
+            self.append_log(f"{reason}，取消全部任务")
+            self.cancel_translation()
+        else:
+            self.append_log(f"{reason}，暂停队列")
+            self.scheduler.stop()
+            self.queue_timer.stop()
+            self.translate_button.setEnabled(True)
+            self.cancel_button.setEnabled(False)
+            self.progress_bar.setFormat("已暂停: 超出费用预算")
+            self.statusBar.setText("已暂停: 超出费用预算，提高预算后点击开始翻译继续")
+        self.update_usage_label()
+        QMessageBox.warning(self, "超出费用预算", reason)
+    
+    def show_usage_summary(self):
+        try:
+            total = format_summary(self.usage_ledger.summary(), service_display_name)
+            session = format_summary(self.usage_ledger.summary(session_only=True), service_display_name)
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "警告", f"无法读取用量记录: {str(e)}")
+            return
+        QMessageBox.information(self, "用量统计", f"本次会话:\n{session}\n\n累计:\n{total}")
+    
+    def edit_price_table(self):
+        prices = self.usage_ledger.prices
+        if not os.path.exists(prices.path):
+            try:
+                prices.save()
+            except OSError as e:
+                QMessageBox.warning(self, "警告", f"无法创建价格表: {str(e)}")
+                return
+        self.open_file(prices.path)
+    
+    def closeEvent(self, event):
+        self.stop_watch_folder()
+        if self.job_recorder is not None:
+            # 未完成的任务保持原状态，下次启动时恢复
+            self.job_recorder.detach()
+        self.scheduler.cancel_all()
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
+        if self.gateway is not None:
+            self.gateway.stop()
+        self.governor.stop()
+        self.postprocessor.shutdown()
+        self.log_spool.close()
+        super().closeEvent(event)
     
     def cancel_translation(self):
-        if self.translation_thread and self.translation_thread.isRunning():
-            self.translation_thread.stop()
-            self.log_text.append("翻译已取消")
+        if not self.scheduler.is_idle():
+            self.scheduler.cancel_all()
+            self.queue_timer.stop()
+            self.append_log("翻译已取消")
             self.statusBar.setText("翻译已取消")
             self.translate_button.setEnabled(True)
             self.cancel_button.setEnabled(False)
             self.progress_bar.setFormat("已取消")
     
+    def selected_job_ids(self):
+        rows = sorted({index.row() for index in self.queue_table.selectedIndexes()})
+        items = [self.queue_table.item(row, 0) for row in rows]
+        return [item.data(Qt.UserRole) for item in items if item is not None]
+    
+    def cancel_selected_jobs(self):
+        for job_id in self.selected_job_ids():
+            self.scheduler.cancel(job_id)
+    
+    def change_selected_priority(self, delta):
+        """调整选中任务的优先级，分片任务调整其所属的整个任务"""
+        job_ids = set()
+        for job_id in self.selected_job_ids():
+            job = self.scheduler.get(job_id)
+            if job is not None:
+                job_ids.add(job.parent_id if job.is_shard else job.id)
+        for job_id in job_ids:
+            job = self.scheduler.get(job_id)
+            if job is not None:
+                self.scheduler.set_priority(job_id, job.priority + delta)
+                for child in self.scheduler.children(job):
+                    self.update_job_row(child)
+    
+    def update_schedule_policy(self):
+        self.scheduler.set_policy(shortest_first=self.shortest_first_check.isChecked(),
+                                  fair_share=self.fair_share_check.isChecked(),
+                                  preemption=self.preempt_check.isChecked())
+    
+    def retry_failed_jobs(self):
+        """重新提交失败或取消的任务，启用断点续译时只翻译未完成的分片"""
+        retried = 0
+        for job in self.scheduler.jobs():
+            if job.is_shard or job.state not in (JobState.FAILED, JobState.CANCELLED):
+                continue
+            self.scheduler.remove(job.id)
+            self.scheduler.submit(dict(job.params))
+            retried += 1
+        if retried:
+            self.rebuild_queue_table()
+            self.statusBar.setText(f"已重新加入 {retried} 个任务")
+            if not self.scheduler.running:
+                self.start_translation()
+    
+    def resume_interrupted_jobs(self):
+        """把上次退出或崩溃时未完成的任务重新加入队列，点击开始翻译后执行"""
+        if self.job_store is None:
+            return
+        try:
+            resumed, completed = self.job_store.reconcile(["gui"])
+        except (OSError, sqlite3.Error) as e:
+            self.append_log(f"无法读取任务数据库: {str(e)}")
+            return
+        for row_id, params in resumed:
+            self.scheduler.submit(params)
+        if completed:
+            self.append_log(f"{completed} 个上次未完成的任务在程序退出期间已完成")
+        if resumed:
+            self.append_log(f"已恢复上次未完成的 {len(resumed)} 个任务，点击开始翻译继续")
+            self.statusBar.setText(f"已恢复 {len(resumed)} 个未完成的任务，点击开始翻译继续")
+            self.tabs.setCurrentWidget(self.tab_queue)
+    
+    def show_job_history(self):
+        JobHistoryDialog(self.job_store, self.requeue_history_jobs, self).exec_()
+    
+    def requeue_history_jobs(self, params_list):
+        for params in params_list:
+            self.scheduler.submit(params)
+        self.statusBar.setText(f"已重新加入 {len(params_list)} 个任务，点击开始翻译执行")
+        self.tabs.setCurrentWidget(self.tab_queue)
+    
+    def clear_finished_jobs(self):
+        self.scheduler.clear_finished()
+        self.rebuild_queue_table()
+    
+    def rebuild_queue_table(self):
+        self.queue_table.setRowCount(0)
+        self.job_rows = {}
+        for job in self.scheduler.jobs():
+            self.update_job_row(job)
+        self.update_throughput()
+    
+    def on_job_changed(self, job):
+        """调度器回调：任务状态或进度变化"""
+        self.update_job_row(job)
+        self.update_overall_progress()
+        self.update_throughput()
+        
+        if job.finished:
+            self.finish_watch_job(job)
+            self.telemetry_label.setText(format_rollup(self.telemetry.rollup(), service_display_name))
+            self.update_usage_label()
+        if job.state == JobState.DONE:
+            self.append_log(f"[#{job.id}] {job.name} 翻译完成，用时 {job.duration():.1f} 秒")
+        elif job.state == JobState.FAILED:
+            self.append_log(f"[#{job.id}] {job.name} 翻译失败\n{job.message}")
+        
+        if self.scheduler.running and self.scheduler.is_idle():
+            self.batch_finished()
+    
+    def update_job_row(self, job):
+        row = self.job_rows.get(job.id)
+        if row is None:
+            row = self.queue_table.rowCount()
+            self.queue_table.insertRow(row)
+            self.job_rows[job.id] = row
+            name_item = QTableWidgetItem(job.name)
+            name_item.setData(Qt.UserRole, job.id)
+            name_item.setToolTip(job.params["file_path"])
+            self.queue_table.setItem(row, 0, name_item)
+        
+        if job.total_pages > 0 and not job.finished:
+            progress_text = f"{job.current_page}/{job.total_pages}"
+        else:
+            progress_text = f"{int(job.progress() * 100)}%"
+        values = [
+            "已挂起" if job.suspended else JOB_STATE_LABELS[job.state],
+            str(job.priority) if job.priority else "",
+            progress_text,
+            f"{job.duration():.0f}s" if job.started_at else "",
+            format_seconds(self.job_eta(job)),
+            self.job_usage_text(job),
+            job.message.splitlines()[0] if job.message else "",
+        ]
+        for column, value in enumerate(values, start=1):
+            self.queue_table.setItem(row, column, QTableWidgetItem(value))
+    
+    def job_usage_text(self, job):
+        if job.state != JobState.RUNNING:
+            return ""
+        usage = self.governor.usage(job.id)
+        if usage is None:
+            return ""
+        return f"{usage[0]:.0f} MB / {usage[1]:.0f}%"
+    
+    def job_eta(self, job):
+        """任务预计剩余秒数，分片任务的父任务按整体进度估算"""
+        if job.state != JobState.RUNNING:
+            return None
+        telemetry = self.telemetry.active(job.id)
+        if telemetry is not None and telemetry.mode != "merge":
+            return telemetry.eta()
+        progress = job.progress()
+        if 0 < progress < 1:
+            return job.duration() * (1 - progress) / progress
+        return None
+    
+    def refresh_queue_view(self):
+        """定时刷新运行中任务的耗时和吞吐量"""
+        for job in self.scheduler.running_jobs():
+            self.update_job_row(job)
+        self.update_throughput()
+        self.resource_label.setText(self.governor.status())
+        self.telemetry_label.setText(format_rollup(self.telemetry.rollup(), service_display_name))
+        self.update_usage_label()
+    
+    def open_telemetry_log(self):
+        if os.path.exists(self.telemetry.path):
+            self.open_file(self.telemetry.path)
+        else:
+            QMessageBox.information(self, "提示", "还没有统计记录")
+    
+    def update_throughput(self):
+        stats = self.scheduler.stats()
+        if not stats["total"]:
+            self.throughput_label.setText("队列为空")
+            return
+        counts = stats["counts"]
+        self.throughput_label.setText(
+            f"共 {stats['total']} 个任务 | "
+            f"排队 {counts[JobState.QUEUED]} | 运行 {counts[JobState.RUNNING]} | "
+            f"完成 {counts[JobState.DONE]} | 失败 {counts[JobState.FAILED]} | "
+            f"取消 {counts[JobState.CANCELLED]} | "
+            f"吞吐量 {stats['jobs_per_minute']:.2f} 个/分钟，{stats['pages_per_minute']:.1f} 页/分钟"
+        )
+    
+    def update_overall_progress(self):
+        if not self.scheduler.running:
+            return
+        jobs = self.scheduler.batch_jobs()
+        if not jobs:
+            return
+        
+        running = [job for job in jobs if job.state == JobState.RUNNING]
+        if len(jobs) == 1 and running and running[0].total_pages > 0:
+            # 单个任务时显示页数进度
+            current, total = running[0].current_page, running[0].total_pages
+            percentage = int((current / total) * 100)
+            self.progress_bar.setValue(percentage)
+            self.progress_bar.setFormat(f"进度: {percentage}% ({current}/{total})")
+            self.statusBar.setText(f"正在处理第 {current} 页，共 {total} 页")
+            return
+        
+        finished = sum(1 for job in jobs if job.finished)
+        percentage = int(sum(job.progress() for job in jobs) / len(jobs) * 100)
+        self.progress_bar.setValue(percentage)
+        self.progress_bar.setFormat(f"进度: {percentage}% (已完成 {finished}/{len(jobs)} 个任务)")
+        if running:
+            self.statusBar.setText(f"正在翻译 {len(running)} 个任务，排队 {len(jobs) - finished - len(running)} 个")
+    
+    def append_log(self, message):
+        """写入日志缓冲，由定时器批量显示"""
+        self.log_spool.append(message)
+    
     def update_log(self, message):
         # 如果是第一条日志，添加分隔符
-        if self.log_text.toPlainText().strip() == "":
-            self.log_text.append("\n############# PDF2ZH Translation Start #############")
-        
-        # 根据不同类型的消息添加不同的颜色或样式
+        if self.log_spool.is_empty():
+            self.append_log("\n############# PDF2ZH Translation Start #############")
+        self.append_log(message)
+    
+    def log_line_format(self, message):
+        # 根据不同类型的消息使用不同的颜色
         if "Processing" in message:
             # 处理进度相关的消息
-            self.log_text.append(f"<font color='blue'>{message}</font>")
+            return self.log_formats["blue"]
         elif "error" in message.lower():
             # 错误消息用红色
-            self.log_text.append(f"<font color='red'>{message}</font>")
+            return self.log_formats["red"]
         elif "Translating batch" in message:
             # 翻译批次消息用绿色
-            self.log_text.append(f"<font color='green'>{message}</font>")
-        else:
-            # 普通消息保持默认颜色
-            self.log_text.append(message)
-        
-        # 自动滚动到底部
-        self.log_text.moveCursor(QTextCursor.End)
+            return self.log_formats["green"]
+        # 普通消息保持默认颜色
+        return self.log_formats["default"]
     
-    def update_progress(self, current, total):
-        if total > 0:
-            percentage = int((current / total) * 100)
-            self.progress_bar.setValue(percentage)
-            self.progress_bar.setFormat(f"进度: {percentage}% ({current}/{total})")
-            self.statusBar.setText(f"正在处理第 {current} 页，共 {total} 页")
+    def flush_log(self):
+        """把缓冲中的日志一次性写入日志视图"""
+        lines, dropped = self.log_spool.drain()
+        if not lines:
+            return
+        
+        scrollbar = self.log_text.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+        
+        cursor = QTextCursor(self.log_text.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.beginEditBlock()
+        if dropped:
+            lines.insert(0, f"... 省略 {dropped} 行，完整日志见 {self.log_spool.path} ...")
+        for line in lines:
+            if not cursor.atStart():
+                cursor.insertBlock()
+            cursor.insertText(line, self.log_line_format(line))
+        cursor.endEditBlock()
+        
+        # 自动滚动到底部（用户向上翻看时不打断）
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
     
     def clear_log(self):
         self.log_text.clear()
+        self.log_spool.clear()
+    
+    def open_full_log(self):
+        if self.log_spool.path and os.path.exists(self.log_spool.path):
+            self.open_file(self.log_spool.path)
     
-    def translation_finished(self, success, message):
+    def translation_finished(self, job_id, success, message):
+        thread = self.job_threads.get(job_id)
+        exit_code = getattr(thread.runner, "exit_code", None) if thread is not None else None
+        self.scheduler.job_finished(job_id, success, message, exit_code)
+    
+    def batch_finished(self):
+        """当前批次全部任务结束"""
+        self.scheduler.stop()
+        self.queue_timer.stop()
         self.translate_button.setEnabled(True)
         self.cancel_button.setEnabled(False)
+        self.update_memory_stats()
+        if self.gateway is not None and self.gateway.stats["requests"]:
+            self.append_log(f"LLM 网关: {format_gateway_stats(self.gateway.stats)}")
+        
+        jobs = self.scheduler.batch_jobs()
+        done = [job for job in jobs if job.state == JobState.DONE]
+        failed = [job for job in jobs if job.state == JobState.FAILED]
+        
+        # 监视文件夹时不弹出提示，继续等待新文件
+        if self.watcher is not None:
+            self.progress_bar.setValue(100 if not failed else int(len(done) / max(len(jobs), 1) * 100))
+            self.progress_bar.setFormat(f"等待新文件: 成功 {len(done)}，失败 {len(failed)}")
+            self.statusBar.setText(f"正在监视文件夹，本批成功 {len(done)}，失败 {len(failed)}")
+            return
         
-        if success:
+        if len(jobs) == 1 and jobs[0].state in (JobState.DONE, JobState.FAILED):
+            self.single_job_finished(jobs[0])
+            return
+        
+        self.progress_bar.setValue(100 if not failed else int(len(done) / max(len(jobs), 1) * 100))
+        self.progress_bar.setFormat(f"批量翻译结束: 成功 {len(done)}，失败 {len(failed)}")
+        self.statusBar.setText(f"批量翻译结束: 成功 {len(done)}，失败 {len(failed)}")
+        self.append_log(f"------ 批量翻译结束: 成功 {len(done)}，失败 {len(failed)} ------")
+        if failed:
+            names = "\n".join(job.name for job in failed)
+            QMessageBox.warning(self, "部分任务失败", f"以下文件翻译失败，详情见翻译日志：\n{names}")
+    
+    def single_job_finished(self, job):
+        """只有一个任务时保持原有的完成提示"""
+        if job.state == JobState.DONE:
             self.statusBar.setText("翻译完成")
             self.progress_bar.setValue(100)
             self.progress_bar.setFormat("翻译完成 (100%)")
-            self.log_text.append("------ 翻译完成 ------")
-            
-            # 获取输出目录和文件名
-            output_dir = self.output_dir.text().strip()
-            file_path = self.file_path.text().strip()
-            
-            # 提取文件名作为基础
-            if file_path.startswith(("http://", "https://")):
-                # 从URL中提取文件名
-                try:
-                    base_name = os.path.basename(file_path).split(".")[0]
-                    if not base_name:
-                        base_name = "translated"
-                except:
-                    base_name = "translated"
-            else:
-                base_name = os.path.splitext(os.path.basename(file_path))[0]
+            self.append_log("------ 翻译完成 ------")
             
-            # 构建输出文件路径
-            mono_path = os.path.join(output_dir, f"{base_name}-mono.pdf")
-            dual_path = os.path.join(output_dir, f"{base_name}-dual.pdf")
+            # 构建输出文件路径，按设置只保留一个版本时另一项为空
+            mono_path, dual_path = kept_output_paths(job.params)
+            files = "\n".join(f"{label}：{path}" for label, path in (("单语版", mono_path), ("双语版", dual_path))
+                              if path)
             
             # 询问用户是否打开文件
             reply = QMessageBox.question(
                 self, 
                 "翻译完成", 
-                f"翻译已完成，是否打开翻译结果？\n\n单语版：{mono_path}\n双语版：{dual_path}",
+                f"翻译已完成，是否打开翻译结果？\n\n{files}",
                 QMessageBox.Yes | QMessageBox.No, 
                 QMessageBox.Yes
             )
             
             if reply == QMessageBox.Yes:
-                # 打开单语版
-                if os.path.exists(mono_path):
-                    self.open_file(mono_path)
+                # 打开单语版，只保留双语版时打开双语版
+                path = mono_path or dual_path
+                if os.path.exists(path):
+                    self.open_file(path)
                 else:
-                    QMessageBox.warning(self, "警告", f"找不到输出文件: {mono_path}")
+                    QMessageBox.warning(self, "警告", f"找不到输出文件: {path}")
         else:
             self.statusBar.setText("翻译失败")
             self.progress_bar.setValue(0)
             self.progress_bar.setFormat("翻译失败")
-            self.log_text.append(f"------ 翻译失败 ------\n{message}")
-            QMessageBox.critical(self, "翻译失败", message)
+            self.append_log("------ 翻译失败 ------")
+            QMessageBox.critical(self, "翻译失败", job.message)
     
     def open_file(self, file_path):
         """使用系统默认程序打开文件"""
@@ -651,12 +1692,47 @@ class PDF2ZHTranslator(QMainWindow):
             "model": self.model_combo.currentText() if self.model_combo.isEnabled() else "",
             "source_lang": self.source_lang.currentText(),
             "target_lang": self.target_lang.currentText(),
+            "target_langs": ([self.target_lang.currentText()] + self.extra_target_langs()
+                             if self.extra_target_langs() else []),
             "api_key": self.api_key.text(),
             "api_url": self.api_url.text(),
             "output_dir": self.output_dir.text(),
             "threads": self.threads_spin.value(),
             "compatible_mode": self.compatible_mode.isChecked(),
-            "skip_subset_fonts": self.skip_subset_fonts.isChecked()
+            "skip_subset_fonts": self.skip_subset_fonts.isChecked(),
+            "shard_size": self.shard_size_spin.value(),
+            "shard_parallel": self.shard_parallel_spin.value(),
+            "checkpoint": self.checkpoint_mode.isChecked(),
+            "incremental": self.incremental_mode.isChecked(),
+            "preflight": self.preflight_mode.isChecked(),
+            "max_concurrent_jobs": self.concurrency_spin.value(),
+            "schedule_shortest_first": self.shortest_first_check.isChecked(),
+            "schedule_fair_share": self.fair_share_check.isChecked(),
+            "schedule_preempt": self.preempt_check.isChecked(),
+            "worker_mode": self.worker_mode.isChecked(),
+            "worker_count": self.worker_count_spin.value(),
+            "worker_max_jobs": self.worker_max_jobs_spin.value(),
+            "worker_max_memory_mb": self.worker_max_memory_spin.value(),
+            "llm_gateway": self.gateway_mode.isChecked(),
+            "llm_gateway_cap": self.gateway_cap_spin.value(),
+            "job_memory_limit_mb": self.job_memory_limit_spin.value(),
+            "job_nice": self.job_nice_spin.value(),
+            "job_cpu_affinity": self.job_affinity_input.text().strip(),
+            "memory_reserve_percent": self.memory_reserve_spin.value(),
+            "output_variant": self.output_variant_combo.currentData(),
+            "optimize_output": self.optimize_mode.isChecked(),
+            "optimize_linearize": self.linearize_mode.isChecked(),
+            "optimize_workers": self.optimize_workers_spin.value(),
+            "result_cache": self.result_cache_enabled.isChecked(),
+            "result_cache_mb": self.cache_size_spin.value(),
+            "translation_memory": self.memory_enabled.isChecked(),
+            "translation_memory_entries": self.memory_size_spin.value() * 10000,
+            "budget_job_usd": self.job_budget_spin.value(),
+            "budget_session_usd": self.session_budget_spin.value(),
+            "budget_action": self.budget_action_combo.currentData(),
+            "fallbacks": self.fallback_routes(),
+            "hedge": self.hedge_mode.isChecked(),
+            "failover_stall_seconds": self.stall_spin.value()
         }
         
         file_path, _ = QFileDialog.getSaveFileName(self, "保存配置", "", "JSON文件 (*.json)")
@@ -687,6 +1763,9 @@ class PDF2ZHTranslator(QMainWindow):
                     self.source_lang.setCurrentText(config["source_lang"])
                 if "target_lang" in config:
                     self.target_lang.setCurrentText(config["target_lang"])
+                if "target_langs" in config:
+                    for action in self.extra_langs_menu.actions():
+                        action.setChecked(action.text() in config["target_langs"])
                 if "api_key" in config:
                     self.api_key.setText(config["api_key"])
                 if "api_url" in config:
@@ -699,6 +1778,78 @@ class PDF2ZHTranslator(QMainWindow):
                     self.compatible_mode.setChecked(config["compatible_mode"])
                 if "skip_subset_fonts" in config:
                     self.skip_subset_fonts.setChecked(config["skip_subset_fonts"])
+                if "shard_size" in config:
+                    self.shard_size_spin.setValue(config["shard_size"])
+                if "shard_parallel" in config:
+                    self.shard_parallel_spin.setValue(config["shard_parallel"])
+                if "checkpoint" in config:
+                    self.checkpoint_mode.setChecked(config["checkpoint"])
+                if "incremental" in config:
+                    self.incremental_mode.setChecked(config["incremental"])
+                if "preflight" in config:
+                    self.preflight_mode.setChecked(config["preflight"])
+                if "max_concurrent_jobs" in config:
+                    self.concurrency_spin.setValue(config["max_concurrent_jobs"])
+                if "schedule_shortest_first" in config:
+                    self.shortest_first_check.setChecked(config["schedule_shortest_first"])
+                if "schedule_fair_share" in config:
+                    self.fair_share_check.setChecked(config["schedule_fair_share"])
+                if "schedule_preempt" in config:
+                    self.preempt_check.setChecked(config["schedule_preempt"])
+                if "worker_mode" in config:
+                    self.worker_mode.setChecked(config["worker_mode"])
+                if "worker_count" in config:
+                    self.worker_count_spin.setValue(config["worker_count"])
+                if "worker_max_jobs" in config:
+                    self.worker_max_jobs_spin.setValue(config["worker_max_jobs"])
+                if "worker_max_memory_mb" in config:
+                    self.worker_max_memory_spin.setValue(config["worker_max_memory_mb"])
+                if "llm_gateway" in config:
+                    self.gateway_mode.setChecked(config["llm_gateway"])
+                if "llm_gateway_cap" in config:
+                    self.gateway_cap_spin.setValue(config["llm_gateway_cap"])
+                if "job_memory_limit_mb" in config:
+                    self.job_memory_limit_spin.setValue(config["job_memory_limit_mb"])
+                if "job_nice" in config:
+                    self.job_nice_spin.setValue(config["job_nice"])
+                if "job_cpu_affinity" in config:
+                    self.job_affinity_input.setText(config["job_cpu_affinity"])
+                if "memory_reserve_percent" in config:
+                    self.memory_reserve_spin.setValue(config["memory_reserve_percent"])
+                if "output_variant" in config:
+                    index = self.output_variant_combo.findData(config["output_variant"])
+                    if index >= 0:
+                        self.output_variant_combo.setCurrentIndex(index)
+                if "optimize_output" in config:
+                    self.optimize_mode.setChecked(config["optimize_output"])
+                if "optimize_linearize" in config:
+                    self.linearize_mode.setChecked(config["optimize_linearize"])
+                if "optimize_workers" in config:
+                    self.optimize_workers_spin.setValue(config["optimize_workers"])
+                if "result_cache" in config and self.result_cache is not None:
+                    self.result_cache_enabled.setChecked(config["result_cache"])
+                if "result_cache_mb" in config:
+                    self.cache_size_spin.setValue(config["result_cache_mb"])
+                if "translation_memory" in config and self.translation_memory is not None:
+                    self.memory_enabled.setChecked(config["translation_memory"])
+                if "translation_memory_entries" in config:
+                    self.memory_size_spin.setValue(max(1, config["translation_memory_entries"] // 10000))
+                if "budget_job_usd" in config:
+                    self.job_budget_spin.setValue(config["budget_job_usd"])
+                if "budget_session_usd" in config:
+                    self.session_budget_spin.setValue(config["budget_session_usd"])
+                if "budget_action" in config:
+                    index = self.budget_action_combo.findData(config["budget_action"])
+                    if index >= 0:
+                        self.budget_action_combo.setCurrentIndex(index)
+                if "fallbacks" in config:
+                    self.fallback_table.setRowCount(0)
+                    for route in config["fallbacks"]:
+                        self.add_fallback_row(route)
+                if "hedge" in config:
+                    self.hedge_mode.setChecked(config["hedge"])
+                if "failover_stall_seconds" in config:
+                    self.stall_spin.setValue(config["failover_stall_seconds"])
                 
                 QMessageBox.information(self, "成功", "配置已加载")
             except Exception as e:
@@ -706,6 +1857,8 @@ class PDF2ZHTranslator(QMainWindow):
 
 
 if __name__ == '__main__':
+    # 常驻工作进程和输出优化进程池使用 spawn 方式启动，打包为可执行文件时需要
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = PDF2ZHTranslator()
     window.show()
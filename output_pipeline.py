@@ -0,0 +1,129 @@
+"""
+子进程输出管道
+
+同时读取 pdf2zh 子进程的 stdout 和 stderr，避免只读一个管道时另一个管道的缓冲区
+写满导致子进程阻塞。每一行都带有来源流和时间戳，最近的输出保存在固定容量的
+环形缓冲区中，失败时只取尾部作为错误信息。
+"""
+import os
+import time
+import queue
+import codecs
+import threading
+from collections import deque
+
+STDOUT = "stdout"
+STDERR = "stderr"
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class OutputLine:
+    __slots__ = ("stream", "timestamp", "text")
+
+    def __init__(self, stream, timestamp, text):
+        self.stream = stream
+        self.timestamp = timestamp
+        self.text = text
+
+    def format(self):
+        clock = time.strftime("%H:%M:%S", time.localtime(self.timestamp))
+        return f"{clock} [{self.stream}] {self.text}"
+
+
+class _LineSplitter:
+    """把原始字节块增量解码并按 \\n 或 \\r 切分成行（tqdm 进度条用 \\r 刷新）"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending = ""
+
+    def feed(self, data):
+        text = self._pending + self._decoder.decode(data)
+        parts = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        self._pending = parts.pop()
+        return self._make_lines(parts)
+
+    def close(self):
+        rest = self._pending + self._decoder.decode(b"", final=True)
+        self._pending = ""
+        return self._make_lines([rest])
+
+    def _make_lines(self, parts):
+        now = time.time()
+        return [OutputLine(self.stream, now, part.strip()) for part in parts if part.strip()]
+
+
+class OutputPipeline:
+    """
+    读取以二进制管道启动的子进程的 stdout 和 stderr
+
+    POSIX 上使用 selectors 在当前线程中多路读取；Windows 的管道不支持 select，
+    改为每个流一个读取线程。
+    """
+
+    def __init__(self, process, ring_size=2000):
+        self.process = process
+        self.ring = deque(maxlen=ring_size)
+
+    def lines(self):
+        """按到达顺序产出 OutputLine，两个流都关闭后结束"""
+        streams = {STDOUT: self.process.stdout, STDERR: self.process.stderr}
+        streams = {name: stream for name, stream in streams.items() if stream is not None}
+        if os.name == "nt":
+            source = self._read_with_threads(streams)
+        else:
+            source = self._read_with_selectors(streams)
+        for line in source:
+            self.ring.append(line)
+            yield line
+
+    def _read_with_selectors(self, streams):
+        import selectors
+        selector = selectors.DefaultSelector()
+        for name, stream in streams.items():
+            selector.register(stream, selectors.EVENT_READ, _LineSplitter(name))
+        try:
+            while selector.get_map():
+                for key, _ in selector.select():
+                    splitter = key.data
+                    data = os.read(key.fd, _CHUNK_SIZE)
+                    if data:
+                        yield from splitter.feed(data)
+                    else:
+                        selector.unregister(key.fileobj)
+                        yield from splitter.close()
+        finally:
+            selector.close()
+
+    def _read_with_threads(self, streams):
+        lines = queue.Queue()
+
+        def reader(name, stream):
+            splitter = _LineSplitter(name)
+            try:
+                for data in iter(lambda: os.read(stream.fileno(), _CHUNK_SIZE), b""):
+                    for line in splitter.feed(data):
+                        lines.put(line)
+            except OSError:
+                pass
+            for line in splitter.close():
+                lines.put(line)
+            lines.put(None)
+
+        for name, stream in streams.items():
+            threading.Thread(target=reader, args=(name, stream), daemon=True).start()
+
+        remaining = len(streams)
+        while remaining:
+            line = lines.get()
+            if line is None:
+                remaining -= 1
+            else:
+                yield line
+
+    def tail(self, count=50, stream=None):
+        """环形缓冲区中最近的若干行，可按来源流过滤"""
+        selected = [line.text for line in self.ring if stream is None or line.stream == stream]
+        return "\n".join(selected[-count:])
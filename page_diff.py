@@ -0,0 +1,154 @@
+"""
+按页比较文档版本，只翻译变化的页
+
+作者发布修订版（如 arXiv 的 v2、v3）时通常只改动少数几页。增量模式为输入的每一页计算
+指纹（规范化后的文本和版面块位置的哈希），与同一文档上一版本的指纹比较：
+
+- 内容相同的页直接从上一版本的翻译结果中取出，只有变化和新增的页交给 pdf2zh；
+- 最后由 ShardMergeRunner 按新版本的页序把复用的页和新翻译的页拼接为单语版和双语版。
+
+各版本的指纹保存在输出目录的 .versions 文件夹中（每个文档一个 JSON），比较时只需读取
+新版本的文本，不需要重新分析旧版本。文档名末尾的版本号（v2、_v3 等）不参与匹配。
+"""
+import os
+import re
+import json
+import time
+import hashlib
+
+from core import output_paths
+from result_cache import file_digest
+from sharding import open_pdf
+
+VERSIONS_DIR_NAME = ".versions"
+
+# 每个文档保留的版本记录数
+MAX_VERSIONS = 5
+
+# 影响译文内容的设置，不同时旧版本的结果不能复用
+SETTINGS_KEYS = ("service", "model", "source_lang", "target_lang")
+
+# 版面块坐标的取整粒度（点），避免重新排版带来的细微偏移影响匹配
+LAYOUT_GRID = 2
+
+VERSION_SUFFIX = re.compile(r"[-_. ]?v\d+$", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+
+
+def base_name(params):
+    return os.path.splitext(os.path.basename(output_paths(params)[0]))[0][:-len("-mono")]
+
+
+def document_key(name):
+    """去掉版本号后的文档名，例如 2401.01234v2 -> 2401.01234"""
+    return VERSION_SUFFIX.sub("", name) or name
+
+
+def settings_key(params):
+    return hashlib.sha1(json.dumps([params.get(key) for key in SETTINGS_KEYS]).encode("utf-8")).hexdigest()[:12]
+
+
+def page_fingerprints(file_path):
+    """每页一个指纹：规范化文本 + 页面尺寸 + 文本块和图片块的位置"""
+    fingerprints = []
+    with open_pdf(file_path) as doc:
+        for page in doc:
+            digest = hashlib.sha1()
+            digest.update(f"{round(page.rect.width)}x{round(page.rect.height)}".encode("ascii"))
+            for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks"):
+                box = [round(value / LAYOUT_GRID) for value in (x0, y0, x1, y1)]
+                digest.update(f"|{block_type}:{box}:".encode("ascii"))
+                digest.update(WHITESPACE.sub(" ", text).strip().encode("utf-8"))
+            fingerprints.append(digest.hexdigest()[:16])
+    return fingerprints
+
+
+def match_pages(new_pages, old_pages):
+    """
+    返回新版本每一页对应的旧版本页（从0开始），内容有变化的页为 None
+
+    相同指纹的页可能有多个（如空白页），按出现顺序一一对应。
+    """
+    positions = {}
+    for index, fingerprint in enumerate(old_pages):
+        positions.setdefault(fingerprint, []).append(index)
+    sources = []
+    for fingerprint in new_pages:
+        candidates = positions.get(fingerprint)
+        sources.append(candidates.pop(0) if candidates else None)
+    return sources
+
+
+class VersionIndex:
+    """
+    输出目录中各文档版本的指纹记录
+
+    plan(params) 记录本次输入的指纹，并在找到可复用的上一版本时返回复用计划；
+    ShardPlanner 据此只为变化的页生成子任务。
+    """
+
+    def index_path(self, params):
+        return os.path.join(params["output_dir"], VERSIONS_DIR_NAME, f"{document_key(base_name(params))}.json")
+
+    def load(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f).get("versions", [])
+        except (OSError, ValueError, AttributeError):
+            return []
+
+    def save(self, path, versions):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"versions": versions}, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def plan(self, params):
+        """
+        返回复用计划，没有可用的上一版本时返回 None：
+
+        {"previous": 上一版本名, "mono": 旧单语版, "dual": 旧双语版, "pages_per_page": 双语版每页页数,
+         "total_pages": 新版本页数, "sources": 每页对应的旧页（从0开始）或 None}
+        """
+        path = self.index_path(params)
+        name = base_name(params)
+        fingerprints = page_fingerprints(params["file_path"])
+        settings = settings_key(params)
+        versions = self.load(path)
+
+        plan = None
+        for entry in reversed(versions):
+            if entry.get("settings") != settings:
+                continue
+            plan = self._reuse_plan(entry, params["output_dir"], fingerprints)
+            if plan is not None:
+                break
+
+        # 同名的旧记录对应的输出文件会被本次翻译覆盖
+        versions = [entry for entry in versions if entry.get("name") != name]
+        versions.append({"name": name, "digest": file_digest(params["file_path"]), "settings": settings,
+                         "pages": fingerprints, "indexed_at": time.time()})
+        self.save(path, versions[-MAX_VERSIONS:])
+        return plan
+
+    def _reuse_plan(self, entry, output_dir, fingerprints):
+        """检查旧版本的输出是否完整且在记录之后生成，返回复用计划"""
+        mono_path, dual_path = output_paths({"file_path": entry["name"] + ".pdf", "output_dir": output_dir})
+        try:
+            if min(os.path.getmtime(mono_path), os.path.getmtime(dual_path)) < entry["indexed_at"]:
+                # 该版本的翻译没有完成
+                return None
+            with open_pdf(mono_path) as mono, open_pdf(dual_path) as dual:
+                mono_pages, dual_pages = mono.page_count, dual.page_count
+        except Exception:
+            return None
+        old_pages = entry["pages"]
+        if mono_pages != len(old_pages) or not old_pages or dual_pages % len(old_pages):
+            # 只输出了部分页的结果无法按页对应
+            return None
+        sources = match_pages(fingerprints, old_pages)
+        if all(source is None for source in sources):
+            return None
+        return {"previous": entry["name"], "mono": mono_path, "dual": dual_path,
+                "pages_per_page": dual_pages // len(old_pages), "total_pages": len(fingerprints),
+                "sources": sources}
@@ -0,0 +1,190 @@
+"""
+输出文件后处理
+
+pdf2zh 每次都生成单语版和双语版，两者各自嵌入字体，分片合并的结果中同一字体还会有多份
+子集，文件往往比原文大得多。任务完成后 OutputProcessor：
+
+- 按 output_variant 只保留单语版（"mono"）或双语版（"dual"），删除另一份。pdf2zh 总是
+  同时生成两者，因此在这里删除；增量模式需要上一版本的两份结果，始终保留；
+- 启用 optimize_output 时在进程池中重写 PDF：合并各页的字体子集、去掉重复对象、重新压缩
+  内容流、字体和图片，可选线性化（optimize_linearize，需要 pikepdf）以便网页快速查看。
+  结果不比原文件小时保留原文件。
+
+每个文件优化前后的大小和耗时写入日志和任务统计（postprocess 字段）。
+"""
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from core import kept_output_paths, output_paths
+
+DEFAULT_WORKERS = 2
+
+
+def _open_pdf(path):
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+    return pymupdf.open(path)
+
+
+def _linearize(path):
+    """用 pikepdf 线性化，未安装时返回 False"""
+    try:
+        import pikepdf
+    except ImportError:
+        return False
+    tmp_path = f"{path}.linear.tmp"
+    with pikepdf.open(path) as pdf:
+        pdf.save(tmp_path, linearize=True)
+    os.replace(tmp_path, path)
+    return True
+
+
+def optimize_pdf(path, linearize=False):
+    """
+    重写一个 PDF 并返回记录：file、before、after（字节）、seconds，以及 subset、linearized、replaced
+
+    在进程池的子进程中运行。replaced 为 False 表示优化后的文件不比原文件小，保留了原文件。
+    """
+    started = time.time()
+    before = os.path.getsize(path)
+    tmp_path = f"{path}.{os.getpid()}.opt.tmp"
+    record = {"file": os.path.basename(path), "before": before, "after": before,
+              "subset": False, "linearized": False, "replaced": False}
+    try:
+        with _open_pdf(path) as doc:
+            try:
+                # 同名字体合并为一个子集，分片合并的结果中尤其有效（需要 fontTools）
+                doc.subset_fonts(fallback=True)
+                record["subset"] = True
+            except Exception:
+                pass
+            doc.save(tmp_path, garbage=4, deflate=True, deflate_images=True, deflate_fonts=True,
+                     clean=True, use_objstms=1)
+        if linearize:
+            record["linearized"] = _linearize(tmp_path)
+        after = os.path.getsize(tmp_path)
+        if after < before or record["linearized"]:
+            # 输出文件可能是翻译结果缓存的硬链接，替换而不是原地修改
+            os.replace(tmp_path, path)
+            record.update(after=after, replaced=True)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    record["seconds"] = round(time.time() - started, 3)
+    return record
+
+
+def format_size(size):
+    if size >= 1024 * 1024:
+        return f"{size / 1024 / 1024:.1f} MB"
+    return f"{size / 1024:.0f} KB"
+
+
+def format_record(record):
+    """一个文件的优化结果，用于日志"""
+    before, after = record["before"], record["after"]
+    change = (after - before) / before * 100 if before else 0.0
+    text = f"{record['file']} {format_size(before)} → {format_size(after)} ({change:+.0f}%)，用时 {record['seconds']:.1f} 秒"
+    if record["linearized"]:
+        text += "，已线性化"
+    return text
+
+
+def final_outputs(params):
+    """任务完成后的全部输出文件，多目标语言任务包括每种语言的文件"""
+    from fanout import target_languages
+    languages = target_languages(params)
+    if not languages:
+        return [output_paths(params)], [kept_output_paths(params)]
+    variants = [dict(params, output_lang=lang) for lang in languages]
+    return [output_paths(p) for p in variants], [kept_output_paths(p) for p in variants]
+
+
+class OutputProcessor:
+    """
+    任务完成后处理输出文件，由各任务的执行线程调用 process()
+
+    优化在最多 workers 个子进程中进行，多个任务共用同一个进程池，进程池在第一次需要时创建。
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # 与常驻工作进程一致使用 spawn，避免在图形界面进程中 fork
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def set_workers(self, workers):
+        """调整进程数，正在进行的优化完成后生效"""
+        with self._lock:
+            if workers == self.workers:
+                return
+            self.workers = workers
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _reset(self, wait):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def shutdown(self):
+        self._reset(wait=True)
+
+    def process(self, params, on_log=None, telemetry=None):
+        """删除不需要的输出、优化其余文件，返回各文件的优化记录；出错时只记录日志，不影响任务结果"""
+        on_log = on_log or (lambda message: None)
+        paths, kept = final_outputs(params)
+        files = []
+        for produced, wanted in zip(paths, kept):
+            for path, keep in zip(produced, wanted):
+                if keep:
+                    files.append(path)
+                elif os.path.exists(path):
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        on_log(f"无法删除 {os.path.basename(path)}: {str(e)}")
+                        continue
+                    on_log(f"按设置只保留{'单语版' if params['output_variant'] == 'mono' else '双语版'}，"
+                           f"已删除 {os.path.basename(path)}")
+        if not params.get("optimize_output") or not files:
+            return []
+
+        if telemetry is not None:
+            telemetry.enter("postprocess")
+        futures = [(path, self._pool().submit(optimize_pdf, path, bool(params.get("optimize_linearize"))))
+                   for path in files if os.path.exists(path)]
+        records = []
+        for path, future in futures:
+            try:
+                record = future.result()
+            except BrokenProcessPool:
+                # 子进程异常退出后进程池不再可用，下次重新创建
+                self._reset(wait=False)
+                on_log(f"优化 {os.path.basename(path)} 时进程异常退出，保留原文件")
+                continue
+            except Exception as e:
+                on_log(f"优化 {os.path.basename(path)} 失败，保留原文件: {str(e)}")
+                continue
+            records.append(record)
+            on_log(f"输出优化: {format_record(record)}")
+        if params.get("optimize_linearize") and records and not any(r["linearized"] for r in records):
+            on_log("未安装 pikepdf，跳过线性化")
+        if telemetry is not None:
+            telemetry.extra["postprocess"] = records
+        return records
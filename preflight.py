@@ -0,0 +1,322 @@
+"""
+翻译前预检
+
+在启动 pdf2zh 之前只读取 PDF 结构（不做版面检测、不调用翻译服务）：页数、PDF/A
+声明、嵌入字体、扫描页/纯图片页、每页文本量，以及空白页和已经是目标语言的页。据此
+为任务选择代价最小且能正确输出的设置：
+
+- 只有确有需要时才开启兼容模式 (-cp)：存在 Type3 字体或未嵌入的非标准字体，且文档
+  本身不是 PDF/A；
+- 页数较多或存在 Type3 字体时跳过字体子集化，避免渲染阶段耗时过长或失败；
+- pdf2zh 逐页翻译、页内按段落并行，线程数超过单页段落数没有意义，据此限制线程数；
+- 没有可翻译文本的页不交给 pdf2zh 翻译（输出中保留原页）。
+
+同时按文本量和价格表估算各翻译服务的 token 数和费用。分析结果按文件内容哈希缓存，同一文件
+再次分析不需要重新读取。
+"""
+import os
+import re
+import json
+import threading
+
+from core import MODEL_OPTIONS, TRANSLATION_SERVICES, is_url, parse_pages, service_display_name
+from result_cache import file_digest
+from sharding import open_pdf, format_pages
+from usage import PriceTable, estimated_counters
+
+DEFAULT_PREFLIGHT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdf-translator", "preflight")
+
+# 分析逻辑变化时递增，使旧的缓存失效
+ANALYSIS_VERSION = 1
+
+# 少于该字符数（不含空白）的页视为没有可翻译文本
+MIN_TEXT_CHARS = 20
+# 图片覆盖页面面积超过该比例且没有文本时视为扫描页
+SCANNED_IMAGE_COVERAGE = 0.5
+# 该比例以上的文字已经是目标语言的文字时视为已翻译
+TRANSLATED_SCRIPT_RATIO = 0.5
+# 需要翻译的页数超过该值时跳过字体子集化
+LARGE_DOCUMENT_PAGES = 100
+
+# PDF 阅读器必须提供的 14 种标准字体，不嵌入也能正确显示
+STANDARD_FONTS = {
+    "Courier", "Courier-Bold", "Courier-Oblique", "Courier-BoldOblique",
+    "Helvetica", "Helvetica-Bold", "Helvetica-Oblique", "Helvetica-BoldOblique",
+    "Times-Roman", "Times-Bold", "Times-Italic", "Times-BoldItalic", "Symbol", "ZapfDingbats",
+}
+
+# 各目标语言使用的文字
+LANGUAGE_SCRIPTS = {
+    "en": "latin", "fr": "latin", "de": "latin", "es": "latin",
+    "zh-CN": "cjk", "zh-TW": "cjk", "ja": "cjk", "ko": "hangul", "ru": "cyrillic",
+}
+
+_SCRIPT_PATTERNS = {
+    "latin": re.compile(r"[A-Za-z\u00c0-\u024f]"),
+    "cjk": re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]"),
+    "hangul": re.compile(r"[\uac00-\ud7af\u1100-\u11ff]"),
+    "cyrillic": re.compile(r"[\u0400-\u04ff]"),
+}
+
+_PDFA_PATTERN = re.compile(r"pdfaid:part(?:=[\"']|>)\s*(\d)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _count_script(text, script):
+    return len(_SCRIPT_PATTERNS[script].findall(text))
+
+
+def _analyze_page(page):
+    text = page.get_text("text")
+    compact = _WHITESPACE.sub("", text)
+    blocks = sum(1 for block in page.get_text("blocks") if block[6] == 0 and block[4].strip())
+
+    area = abs(page.rect) or 1.0
+    covered = 0.0
+    for image in page.get_image_info():
+        bbox = page.rect & image["bbox"]
+        if not bbox.is_empty:
+            covered += abs(bbox)
+    return {
+        "chars": len(compact),
+        "blocks": blocks,
+        "density": round(len(compact) / area * 1000, 2),  # 每千平方点的字符数
+        "image_coverage": round(min(covered / area, 1.0), 3),
+        "scripts": {script: _count_script(compact, script) for script in _SCRIPT_PATTERNS},
+    }
+
+
+def analyze_pdf(file_path):
+    """读取 PDF 结构，返回可 JSON 序列化的分析结果"""
+    with open_pdf(file_path) as doc:
+        match = _PDFA_PATTERN.search(doc.get_xml_metadata() or "")
+        fonts = {}
+        pages = []
+        for page in doc:
+            for xref, ext, font_type, basefont, *_ in page.get_fonts():
+                # 子集字体的名称带有 "ABCDEF+" 前缀
+                name = basefont.split("+", 1)[-1]
+                fonts[xref] = {"name": name, "type": font_type, "embedded": ext != "n/a"}
+            pages.append(_analyze_page(page))
+        return {
+            "version": ANALYSIS_VERSION,
+            "page_count": doc.page_count,
+            "encrypted": bool(doc.is_encrypted),
+            "pdfa": f"PDF/A-{match.group(1)}" if match else "",
+            "fonts": list(fonts.values()),
+            "pages": pages,
+        }
+
+
+def _page_kind(page, source_script, target_script):
+    """返回页面不需要翻译的原因，需要翻译时返回空字符串"""
+    if page["chars"] < MIN_TEXT_CHARS:
+        return "scanned" if page["image_coverage"] >= SCANNED_IMAGE_COVERAGE else "empty"
+    if target_script and target_script != source_script:
+        letters = sum(page["scripts"].values())
+        if letters and page["scripts"].get(target_script, 0) / letters >= TRANSLATED_SCRIPT_RATIO:
+            return "translated"
+    return ""
+
+
+def plan(report, params, prices=None):
+    """
+    根据分析结果为任务选择设置，返回计划字典
+
+    包含需要翻译的页码、建议的兼容模式/字体子集化/线程上限、跳过的页及原因、
+    以及各服务的 token 和费用估算。
+    """
+    total = report["page_count"]
+    selected = parse_pages(params.get("pages", ""))
+    selected = range(total) if selected is None else [p for p in selected if 0 <= p < total]
+
+    source_script = LANGUAGE_SCRIPTS.get(params.get("source_lang", ""))
+    target_script = LANGUAGE_SCRIPTS.get(params.get("target_lang", ""))
+    skipped = {"empty": [], "scanned": [], "translated": []}
+    translate = []
+    for index in selected:
+        kind = _page_kind(report["pages"][index], source_script, target_script)
+        if kind:
+            skipped[kind].append(index + 1)
+        else:
+            translate.append(index)
+
+    prices = prices or PriceTable()
+    pages = [report["pages"][index] for index in translate]
+    chars = sum(page["chars"] for page in pages)
+    cjk = sum(page["scripts"].get("cjk", 0) for page in pages)
+    segments = sum(page["blocks"] for page in pages)
+    cjk_target = target_script in ("cjk", "hangul")
+    counters = estimated_counters({"chars": chars, "cjk": cjk, "segments": segments, "cjk_target": cjk_target})
+
+    type3 = any(font["type"] == "Type3" for font in report["fonts"])
+    missing_fonts = sorted({font["name"] for font in report["fonts"]
+                            if not font["embedded"] and font["type"] != "Type3"
+                            and font["name"] not in STANDARD_FONTS})
+    compatible_mode = (type3 or bool(missing_fonts)) and not report["pdfa"]
+    skip_subset_fonts = type3 or len(translate) > LARGE_DOCUMENT_PAGES
+    max_blocks = max((page["blocks"] for page in pages), default=1)
+
+    def estimate(service, model):
+        tokens_in, tokens_out = prices.tokens(service, counters)
+        return tokens_in, tokens_out, prices.cost(service, model, tokens_in, tokens_out, chars)
+
+    costs = {}
+    for service in TRANSLATION_SERVICES.values():
+        for model in MODEL_OPTIONS.get(service) or [""]:
+            cost = estimate(service, model)[2]
+            if cost is not None:
+                costs[f"{service}:{model}" if model else service] = round(cost, 4)
+    tokens_in, tokens_out, cost = estimate(params.get("service", ""), params.get("model", ""))
+
+    return {
+        "pages": format_pages(index + 1 for index in translate),
+        "translate_pages": len(translate),
+        "skipped": skipped,
+        "compatible_mode": compatible_mode,
+        "skip_subset_fonts": skip_subset_fonts,
+        "max_threads": max(max_blocks, 1),
+        "missing_fonts": missing_fonts,
+        "type3_fonts": type3,
+        "chars": chars,
+        "cjk": cjk,
+        "cjk_target": cjk_target,
+        "segments": segments,
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+        "cost": cost,
+        "costs": costs,
+    }
+
+
+def summarize(report, result):
+    """一行文字摘要，用于日志和任务列表"""
+    parts = [f"{report['page_count']} 页，需翻译 {result['translate_pages']} 页"]
+    labels = {"empty": "空白", "scanned": "扫描", "translated": "已是目标语言"}
+    skipped = [f"{labels[kind]} {len(pages)}" for kind, pages in result["skipped"].items() if pages]
+    if skipped:
+        parts.append("跳过 " + "、".join(skipped))
+    if report["pdfa"]:
+        parts.append(report["pdfa"])
+    settings = []
+    if result["compatible_mode"]:
+        settings.append("兼容模式")
+    if result["skip_subset_fonts"]:
+        settings.append("跳过字体子集化")
+    settings.append(f"线程上限 {result['max_threads']}")
+    parts.append("、".join(settings))
+    text = f"约 {result['tokens_in'] + result['tokens_out']:,} token"
+    if result["cost"]:
+        text += f"，约 ${result['cost']:.2f}"
+    parts.append(text)
+    return "，".join(parts)
+
+
+def format_report(report, result):
+    """多行文字报告，用于预检对话框和命令行"""
+    lines = [summarize(report, result)]
+    if report["encrypted"]:
+        lines.append("文档已加密")
+    embedded = sum(1 for font in report["fonts"] if font["embedded"])
+    lines.append(f"字体: {len(report['fonts'])} 个，其中嵌入 {embedded} 个"
+                 + ("，包含 Type3 字体" if result["type3_fonts"] else ""))
+    if result["missing_fonts"]:
+        lines.append("未嵌入的字体: " + ", ".join(result["missing_fonts"][:10]))
+    labels = {"empty": "空白页", "scanned": "扫描页/纯图片页", "translated": "已是目标语言的页"}
+    for kind, pages in result["skipped"].items():
+        if pages:
+            lines.append(f"{labels[kind]}: {format_pages(pages)}")
+    lines.append(f"文本: {result['chars']:,} 字符，{result['segments']} 段；"
+                 f"约 {result['tokens_in']:,} 输入 token，{result['tokens_out']:,} 输出 token")
+    if not result["chars"]:
+        return "\n".join(lines)
+    lines.append("费用估算 (美元):")
+    for key, cost in sorted(result["costs"].items(), key=lambda item: item[1]):
+        service, _, model = key.partition(":")
+        name = service_display_name(service) + (f" {model}" if model else "")
+        lines.append(f"  {name}: {'免费' if not cost else f'${cost:.4f}'}")
+    return "\n".join(lines)
+
+
+class Preflight:
+    """
+    带缓存的预检
+
+    分析结果按文件内容哈希保存在 cache_dir（为空时只缓存在内存中）。作为 ShardPlanner
+    的一部分在任务第一次派发时调用 apply()。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_PREFLIGHT_DIR):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._reports = {}  # 内容哈希 -> 分析结果
+        self._digests = {}  # 文件 -> (大小, 修改时间, 内容哈希)
+
+    def _digest(self, file_path):
+        stat = os.stat(file_path)
+        with self._lock:
+            known = self._digests.get(file_path)
+        if known and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            return known[2]
+        digest = file_digest(file_path)
+        with self._lock:
+            self._digests[file_path] = (stat.st_size, stat.st_mtime_ns, digest)
+        return digest
+
+    def analyze(self, file_path):
+        """返回文件的分析结果，相同内容的文件只分析一次"""
+        digest = self._digest(file_path)
+        with self._lock:
+            report = self._reports.get(digest)
+        if report is not None:
+            return report
+        cache_path = os.path.join(self.cache_dir, f"{digest}.json") if self.cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    report = json.load(f)
+            except (OSError, ValueError):
+                report = None
+            if report is not None and report.get("version") != ANALYSIS_VERSION:
+                report = None
+        if report is None:
+            report = analyze_pdf(file_path)
+            if cache_path:
+                try:
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    tmp_path = cache_path + ".tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        json.dump(report, f)
+                    os.replace(tmp_path, cache_path)
+                except OSError:
+                    pass
+        with self._lock:
+            self._reports[digest] = report
+        return report
+
+    def apply(self, params):
+        """
+        预检并按结果修改任务参数，返回摘要文字；URL、未启用预检或分析失败时不修改参数
+
+        所有选中的页都不需要翻译时保留原页码范围，仍交给 pdf2zh 生成输出文件。
+        """
+        if not params.get("preflight") or is_url(params["file_path"]):
+            return None
+        try:
+            report = self.analyze(params["file_path"])
+        except Exception as e:
+            params["preflight_summary"] = f"预检失败，按原设置翻译: {str(e)}"
+            return params["preflight_summary"]
+        result = plan(report, params)
+        if result["translate_pages"]:
+            if result["translate_pages"] < report["page_count"] or params.get("pages"):
+                params["pages"] = result["pages"]
+        # 预检只开启这两项，不关闭用户已开启的设置
+        params["compatible_mode"] = params.get("compatible_mode") or result["compatible_mode"]
+        params["skip_subset_fonts"] = params.get("skip_subset_fonts") or result["skip_subset_fonts"]
+        params["max_threads"] = result["max_threads"]
+        # 没有用量计量时按预检的文本量估算费用
+        params["estimate"] = {key: result[key] for key in ("chars", "cjk", "cjk_target", "segments")}
+        params["estimate"]["pages"] = result["translate_pages"]
+        params["preflight_summary"] = summarize(report, result)
+        return params["preflight_summary"]
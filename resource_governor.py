@@ -0,0 +1,309 @@
+"""
+任务资源管理
+
+多个 pdf2zh 进程同时做版面检测和字体子集化时，内存很容易耗尽并开始使用交换分区。
+ResourceGovernor 定时从 /proc 采样每个运行中任务的内存和 CPU：
+
+- 按任务参数限制单个任务：memory_limit_mb（超过后停止任务并标记为失败）、nice（进程优先级）
+  和 cpu_affinity（允许使用的 CPU，如 "0-3"）。后两项只用于子进程模式，常驻工作进程由多个
+  任务共用，而且普通用户无法再调低 nice 值；
+- 按系统可用内存（以及 /proc/pressure/memory）分级应对：可用内存低于预留比例时暂停派发新
+  任务，低于其一半时挂起（SIGSTOP）优先级最低的任务，低于四分之一时结束它并放回队列，
+  而不是让内核的 OOM killer 随意挑选进程。内存恢复后调度器依次恢复挂起的任务。
+
+只在 Linux 上生效（需要 /proc），其他系统上不做任何处理。
+"""
+import os
+import time
+import threading
+
+from scheduler import JobState
+from telemetry import child_pids, read_process
+
+DEFAULT_RESERVE_PERCENT = 15
+SAMPLE_INTERVAL = 1.0
+
+# 两次挂起或结束任务之间至少间隔的秒数，让内存的变化有时间反映出来
+ACTION_INTERVAL = 5.0
+
+# 任务因内存不足被放回队列的次数上限，超过后标记为失败
+MAX_REQUEUES = 2
+
+# /proc/pressure/memory 中 full avg10 超过该百分比时按内存紧张处理
+PRESSURE_FULL_PERCENT = 20.0
+
+
+class Level:
+    NORMAL = 0
+    THROTTLE = 1  # 暂停派发新任务
+    SUSPEND = 2  # 挂起优先级最低的任务
+    CRITICAL = 3  # 结束优先级最低的任务并放回队列
+
+
+LEVEL_LABELS = {
+    Level.NORMAL: "正常",
+    Level.THROTTLE: "内存紧张，暂停派发新任务",
+    Level.SUSPEND: "内存不足，挂起低优先级任务",
+    Level.CRITICAL: "内存严重不足，停止低优先级任务",
+}
+
+
+def parse_cpu_list(text):
+    """把 "0-3,6" 形式的 CPU 列表转换为编号集合，空字符串返回 None"""
+    cpus = set()
+    for part in (text or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus or None
+
+
+def read_memory():
+    """返回 (总内存MB, 可用内存MB)，不支持时返回 None"""
+    values = {}
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in ("MemTotal", "MemAvailable"):
+                    values[name] = int(rest.split()[0]) / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    if "MemTotal" not in values or "MemAvailable" not in values:
+        return None
+    return values["MemTotal"], values["MemAvailable"]
+
+
+def read_pressure():
+    """/proc/pressure/memory 中 full avg10 的百分比，不支持时返回 0"""
+    try:
+        with open("/proc/pressure/memory", "r") as f:
+            for line in f:
+                if line.startswith("full"):
+                    fields = dict(item.split("=", 1) for item in line.split()[1:])
+                    return float(fields.get("avg10", 0))
+    except (OSError, ValueError):
+        pass
+    return 0.0
+
+
+def _threads(pid):
+    try:
+        return [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except (OSError, ValueError):
+        return []
+
+
+class _JobSample:
+    """一个任务最近一次采样的结果"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.rss_mb = 0.0
+        self.cpu_percent = 0.0
+        self.cpu_seconds = None
+        self.sampled_at = None
+        self.suspended = False
+        self.limited_threads = set()  # 已设置 nice 和 CPU 亲和性的线程
+
+
+class ResourceGovernor:
+    """
+    定时采样任务进程并按内存情况限制调度
+
+    attach(scheduler) 后开始工作：设置调度器的 admission，在后台线程中采样。call(函数, *参数)
+    决定对调度器的操作在哪个线程执行（图形界面转到主线程），on_log(文本) 接收处理记录。
+    """
+
+    def __init__(self, reserve_percent=DEFAULT_RESERVE_PERCENT, interval=SAMPLE_INTERVAL, on_log=None, call=None):
+        self.reserve_percent = reserve_percent
+        self.interval = interval
+        self.on_log = on_log or (lambda message: None)
+        self.call = call or (lambda function, *args: function(*args))
+        self.supported = read_memory() is not None
+        self.level = Level.NORMAL
+        self.memory = None  # (总内存MB, 可用内存MB)
+        self.peak_job_mb = 0.0  # 本次运行中单个任务的最大内存占用，用于判断能否再派发任务
+        self.scheduler = None
+        self._samples = {}  # 任务 id -> _JobSample
+        self._last_action = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---- 启动与停止 ----
+    def attach(self, scheduler):
+        self.scheduler = scheduler
+        if not self.supported:
+            return
+        scheduler.set_admission(self.admit)
+        self._thread = threading.Thread(target=self._run, name="resource-governor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                self.call(self.on_log, f"资源管理出错: {str(e)}")
+
+    # ---- 调度器回调 ----
+    def admit(self, job):
+        """调度器派发任务或恢复挂起的任务前调用（持有调度器的锁），没有正在执行的任务时总是允许"""
+        with self._lock:
+            if all(sample.suspended for sample in self._samples.values()):
+                return True
+            if self.level != Level.NORMAL:
+                return False
+            if self.memory is None or not self.peak_job_mb:
+                return True
+            total_mb, available_mb = self.memory
+            # 可用内存在预留之外还要能容纳一个与最大任务相当的新任务
+            return available_mb - total_mb * self.reserve_percent / 100 >= self.peak_job_mb
+
+    # ---- 采样 ----
+    def usage(self, job_id):
+        """任务最近的 (内存MB, CPU%)，没有采样时返回 None"""
+        with self._lock:
+            sample = self._samples.get(job_id)
+            return (sample.rss_mb, sample.cpu_percent) if sample is not None else None
+
+    def status(self):
+        """界面和日志使用的一行状态"""
+        with self._lock:
+            if not self.supported or self.memory is None:
+                return "资源管理: 当前系统不支持" if not self.supported else "资源管理: 等待采样"
+            total_mb, available_mb = self.memory
+            jobs_mb = sum(sample.rss_mb for sample in self._samples.values())
+            level = self.level
+        return (f"内存: 可用 {available_mb / 1024:.1f}/{total_mb / 1024:.1f} GB，"
+                f"翻译任务占用 {jobs_mb / 1024:.1f} GB | {LEVEL_LABELS[level]}")
+
+    def tick(self):
+        """采样一次并在需要时处理，由后台线程定时调用"""
+        memory = read_memory()
+        if memory is None:
+            return
+        jobs = self._sample_jobs()
+        level = self._pressure_level(memory)
+        with self._lock:
+            previous, self.level, self.memory = self.level, level, memory
+        if level != previous:
+            self.call(self._level_changed, previous, level)
+        elif jobs and all(sample.suspended for _, sample in jobs):
+            # 其余任务都已结束，只剩挂起的任务占用内存时先恢复一个，避免一直等待
+            self.call(self.scheduler.dispatch)
+
+        for job, sample in jobs:
+            limit = int(job.params.get("memory_limit_mb") or 0)
+            if limit and sample.rss_mb > limit:
+                self.call(self._interrupt, job, f"内存占用 {sample.rss_mb:.0f} MB 超过任务上限 {limit} MB", False)
+
+        now = time.time()
+        if level >= Level.SUSPEND and now - self._last_action >= ACTION_INTERVAL:
+            # 只有一个任务时挂起或结束它无济于事
+            candidates = [(job, sample) for job, sample in jobs
+                          if level == Level.CRITICAL or not job.suspended]
+            if len(candidates) >= 2:
+                victim, sample = min(candidates, key=lambda item: (item[0].priority, -item[1].rss_mb))
+                self._last_action = now
+                if level == Level.CRITICAL:
+                    requeue = victim.requeues < MAX_REQUEUES
+                    message = (f"系统内存不足，已停止并重新排队 (占用 {sample.rss_mb:.0f} MB)" if requeue
+                               else "系统内存不足，任务多次被停止")
+                    self.call(self._interrupt, victim, message, requeue)
+                else:
+                    self.call(self._suspend, victim, f"系统内存不足，已挂起 (占用 {sample.rss_mb:.0f} MB)")
+
+    def _pressure_level(self, memory):
+        total_mb, available_mb = memory
+        reserve_mb = total_mb * self.reserve_percent / 100
+        if available_mb < reserve_mb / 4:
+            return Level.CRITICAL
+        if available_mb < reserve_mb / 2 or read_pressure() >= PRESSURE_FULL_PERCENT:
+            return Level.SUSPEND
+        if available_mb < reserve_mb:
+            return Level.THROTTLE
+        # 从紧张状态恢复时多留一些余量，避免反复切换
+        if self.level != Level.NORMAL and available_mb < reserve_mb * 1.2:
+            return Level.THROTTLE
+        return Level.NORMAL
+
+    def _sample_jobs(self):
+        """采样运行中的翻译任务，返回 [(任务, _JobSample)]"""
+        now = time.time()
+        result = []
+        samples = {}
+        for job in self.scheduler.running_jobs():
+            runner = getattr(job.handle, "runner", None)
+            pid = runner.running_pid() if hasattr(runner, "running_pid") else None
+            if pid is None:
+                continue
+            with self._lock:
+                sample = self._samples.get(job.id)
+            if sample is None or sample.pid != pid:
+                sample = _JobSample(pid)
+            rss_mb, cpu_seconds = 0.0, 0.0
+            for process_id in [pid] + child_pids(pid):
+                usage = read_process(process_id)
+                if usage is not None:
+                    rss_mb += usage[0]
+                    cpu_seconds += usage[1]
+            if sample.cpu_seconds is not None and now > sample.sampled_at:
+                sample.cpu_percent = max(cpu_seconds - sample.cpu_seconds, 0.0) / (now - sample.sampled_at) * 100
+            sample.rss_mb, sample.cpu_seconds, sample.sampled_at = rss_mb, cpu_seconds, now
+            sample.suspended = job.suspended
+            if pid != getattr(runner, "worker_pid", None):
+                self._apply_limits(job, sample)
+            samples[job.id] = sample
+            result.append((job, sample))
+        with self._lock:
+            self._samples = samples
+            if samples:
+                self.peak_job_mb = max([self.peak_job_mb] + [sample.rss_mb for sample in samples.values()])
+        return result
+
+    def _apply_limits(self, job, sample):
+        """为子进程的新线程设置 nice 和 CPU 亲和性（Linux 上两者都按线程生效）"""
+        nice = int(job.params.get("nice") or 0)
+        cpus = parse_cpu_list(job.params.get("cpu_affinity", ""))
+        if not nice and not cpus:
+            return
+        for tid in _threads(sample.pid):
+            if tid in sample.limited_threads:
+                continue
+            sample.limited_threads.add(tid)
+            try:
+                if nice and os.getpriority(os.PRIO_PROCESS, tid) < nice:
+                    os.setpriority(os.PRIO_PROCESS, tid, nice)
+                if cpus:
+                    os.sched_setaffinity(tid, cpus)
+            except (OSError, AttributeError, ValueError):
+                pass
+
+    # ---- 对调度器的操作（在 call 指定的线程中执行）----
+    def _level_changed(self, previous, level):
+        if level > previous:
+            self.on_log(f"资源管理: {self.status()}")
+        elif level == Level.NORMAL:
+            self.on_log("资源管理: 内存已恢复，继续派发任务")
+            self.scheduler.dispatch()
+
+    def _suspend(self, job, message):
+        if self.scheduler.suspend(job.id, message):
+            self.on_log(f"资源管理: 挂起 #{job.id} {job.name}，{message}")
+
+    def _interrupt(self, job, message, requeue):
+        if job.state == JobState.RUNNING and self.scheduler.interrupt(job.id, message, requeue):
+            self.on_log(f"资源管理: {'停止并重新排队' if requeue else '停止'} #{job.id} {job.name}，{message}")
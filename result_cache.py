@@ -0,0 +1,155 @@
+"""
+翻译结果缓存
+
+以 PDF 内容哈希加影响输出的翻译参数作为键，在本地保存 pdf2zh 生成的单语版和双语版
+文件。相同文件、相同设置再次翻译时直接把缓存的结果链接或复制到输出目录，不再调用
+翻译服务。缓存总大小超过上限时按最近最少使用的顺序淘汰。
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+# 影响翻译结果的参数
+CACHE_PARAM_KEYS = (
+    "service", "api_url", "model", "source_lang", "target_lang",
+    "pages", "compatible_mode", "skip_subset_fonts",
+)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdf-translator", "results")
+
+
+def file_digest(file_path, chunk_size=1024 * 1024):
+    """流式计算文件的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _link_or_copy(src, dst):
+    """优先使用硬链接，跨文件系统等情况下退回到复制"""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class ResultCache:
+    """按最近最少使用淘汰的磁盘结果缓存，线程安全"""
+
+    INDEX_NAME = "index.json"
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = self._load_index()
+
+    # ---- 索引 ----
+    def _index_path(self):
+        return os.path.join(self.cache_dir, self.INDEX_NAME)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path())
+
+    def _entry_paths(self, key):
+        entry_dir = os.path.join(self.cache_dir, key[:2], key)
+        return entry_dir, os.path.join(entry_dir, "mono.pdf"), os.path.join(entry_dir, "dual.pdf")
+
+    # ---- 键 ----
+    def make_key(self, params):
+        """计算缓存键，URL 或不存在的文件返回 None"""
+        file_path = params.get("file_path", "")
+        if not file_path or file_path.startswith(("http://", "https://")) or not os.path.isfile(file_path):
+            return None
+        settings = {key: params.get(key) for key in CACHE_PARAM_KEYS}
+        digest = hashlib.sha256()
+        digest.update(file_digest(file_path).encode("ascii"))
+        digest.update(json.dumps(settings, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return digest.hexdigest()
+
+    # ---- 读写 ----
+    def restore(self, key, mono_path, dual_path):
+        """命中时把缓存结果放到输出路径并返回 True"""
+        with self._lock:
+            _, cached_mono, cached_dual = self._entry_paths(key)
+            if key not in self._index or not (os.path.exists(cached_mono) and os.path.exists(cached_dual)):
+                self._index.pop(key, None)
+                self.misses += 1
+                return False
+            _link_or_copy(cached_mono, mono_path)
+            _link_or_copy(cached_dual, dual_path)
+            self._index[key]["last_used"] = time.time()
+            self._save_index()
+            self.hits += 1
+            return True
+
+    def store(self, key, mono_path, dual_path):
+        """保存一次成功翻译的结果，输出文件不完整时忽略"""
+        if not (os.path.exists(mono_path) and os.path.exists(dual_path)):
+            return False
+        entry_dir, cached_mono, cached_dual = self._entry_paths(key)
+        with self._lock:
+            os.makedirs(entry_dir, exist_ok=True)
+            # 使用复制而不是链接，避免之后修改输出文件时影响缓存
+            shutil.copyfile(mono_path, cached_mono)
+            shutil.copyfile(dual_path, cached_dual)
+            now = time.time()
+            self._index[key] = {
+                "size": os.path.getsize(cached_mono) + os.path.getsize(cached_dual),
+                "created": now,
+                "last_used": now,
+                "source": os.path.basename(mono_path),
+            }
+            self._evict()
+            self._save_index()
+        return True
+
+    def _evict(self):
+        total = sum(entry["size"] for entry in self._index.values())
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            total -= self._index.pop(key)["size"]
+            shutil.rmtree(self._entry_paths(key)[0], ignore_errors=True)
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+            self._save_index()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                shutil.rmtree(self._entry_paths(key)[0], ignore_errors=True)
+            self._index = {}
+            self._save_index()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "bytes": sum(entry["size"] for entry in self._index.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
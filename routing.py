@@ -0,0 +1,242 @@
+"""
+多服务路由：备用服务、故障切换与对冲
+
+任务除主服务外可以配置按优先级排列的备用服务（params["fallbacks"]，每项包含
+service/model/api_key/api_url）。ProviderRouter 在整个会话中统计每个服务（服务 + 模型）
+的成功率和每页耗时，供所有任务共用：
+
+- 最近失败率超过阈值的服务进入冷却期，冷却期内排到路由列表末尾；
+- 运行中的任务长时间没有进度、每页耗时超过上限（或该服务平常水平的若干倍）、
+  错误信息过多时，停止当前服务并切换到下一个；
+- 启用对冲（params["hedge"]）时，任务耗时超过按该服务每页耗时预计的若干倍后，
+  用下一个服务同时翻译，先完成的一方胜出。分片任务的每个分片分别对冲。
+"""
+import time
+import threading
+from collections import deque
+
+from concurrency import RATE_LIMIT_PATTERN, TIMEOUT_PATTERN, ERROR_PATTERN
+
+# 每个路由项可以覆盖的参数
+ROUTE_KEYS = ("service", "model", "api_key", "api_url")
+
+# 每页耗时的指数移动平均系数
+EWMA_ALPHA = 0.3
+
+
+def provider_key(params):
+    """服务 + 模型，健康统计按此汇总"""
+    return f"{params['service']}:{params['model']}" if params.get("model") else params["service"]
+
+
+def route_list(params):
+    """主服务加备用服务的任务参数列表，重复的服务只保留第一个"""
+    routes = [params]
+    seen = {provider_key(params)}
+    for fallback in params.get("fallbacks") or []:
+        route = dict(params, **{key: fallback.get(key, "") for key in ROUTE_KEYS})
+        key = provider_key(route)
+        if key not in seen:
+            seen.add(key)
+            routes.append(route)
+    return routes
+
+
+class RouteAttempt:
+    """一次使用某个服务的翻译尝试，由执行线程更新进度和错误数"""
+
+    def __init__(self, params, expected_pages=0):
+        self.params = params
+        self.key = provider_key(params)
+        self.expected_pages = expected_pages
+        self.started_at = time.time()
+        self.last_progress = self.started_at
+        self.pages_done = 0
+        self.total_pages = 0
+        self.errors = 0
+
+    def progress(self, current, total):
+        if current > self.pages_done:
+            self.pages_done = current
+            self.last_progress = time.time()
+        if total:
+            self.total_pages = total
+
+    def observe(self, text):
+        if RATE_LIMIT_PATTERN.search(text) or TIMEOUT_PATTERN.search(text) or ERROR_PATTERN.search(text):
+            self.errors += 1
+
+    def elapsed(self):
+        return time.time() - self.started_at
+
+    def exclude(self, seconds):
+        """任务被挂起的时间不计入耗时和无进度时间"""
+        self.started_at += seconds
+        self.last_progress += seconds
+
+    def page_seconds(self):
+        return self.elapsed() / self.pages_done if self.pages_done else None
+
+
+class _ProviderStats:
+    def __init__(self, window):
+        self.outcomes = deque(maxlen=window)  # 最近的成功/失败
+        self.attempts = 0
+        self.failures = 0
+        self.failovers = 0
+        self.hedges = 0  # 慢于预期而启动对冲的次数
+        self.hedge_wins = 0  # 其中备用服务先完成的次数
+        self.page_seconds = None
+        self.cooldown_until = 0.0
+        self.last_error = ""
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+
+class ProviderRouter:
+    """
+    会话级的服务健康统计与路由决策，线程安全
+
+    stall_seconds：没有任何页进度超过该秒数时切换服务；max_page_seconds：每页耗时上限，
+    为0时按该服务平常每页耗时的 slow_factor 倍判断；max_errors：一次尝试中的错误信息
+    上限；失败率达到 max_error_rate（至少 min_samples 次）时冷却 cooldown 秒；
+    对冲在耗时超过预计的 hedge_factor 倍时启动。
+    """
+
+    def __init__(self, stall_seconds=300, max_page_seconds=0, slow_factor=3.0, max_errors=10,
+                 max_error_rate=0.5, min_samples=2, cooldown=300, hedge_factor=2.0, window=10):
+        self.stall_seconds = stall_seconds
+        self.max_page_seconds = max_page_seconds
+        self.slow_factor = slow_factor
+        self.max_errors = max_errors
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.hedge_factor = hedge_factor
+        self.window = window
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def set_thresholds(self, stall_seconds=None, max_page_seconds=None):
+        with self._lock:
+            if stall_seconds is not None:
+                self.stall_seconds = stall_seconds
+            if max_page_seconds is not None:
+                self.max_page_seconds = max_page_seconds
+
+    def _get(self, key):
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _ProviderStats(self.window)
+        return stats
+
+    def healthy(self, key):
+        with self._lock:
+            return self._get(key).cooldown_until <= time.time()
+
+    def candidates(self, params):
+        """按优先级排列的路由，冷却中的服务排到最后（其他服务都失败时仍会尝试）"""
+        routes = route_list(params)
+        healthy = [route for route in routes if self.healthy(provider_key(route))]
+        return healthy + [route for route in routes if route not in healthy]
+
+    def start(self, params, expected_pages=0):
+        with self._lock:
+            self._get(provider_key(params)).attempts += 1
+        return RouteAttempt(params, expected_pages)
+
+    def check(self, attempt):
+        """当前尝试需要切换服务时返回原因"""
+        with self._lock:
+            stats = self._get(attempt.key)
+            idle = time.time() - attempt.last_progress
+            if self.stall_seconds and idle > self.stall_seconds:
+                return f"{idle:.0f} 秒没有进度"
+            if self.max_errors and attempt.errors >= self.max_errors:
+                return f"出现 {attempt.errors} 次错误"
+            page_seconds = attempt.page_seconds()
+            if page_seconds is None:
+                return None
+            limit = self.max_page_seconds
+            if not limit and stats.page_seconds:
+                limit = stats.page_seconds * self.slow_factor
+            # 至少完成两页再按每页耗时判断，避免启动开销造成误判
+            if limit and attempt.pages_done >= 2 and page_seconds > limit:
+                return f"每页 {page_seconds:.1f} 秒，超过上限 {limit:.1f} 秒"
+            return None
+
+    def should_hedge(self, attempt):
+        """耗时超过按每页耗时预计的 hedge_factor 倍时返回 True"""
+        with self._lock:
+            page_seconds = self._get(attempt.key).page_seconds
+            if not self.hedge_factor or not page_seconds:
+                return False
+            pages = attempt.total_pages or attempt.expected_pages
+            if not pages:
+                return False
+            return attempt.elapsed() > page_seconds * pages * self.hedge_factor
+
+    def finish(self, attempt, success, reason="", failover=False, hedge=False, hedge_won=False):
+        """
+        记录一次尝试的结果
+
+        success 为 None 表示结果不计入健康统计（被取消，或对冲中另一方先完成）。
+        """
+        with self._lock:
+            stats = self._get(attempt.key)
+            if hedge:
+                stats.hedges += 1
+                stats.hedge_wins += int(hedge_won)
+            if failover:
+                stats.failovers += 1
+            if success is None:
+                return
+            stats.outcomes.append(bool(success))
+            if success:
+                if attempt.pages_done:
+                    value = attempt.elapsed() / attempt.pages_done
+                    stats.page_seconds = value if stats.page_seconds is None else \
+                        stats.page_seconds * (1 - EWMA_ALPHA) + value * EWMA_ALPHA
+                return
+            stats.failures += 1
+            stats.last_error = reason.splitlines()[0] if reason else ""
+            if len(stats.outcomes) >= self.min_samples and stats.error_rate() >= self.max_error_rate:
+                stats.cooldown_until = time.time() + self.cooldown
+
+    def stats(self):
+        """各服务的健康统计"""
+        now = time.time()
+        with self._lock:
+            return {key: {"attempts": stats.attempts, "failures": stats.failures,
+                          "error_rate": stats.error_rate(), "page_seconds": stats.page_seconds,
+                          "failovers": stats.failovers, "hedges": stats.hedges,
+                          "hedge_wins": stats.hedge_wins,
+                          "cooldown": max(0.0, stats.cooldown_until - now),
+                          "last_error": stats.last_error}
+                    for key, stats in self._stats.items()}
+
+
+def format_health(stats, service_name=lambda service: service):
+    """把 stats() 的结果格式化为多行文字"""
+    lines = []
+    for key, item in sorted(stats.items()):
+        if not item["attempts"]:
+            continue
+        service, _, model = key.partition(":")
+        name = service_name(service) + (f" {model}" if model else "")
+        text = f"{name}: 尝试 {item['attempts']} 次，失败率 {item['error_rate'] * 100:.0f}%"
+        if item["page_seconds"]:
+            text += f"，每页 {item['page_seconds']:.1f} 秒"
+        if item["failovers"]:
+            text += f"，切换 {item['failovers']} 次"
+        if item["hedges"]:
+            text += f"，被对冲 {item['hedges']} 次 (备用服务先完成 {item['hedge_wins']} 次)"
+        if item["cooldown"]:
+            text += f"，冷却中 (剩余 {item['cooldown']:.0f} 秒)"
+        if item["last_error"]:
+            text += f"\n    最近错误: {item['last_error']}"
+        lines.append(text)
+    return "\n".join(lines) or "暂无服务统计"
@@ -0,0 +1,711 @@
+"""
+翻译任务队列与调度器
+
+调度器本身不依赖 Qt：它只维护任务状态，在有空闲槽位时通过 launcher 回调启动
+排队中的任务，任务结束后由调用方调用 job_finished() 回报结果。
+
+可选的 expander(job) 可以在任务第一次派发时把它拆分为若干子任务（例如按页码分片）。
+父任务在子任务运行期间不占用槽位；全部子任务成功后父任务会再次派发给 launcher，
+此时 job.children 不为空，由 launcher 负责合并子任务的结果。
+
+可选的 preparer(job, done, report) 在任务加入队列时调用，用于下载 URL 等准备工作：
+返回带 stop() 的句柄表示正在后台准备，准备期间任务留在队列中但不会被派发，完成后
+调用 done(错误信息或 None)，report(文本) 更新任务的提示信息；返回 None 表示无需准备。
+
+派发顺序：合并阶段的父任务最先，其次按优先级（params["priority"]，越大越先，排队时间
+每超过 aging_seconds 提高1级，避免饿死），启用公平分配时正在运行和已派发任务较少的来源
+优先（params["owner"]，默认为 URL 的主机名或文件所在文件夹），启用短任务优先时按估计的
+剩余页数（estimator(params) 给出）从少到多，最后按加入队列的顺序。
+
+启用抢占时，更高优先级的任务（或启用短任务优先时不超过 QUICK_JOB_PAGES 页的任务）
+在没有空闲槽位时会挂起一个剩余页数较多的低优先级任务，句柄需提供 suspend()/resume()，
+suspend() 返回 False 表示该任务暂时不能挂起。被挂起的任务不占用槽位，排在同等条件的
+排队任务之前恢复。
+
+可选的 admission(job) 由 set_admission() 设置，返回 False 时暂不派发新任务、也不恢复挂起
+的任务（例如系统内存紧张时）；条件改善后由设置方调用 dispatch()。suspend() 和 interrupt()
+供资源管理等外部组件挂起任务，或停止任务并在其结束后放回队列。
+"""
+import os
+import time
+import urllib.parse
+import itertools
+import threading
+from collections import deque
+
+
+class JobState:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    FINISHED = (DONE, FAILED, CANCELLED)
+
+
+# 界面显示用的状态名称
+JOB_STATE_LABELS = {
+    JobState.QUEUED: "排队中",
+    JobState.RUNNING: "翻译中",
+    JobState.DONE: "已完成",
+    JobState.FAILED: "失败",
+    JobState.CANCELLED: "已取消",
+}
+
+# 短任务优先时，不超过该页数的任务可以抢占剩余页数超过 LONG_JOB_PAGES 的任务
+QUICK_JOB_PAGES = 5
+LONG_JOB_PAGES = 20
+# 挂起失败（进程尚未启动等）的任务在该秒数内不再尝试挂起
+SUSPEND_RETRY_SECONDS = 5
+
+
+class Job:
+    """一个翻译任务，params 与 TranslationThread 使用的参数字典一致"""
+
+    def __init__(self, job_id, params, parent_id=None):
+        self.id = job_id
+        self.params = params
+        self.parent_id = parent_id
+        self.children = []  # 子任务 id
+        self.waiting = False  # 等待子任务完成，不占用槽位
+        self.preparing = False  # 正在后台准备（如下载），暂不派发
+        self.suspended = False  # 被抢占挂起，不占用槽位
+        self.estimated_pages = 0  # 调度用的页数估计，0表示未知
+        self.suspend_failed_at = 0.0
+        self.interrupted = None  # (原因, 是否放回队列)，由 interrupt() 设置，任务结束时处理
+        self.requeues = 0  # 被 interrupt() 放回队列的次数
+        self.state = JobState.QUEUED
+        self.message = ""
+        self.handle = None  # launcher 返回的运行句柄，需提供 stop()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.current_page = 0
+        self.total_pages = 0
+        self.exit_code = None  # 翻译进程的返回码，未知时为 None
+
+    @property
+    def name(self):
+        file_path = self.params.get("file_path", "")
+        name = os.path.basename(file_path.rstrip("/")) or file_path
+        if self.params.get("shard_label"):
+            name = f"{name} [{self.params['shard_label']}]"
+        return name
+
+    @property
+    def finished(self):
+        return self.state in JobState.FINISHED
+
+    @property
+    def priority(self):
+        return int(self.params.get("priority", 0) or 0)
+
+    @property
+    def owner(self):
+        """公平分配的单位：指定的 owner，否则为 URL 的主机名或文件所在文件夹"""
+        if self.params.get("owner"):
+            return self.params["owner"]
+        source = self.params.get("source_url") or self.params.get("file_path", "")
+        if source.startswith(("http://", "https://")):
+            return urllib.parse.urlsplit(source).netloc
+        return os.path.dirname(source)
+
+    def remaining_pages(self):
+        """估计的剩余页数，未知时返回 None"""
+        total = self.total_pages or self.estimated_pages
+        if not total:
+            return None
+        return max(total - self.current_page, 0)
+
+    @property
+    def is_shard(self):
+        return self.parent_id is not None
+
+    def duration(self):
+        """任务已运行的秒数，未开始时为0"""
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return end - self.started_at
+
+    def progress(self):
+        """任务进度 0.0 ~ 1.0"""
+        if self.state == JobState.DONE:
+            return 1.0
+        if self.total_pages > 0:
+            return min(self.current_page / self.total_pages, 1.0)
+        return 0.0
+
+
+class JobScheduler:
+    """
+    并发任务调度器
+
+    launcher(job) 负责真正启动任务并返回带 stop() 方法的句柄；任务结束时调用方
+    必须调用 job_finished()。listener(job) 会在任务状态或进度变化时被调用，
+    调用时不持有内部锁。
+    """
+
+    def __init__(self, launcher, max_concurrent=1, expander=None, preparer=None, estimator=None):
+        self._launcher = launcher
+        self._expander = expander
+        self._preparer = preparer
+        self._estimator = estimator
+        self._lock = threading.RLock()
+        self._jobs = {}
+        self._queue = deque()
+        self._ids = itertools.count(1)
+        self._listeners = []
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.running = False
+        self.batch_started_at = None
+        # 调度策略
+        self.shortest_first = False
+        self.fair_share = False
+        self.preemption = False
+        self.aging_seconds = 600
+        self._served = {}  # 公平分配：各来源已派发的任务数
+        self._admission = None
+
+    # ---- 监听 ----
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _notify(self, job):
+        for listener in list(self._listeners):
+            listener(job)
+
+    # ---- 队列操作 ----
+    def submit(self, params):
+        """加入一个任务，若调度器正在运行则立即尝试派发"""
+        with self._lock:
+            job = Job(next(self._ids), params)
+            job.preparing = self._preparer is not None
+            self._join_share(job.owner)
+            self._jobs[job.id] = job
+            self._queue.append(job)
+        self._notify(job)
+        if self._preparer is not None:
+            self._prepare(job)
+        if not job.preparing:
+            self._estimate(job)
+        self.dispatch()
+        return job
+
+    def _prepare(self, job):
+        try:
+            handle = self._preparer(job, lambda error=None: self.prepared(job.id, error),
+                                    lambda message: self.set_message(job.id, message))
+        except Exception as e:
+            handle = None
+            self.prepared(job.id, f"准备任务失败: {str(e)}")
+        with self._lock:
+            if handle is None:
+                job.preparing = False
+            elif job.preparing:
+                # 准备完成前取消任务时由 cancel() 停止
+                job.handle = handle
+
+    def _estimate(self, job):
+        if self._estimator is None:
+            return
+        try:
+            pages = self._estimator(job.params)
+        except Exception:
+            pages = 0
+        with self._lock:
+            job.estimated_pages = pages or 0
+
+    def prepared(self, job_id, error=None):
+        """preparer 完成准备工作，error 不为空时任务失败"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished or not job.preparing:
+                return
+            job.preparing = False
+            job.handle = None
+            if error:
+                if job in self._queue:
+                    self._queue.remove(job)
+                job.state = JobState.FAILED
+                job.message = error
+                # 启动前就准备失败的任务在启动时计入新批次
+                job.finished_at = time.time() if self.running else None
+            else:
+                job.message = ""
+        if not error:
+            self._estimate(job)
+        self._notify(job)
+        self.dispatch()
+
+    def set_message(self, job_id, message):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return
+            job.message = message
+        self._notify(job)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def children(self, job):
+        with self._lock:
+            return [self._jobs[child_id] for child_id in job.children if child_id in self._jobs]
+
+    def batch_jobs(self, include_shards=False):
+        """当前批次的任务：未结束的任务以及本批次开始后结束的任务"""
+        with self._lock:
+            started_at = self.batch_started_at or 0
+            return [job for job in self._jobs.values()
+                    if (include_shards or not job.is_shard)
+                    and (not job.finished or (job.finished_at or 0) >= started_at)]
+
+    def queued_jobs(self):
+        with self._lock:
+            return list(self._queue)
+
+    def running_jobs(self):
+        with self._lock:
+            return [job for job in self._jobs.values() if job.state == JobState.RUNNING]
+
+    def is_idle(self):
+        with self._lock:
+            return not self._queue and not any(
+                job.state == JobState.RUNNING for job in self._jobs.values())
+
+    def set_max_concurrent(self, value):
+        with self._lock:
+            self.max_concurrent = max(1, int(value))
+        self.dispatch()
+
+    def remove(self, job_id):
+        """从列表中移除一个已结束的任务及其子任务"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.finished:
+                return
+            for child_id in job.children:
+                self._jobs.pop(child_id, None)
+            del self._jobs[job_id]
+
+    def clear_finished(self):
+        """从列表中移除已结束的任务，分片随其父任务一起移除"""
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and not j.is_shard]:
+                self.remove(job_id)
+
+    # ---- 调度 ----
+    def start(self):
+        with self._lock:
+            if not self.running:
+                self.running = True
+                self.batch_started_at = time.time()
+                for job in self._jobs.values():
+                    if job.finished and job.finished_at is None:
+                        job.finished_at = self.batch_started_at
+        self.dispatch()
+
+    def stop(self):
+        """停止派发新任务，已运行的任务不受影响"""
+        with self._lock:
+            self.running = False
+
+    def set_policy(self, shortest_first=None, fair_share=None, preemption=None):
+        """修改调度策略，参数为 None 时保持不变"""
+        with self._lock:
+            if shortest_first is not None:
+                self.shortest_first = bool(shortest_first)
+            if fair_share is not None:
+                self.fair_share = bool(fair_share)
+            if preemption is not None:
+                self.preemption = bool(preemption)
+        self.dispatch()
+
+    def set_admission(self, admission):
+        """设置派发新任务前的检查 admission(job)，为 None 时不检查"""
+        with self._lock:
+            self._admission = admission
+        self.dispatch()
+
+    def set_priority(self, job_id, priority):
+        """修改未结束任务的优先级，分片子任务一并修改"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return
+            for item in [job] + [self._jobs[child_id] for child_id in job.children if child_id in self._jobs]:
+                item.params["priority"] = int(priority)
+        self._notify(job)
+        self.dispatch()
+
+    def _occupies_slot(self, job):
+        return job.state == JobState.RUNNING and not job.waiting and not job.suspended
+
+    def _can_start(self, job):
+        """准备中的任务不能派发，分片任务受父任务的分片并行数限制"""
+        if job.preparing:
+            return False
+        if not job.is_shard:
+            return True
+        parent = self._jobs.get(job.parent_id)
+        limit = parent.params.get("shard_parallel", 0) if parent else 0
+        if not limit:
+            return True
+        running = sum(1 for child_id in parent.children
+                      if self._occupies_slot(self._jobs[child_id]))
+        return running < limit
+
+    def _join_share(self, owner):
+        """新出现的来源从当前各来源的最少派发数开始计数，不会因为来得晚而长期独占"""
+        active = {job.owner for job in self._jobs.values() if not job.finished}
+        if owner in active:
+            return
+        floor = min((self._served.get(other, 0) for other in active), default=0)
+        self._served[owner] = max(self._served.get(owner, 0), floor)
+
+    def _running_by_owner(self):
+        owners = {}
+        for job in self._jobs.values():
+            if self._occupies_slot(job):
+                owners[job.owner] = owners.get(job.owner, 0) + 1
+        return owners
+
+    def _rank(self, job, owners, now, position):
+        """派发顺序，越小越先"""
+        parent = self._jobs.get(job.parent_id) if job.is_shard else None
+        created_at = parent.created_at if parent is not None else job.created_at
+        aging = int((now - created_at) / self.aging_seconds) if self.aging_seconds else 0
+        share = (owners.get(job.owner, 0), self._served.get(job.owner, 0)) if self.fair_share else 0
+        size = 0
+        if self.shortest_first:
+            remaining = job.remaining_pages()
+            size = remaining if remaining is not None else float("inf")
+        return (0 if job.children else 1, -(job.priority + aging), share, size, position)
+
+    def _best_job(self, owners):
+        """下一个应派发或恢复的任务，挂起的任务排在同等条件的排队任务之前"""
+        now = time.time()
+        candidates = [(self._rank(job, owners, now, -1), job) for job in self._jobs.values()
+                      if job.suspended and self._can_start(job)]
+        candidates += [(self._rank(job, owners, now, position), job)
+                       for position, job in enumerate(self._queue) if self._can_start(job)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda item: item[0])[1]
+
+    def _next_job(self, owners):
+        job = self._best_job(owners)
+        if job is None:
+            return None
+        # 合并阶段的父任务不启动翻译进程，不受限制
+        if self._admission is not None and not job.children and not self._admission(job):
+            return None
+        if not job.suspended:
+            self._queue.remove(job)
+        return job
+
+    def dispatch(self):
+        """在有空闲槽位时启动排队中的任务"""
+        to_launch = []
+        expanded = []
+        resumed = []
+        with self._lock:
+            if not self.running:
+                return
+            running = sum(1 for j in self._jobs.values() if self._occupies_slot(j))
+            owners = self._running_by_owner()
+            while running < self.max_concurrent:
+                job = self._next_job(owners)
+                if job is None:
+                    break
+                if job.suspended:
+                    job.suspended = False
+                    job.message = ""
+                    resumed.append((job, job.handle))
+                    owners[job.owner] = owners.get(job.owner, 0) + 1
+                    running += 1
+                    continue
+                if job.started_at is None:
+                    job.started_at = time.time()
+                job.state = JobState.RUNNING
+                if not job.children and not job.is_shard and self._expand(job):
+                    expanded.append(job)
+                    continue
+                job.waiting = False
+                to_launch.append(job)
+                owners[job.owner] = owners.get(job.owner, 0) + 1
+                if not job.children:
+                    self._served[job.owner] = self._served.get(job.owner, 0) + 1
+                running += 1
+
+        for job, handle in resumed:
+            if handle is not None:
+                handle.resume()
+            self._notify(job)
+        for job in expanded:
+            self._notify(job)
+            for child in self.children(job):
+                self._notify(child)
+        for job in to_launch:
+            self._notify(job)
+            try:
+                handle = self._launcher(job)
+            except Exception as e:
+                self.job_finished(job.id, False, f"启动任务失败: {str(e)}")
+                continue
+            with self._lock:
+                if job.state == JobState.RUNNING:
+                    job.handle = handle
+                    handle = None
+            if handle is not None:
+                # 启动期间任务已被取消
+                handle.stop()
+
+        if self._preempt():
+            self.dispatch()
+
+    def _outranks(self, rival, job):
+        """rival 是否可以抢占正在运行的 job"""
+        if job.is_shard and job.parent_id == rival.parent_id:
+            return False
+        if rival.priority != job.priority:
+            return rival.priority > job.priority
+        if not self.shortest_first:
+            return False
+        size, remaining = rival.remaining_pages(), job.remaining_pages()
+        return size is not None and size <= QUICK_JOB_PAGES and remaining is not None and remaining > LONG_JOB_PAGES
+
+    def _preempt(self):
+        """槽位已满且有更重要的任务在排队时挂起一个正在运行的任务，返回是否挂起了任务"""
+        with self._lock:
+            if not self.running or not self.preemption:
+                return False
+            owners = self._running_by_owner()
+            if sum(owners.values()) < self.max_concurrent:
+                return False
+            rival = self._best_job(owners)
+            if rival is None or rival.suspended or rival.children:
+                return False
+            now = time.time()
+            victims = [job for job in self._jobs.values()
+                       if self._occupies_slot(job) and not job.children
+                       and hasattr(job.handle, "suspend")
+                       and now - job.suspend_failed_at > SUSPEND_RETRY_SECONDS
+                       and self._outranks(rival, job)]
+            if not victims:
+                return False
+            # 挂起优先级最低、剩余页数最多的任务
+            victim = max(victims, key=lambda job: (-job.priority, job.remaining_pages() or 0))
+        return self.suspend(victim.id, f"已挂起，让位于 #{rival.id} {rival.name}")
+
+    def suspend(self, job_id, message):
+        """挂起正在运行的任务，让出槽位，返回是否成功；之后由 dispatch() 按顺序恢复"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not self._occupies_slot(job) or job.children or not hasattr(job.handle, "suspend"):
+                return False
+            handle = job.handle
+        try:
+            suspended = handle.suspend()
+        except Exception:
+            suspended = False
+        with self._lock:
+            valid = job.state == JobState.RUNNING and job.handle is handle
+            if suspended and valid:
+                job.suspended = True
+                job.message = message
+            else:
+                job.suspend_failed_at = time.time()
+        if suspended and not valid:
+            # 挂起期间任务已结束或被取消
+            handle.resume()
+            return False
+        if suspended:
+            self._notify(job)
+        return suspended
+
+    def interrupt(self, job_id, message, requeue=True):
+        """
+        停止正在运行的任务，返回是否成功
+
+        任务的运行方回报结束后，requeue 为 True 时任务以排队状态放回队首，否则标记为失败，
+        message 为原因。任务在停止前已经成功完成时照常完成。
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != JobState.RUNNING or job.children or job.interrupted:
+                return False
+            job.interrupted = (message, requeue)
+            job.message = message
+            handle = job.handle
+        self._notify(job)
+        if handle is not None:
+            handle.stop()
+        return True
+
+    def _expand(self, job):
+        """尝试把任务拆分为子任务，子任务排在队首，返回是否拆分"""
+        if self._expander is None:
+            return False
+        try:
+            children_params = self._expander(job)
+        except Exception as e:
+            job.message = f"无法拆分任务，按整篇翻译: {str(e)}"
+            return False
+        if not children_params:
+            return False
+        children = [Job(next(self._ids), params, parent_id=job.id) for params in children_params]
+        for child in children:
+            self._jobs[child.id] = child
+            if self._estimator is not None:
+                try:
+                    child.estimated_pages = self._estimator(child.params) or 0
+                except Exception:
+                    pass
+        for child in reversed(children):
+            self._queue.appendleft(child)
+        job.children = [child.id for child in children]
+        job.waiting = True
+        return True
+
+    def job_finished(self, job_id, success, message="", exit_code=None):
+        """由任务运行方回报结束状态，exit_code 为翻译进程的返回码（可选）"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                # 已被取消的任务忽略其后续回报
+                return
+            interrupted, job.interrupted = job.interrupted, None
+            if interrupted is not None and not success and interrupted[1]:
+                self._requeue(job, interrupted[0])
+                parent = None
+            else:
+                if interrupted is not None and not success:
+                    message = interrupted[0]
+                job.state = JobState.DONE if success else JobState.FAILED
+                job.message = message
+                job.exit_code = exit_code
+                job.finished_at = time.time()
+                job.handle = None
+                job.suspended = False
+                parent = self._child_finished(job)
+        self._notify(job)
+        if parent is not None:
+            self._notify(parent)
+        self.dispatch()
+
+    def _requeue(self, job, message):
+        job.state = JobState.QUEUED
+        job.message = message
+        job.handle = None
+        job.suspended = False
+        job.current_page = 0
+        job.requeues += 1
+        self._queue.appendleft(job)
+
+    def _child_finished(self, job):
+        """子任务结束后检查父任务，全部成功时把父任务放回队首等待合并"""
+        if not job.is_shard:
+            return None
+        parent = self._jobs.get(job.parent_id)
+        if parent is None or parent.finished:
+            return None
+        children = [self._jobs[child_id] for child_id in parent.children]
+        self._aggregate_progress(parent, children)
+        if not all(child.finished for child in children):
+            return parent
+        if all(child.state == JobState.DONE for child in children):
+            parent.state = JobState.QUEUED
+            self._queue.appendleft(parent)
+            return parent
+        failed = [child for child in children if child.state != JobState.DONE]
+        cancelled = all(child.state == JobState.CANCELLED for child in failed)
+        parent.state = JobState.CANCELLED if cancelled else JobState.FAILED
+        parent.message = "\n".join(f"{child.name}: {child.message}" for child in failed)
+        parent.finished_at = time.time()
+        parent.waiting = False
+        return parent
+
+    @staticmethod
+    def _aggregate_progress(parent, children):
+        parent.current_page = sum(child.total_pages if child.state == JobState.DONE
+                                  else child.current_page for child in children)
+        parent.total_pages = sum(child.total_pages for child in children)
+
+    def update_progress(self, job_id, current, total):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return
+            job.current_page = current
+            job.total_pages = total
+            parent = self._jobs.get(job.parent_id) if job.is_shard else None
+            if parent is not None:
+                self._aggregate_progress(parent, [self._jobs[i] for i in parent.children])
+        self._notify(job)
+        if parent is not None:
+            self._notify(parent)
+
+    def cancel(self, job_id):
+        """取消排队中或正在运行的任务，父任务会一并取消其子任务"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return
+            if job in self._queue:
+                self._queue.remove(job)
+            handle = job.handle
+            job.state = JobState.CANCELLED
+            job.message = "已取消"
+            job.finished_at = time.time()
+            job.handle = None
+            job.waiting = False
+            job.suspended = False
+            children = list(job.children)
+            parent = self._child_finished(job)
+        if handle is not None:
+            handle.stop()
+        for child_id in children:
+            self.cancel(child_id)
+        self._notify(job)
+        if parent is not None:
+            self._notify(parent)
+        self.dispatch()
+
+    def cancel_all(self):
+        """取消全部未结束的任务并停止调度"""
+        self.stop()
+        for job in self.jobs():
+            self.cancel(job.id)
+
+    # ---- 统计 ----
+    def stats(self):
+        """汇总当前批次的任务数量与吞吐量，分片子任务计入其父任务"""
+        jobs = self.batch_jobs()
+        started_at = self.batch_started_at
+
+        counts = {state: 0 for state in JOB_STATE_LABELS}
+        for job in jobs:
+            counts[job.state] += 1
+
+        done_jobs = [job for job in jobs if job.state == JobState.DONE]
+        pages_done = sum(job.total_pages for job in done_jobs)
+        pages_done += sum(job.current_page for job in jobs if job.state == JobState.RUNNING)
+
+        elapsed = time.time() - started_at if started_at else 0.0
+        minutes = elapsed / 60 if elapsed > 0 else 0.0
+        return {
+            "total": len(jobs),
+            "counts": counts,
+            "elapsed": elapsed,
+            "pages_done": pages_done,
+            "jobs_per_minute": len(done_jobs) / minutes if minutes else 0.0,
+            "pages_per_minute": pages_done / minutes if minutes else 0.0,
+        }
@@ -0,0 +1,313 @@
+"""
+按页码分片翻译
+
+pdf2zh 的 -t 只并行化翻译请求，解析、版面检测和渲染仍是单进程的。分片模式把一篇
+长文档按页码范围拆成若干子任务（仍使用 -p 语法），交给调度器并发执行，最后把各分片
+的单语版和双语版无损合并为 {base_name}-mono.pdf / {base_name}-dual.pdf。
+
+增量模式（见 page_diff）下只为与上一版本相比有变化的页生成子任务，合并时未变化的页
+取自上一版本的翻译结果。多目标语言任务（见 fanout）则展开为每种语言一个子任务。
+"""
+import os
+import shutil
+import hashlib
+
+from core import is_url, output_paths, parse_pages
+from checkpoint import CheckpointJournal, CHECKPOINT_SHARD_SIZE
+from result_cache import file_digest
+from fanout import expand_languages, target_languages, FanoutRunner
+
+SHARD_DIR_NAME = ".shards"
+
+
+def open_pdf(path=None):
+    """打开 PDF（pdf2zh 依赖 PyMuPDF，新版本模块名为 pymupdf，旧版本为 fitz）"""
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+    return pymupdf.open(path) if path else pymupdf.open()
+
+
+def page_count(file_path):
+    with open_pdf(file_path) as doc:
+        return doc.page_count
+
+
+def estimate_pages(params):
+    """调度器的 estimator：预检结果、页码范围或文件页数，无法估计时返回0"""
+    estimate = params.get("estimate") or {}
+    if estimate.get("pages"):
+        return estimate["pages"]
+    pages = parse_pages(params.get("pages", ""))
+    if pages:
+        return len(pages)
+    if is_url(params["file_path"]):
+        return 0
+    try:
+        return page_count(params["file_path"])
+    except Exception:
+        return 0
+
+
+def format_pages(pages):
+    """把从1开始的页码列表压缩为 "1-3,5" 形式"""
+    ranges = []
+    for page in sorted(set(pages)):
+        if ranges and page == ranges[-1][1] + 1:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def split_pages(pages_spec, total_pages, shard_size):
+    """按分片大小切分需要翻译的页码，返回每个分片从1开始的页码列表"""
+    selected = parse_pages(pages_spec)
+    if selected is None:
+        pages = list(range(1, total_pages + 1))
+    else:
+        pages = sorted({page + 1 for page in selected if 0 <= page < total_pages})
+    return [pages[i:i + shard_size] for i in range(0, len(pages), shard_size)]
+
+
+def shard_dir(params):
+    """分片结果的临时目录，与输入文件和翻译设置一一对应"""
+    base_name = os.path.splitext(os.path.basename(output_paths(params)[0]))[0][:-len("-mono")]
+    digest = hashlib.sha1(repr(sorted(
+        (key, value) for key, value in params.items()
+        if key not in ("api_key", "api_url", "output_dir", "threads", "shard_parallel", "checkpoint",
+                       "translation_memory", "translation_memory_entries", "preflight",
+                       "preflight_summary", "max_threads", "fallbacks", "hedge", "priority", "owner",
+                       "memory_limit_mb", "nice", "cpu_affinity", "output_variant", "optimize_output",
+                       "optimize_linearize")
+    )).encode("utf-8")).hexdigest()[:10]
+    return os.path.join(params["output_dir"], SHARD_DIR_NAME, f"{base_name}-{digest}")
+
+
+class ShardPlanner:
+    """
+    调度器的 expander：为足够长的本地文档生成分片子任务
+
+    传入 preflight 时先做预检，按结果调整设置并去掉不需要翻译的页，再决定如何分片。
+    传入 versions（page_diff.VersionIndex）时，启用增量模式的任务只翻译与上一版本相比
+    有变化的页，没有需要翻译的页时不生成子任务，由 ShardMergeRunner 直接拼接结果。
+    多目标语言任务在预检后按语言展开，不再分片。
+    """
+
+    def __init__(self, preflight=None, versions=None):
+        self.preflight = preflight
+        self.versions = versions
+
+    def expand(self, job):
+        params = job.params
+        if self.preflight is not None:
+            summary = self.preflight.apply(params)
+            if summary:
+                job.message = f"预检: {summary}"
+        languages = expand_languages(params)
+        if languages:
+            return languages
+        shard_size = params.get("shard_size", 0)
+        if not shard_size and params.get("checkpoint"):
+            # 断点续译需要分片作为恢复单位，未设置分片时按顺序逐个执行
+            shard_size = CHECKPOINT_SHARD_SIZE
+            params["shard_parallel"] = 1
+        if is_url(params["file_path"]):
+            return None
+        reuse = self.plan_reuse(job)
+        if reuse is not None:
+            total_pages = reuse["total_pages"]
+            selected = parse_pages(params.get("pages", ""))
+            changed = [index + 1 for index, source in enumerate(reuse["sources"])
+                       if source is None and (selected is None or index in selected)]
+            size = shard_size or len(changed) or 1
+            shards = [changed[i:i + size] for i in range(0, len(changed), size)]
+            job.message = (f"增量翻译: 与 {reuse['previous']} 相比 {len(changed)} 页需要翻译，"
+                           f"复用 {total_pages - reuse['sources'].count(None)} 页")
+        else:
+            if not shard_size:
+                return None
+            total_pages = page_count(params["file_path"])
+            shards = split_pages(params.get("pages", ""), total_pages, shard_size)
+            if len(shards) < 2:
+                return None
+
+        job.total_pages = sum(len(pages) for pages in shards)
+        root = shard_dir(params)
+        specs = [format_pages(pages) for pages in shards]
+
+        completed = set()
+        if params.get("checkpoint"):
+            completed = CheckpointJournal(root).begin(file_digest(params["file_path"]), specs)
+            if completed:
+                job.message = f"从检查点恢复，{len(completed)}/{len(specs)} 个分片已完成"
+
+        children = []
+        for index, spec in enumerate(specs):
+            child = dict(
+                params,
+                pages=spec,
+                output_dir=os.path.join(root, f"{index:04d}"),
+                shard_size=0,
+                shard_index=index,
+                shard_label=spec,
+                total_pages=total_pages,
+            )
+            # 复用计划只用于父任务的合并
+            child.pop("reuse", None)
+            if params.get("checkpoint"):
+                child["checkpoint_journal"] = root
+                child["checkpoint_done"] = index in completed
+            children.append(child)
+        return children
+
+    def plan_reuse(self, job):
+        """增量模式下找到可复用的上一版本时，把复用计划写入 params["reuse"] 并返回"""
+        params = job.params
+        params.pop("reuse", None)
+        if not params.get("incremental") or self.versions is None:
+            return None
+        try:
+            reuse = self.versions.plan(params)
+        except Exception as e:
+            job.message = f"无法比较文档版本，翻译全部页: {str(e)}"
+            return None
+        if reuse is not None:
+            params["reuse"] = reuse
+        return reuse
+
+    __call__ = expand
+
+
+def _shard_page_index(doc_page, shard_pages, shard_doc_pages, total_pages, pages_per_page):
+    """分片输出中对应原文第 doc_page 页（从0开始）的起始页"""
+    # pdf2zh 输出整篇文档时按原页码取；只输出所选页时按分片内的位置取
+    if shard_doc_pages == total_pages * pages_per_page:
+        return doc_page * pages_per_page
+    return shard_pages.index(doc_page) * pages_per_page
+
+
+def merge_pdfs(shards, total_pages, output_path, pages_per_page, reused=None, source_path=None):
+    """
+    按原文页序把各分片输出拼接为一个文件
+
+    shards 为 [(从0开始的页码列表, 分片输出路径), ...]；未被任何分片翻译的页取第一个分片中的原样页。
+    reused 为 (上一版本的输出路径, 每页对应的旧页或 None)，对应到旧页的页直接取自上一版本；
+    传入 source_path 时，分片中没有原样页的未翻译页取自原文。
+    """
+    output = open_pdf()
+    docs = [open_pdf(path) for _, path in shards]
+    previous = open_pdf(reused[0]) if reused else None
+    source = open_pdf(source_path) if source_path else None
+    try:
+        owner = {}
+        for index, (pages, _) in enumerate(shards):
+            for page in pages:
+                owner[page] = index
+        for doc_page in range(total_pages):
+            if previous is not None and reused[1][doc_page] is not None:
+                start = reused[1][doc_page] * pages_per_page
+                output.insert_pdf(previous, from_page=start, to_page=start + pages_per_page - 1)
+                continue
+            index = owner.get(doc_page)
+            if index is None:
+                # 未选择翻译的页，整篇输出时每个分片中都有原样页
+                if not docs or docs[0].page_count != total_pages * pages_per_page:
+                    if source is not None:
+                        # 双语版中原文页和“译文”页都是原样页
+                        for _ in range(pages_per_page):
+                            output.insert_pdf(source, from_page=doc_page, to_page=doc_page)
+                    continue
+                index = 0
+            doc = docs[index]
+            start = _shard_page_index(doc_page, shards[index][0], doc.page_count, total_pages, pages_per_page)
+            output.insert_pdf(doc, from_page=start, to_page=start + pages_per_page - 1)
+        # garbage=4 合并各分片重复嵌入的字体等对象
+        tmp_path = output_path + ".tmp"
+        output.save(tmp_path, garbage=4, deflate=True)
+    finally:
+        output.close()
+        for doc in docs + [previous, source]:
+            if doc is not None:
+                doc.close()
+    os.replace(tmp_path, output_path)
+
+
+def merge_runner(params, child_params, result_cache=None, on_log=None, telemetry=None, postprocessor=None):
+    """子任务全部完成后（或增量翻译没有需要翻译的页时）父任务执行的任务"""
+    if target_languages(params):
+        return FanoutRunner(params, child_params, on_log=on_log, telemetry=telemetry, postprocessor=postprocessor)
+    return ShardMergeRunner(params, child_params, result_cache, on_log=on_log, telemetry=telemetry,
+                            postprocessor=postprocessor)
+
+
+class ShardMergeRunner:
+    """合并分片结果的任务，接口与 TranslationRunner 相同"""
+
+    def __init__(self, params, shard_params, result_cache=None, on_log=None, telemetry=None, postprocessor=None):
+        self.params = params
+        self.shard_params = sorted(shard_params, key=lambda p: p["shard_index"])
+        self.result_cache = result_cache
+        self.telemetry = telemetry
+        self.postprocessor = postprocessor
+        self.on_log = on_log or (lambda message: None)
+
+    def run(self):
+        if self.telemetry is not None:
+            self.telemetry.set_mode("merge")
+        success, message = self.merge()
+        if success and self.postprocessor is not None:
+            self.postprocessor.process(self.params, self.on_log, self.telemetry)
+        if self.telemetry is not None:
+            self.telemetry.extra["shards"] = len(self.shard_params)
+            self.telemetry.finish(success, message)
+        return success, message
+
+    def merge(self):
+        try:
+            reuse = self.params.get("reuse")
+            total_pages = reuse["total_pages"] if reuse else self.shard_params[0]["total_pages"]
+            mono_path, dual_path = output_paths(self.params)
+            os.makedirs(self.params["output_dir"], exist_ok=True)
+
+            mono_shards, dual_shards = [], []
+            for shard in self.shard_params:
+                pages = parse_pages(shard["pages"])
+                shard_mono, shard_dual = output_paths(shard)
+                mono_shards.append((pages, shard_mono))
+                dual_shards.append((pages, shard_dual))
+
+            if reuse:
+                reused = total_pages - reuse["sources"].count(None)
+                self.on_log(f"拼接 {len(self.shard_params)} 个分片的翻译结果和 {reuse['previous']} 中未变化的 "
+                            f"{reused} 页")
+                source_path = self.params["file_path"]
+                merge_pdfs(mono_shards, total_pages, mono_path, 1, (reuse["mono"], reuse["sources"]), source_path)
+                pages_per_page = reuse["pages_per_page"]
+                merge_pdfs(dual_shards, total_pages, dual_path, pages_per_page,
+                           (reuse["dual"], reuse["sources"]), source_path)
+            else:
+                self.on_log(f"合并 {len(self.shard_params)} 个分片的翻译结果")
+                merge_pdfs(mono_shards, total_pages, mono_path, 1)
+                # 双语版每个原文页对应原文页和译文页两页
+                with open_pdf(mono_shards[0][1]) as mono, open_pdf(dual_shards[0][1]) as dual:
+                    pages_per_page = max(dual.page_count // max(mono.page_count, 1), 1)
+                merge_pdfs(dual_shards, total_pages, dual_path, pages_per_page)
+
+            if self.result_cache is not None:
+                cache_key = self.result_cache.make_key(self.params)
+                if cache_key:
+                    self.result_cache.store(cache_key, mono_path, dual_path)
+            root = shard_dir(self.params)
+            shutil.rmtree(root, ignore_errors=True)
+            try:
+                os.rmdir(os.path.dirname(root))
+            except OSError:
+                pass
+            return True, "翻译完成 (增量)" if reuse else "翻译完成 (分片合并)"
+        except Exception as e:
+            return False, f"合并分片失败: {str(e)}"
+
+    def stop(self):
+        pass
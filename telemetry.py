@@ -0,0 +1,350 @@
+"""
+翻译任务的结构化统计
+
+每个任务记录各阶段耗时（等待服务并发额度、启动、逐页解析/版面检测/翻译、
+渲染/字体子集化/保存，分片任务的父任务记录合并耗时）、页数与批次吞吐量、预计剩余
+时间，以及 pdf2zh 进程的峰值内存和 CPU 占用。任务结束时以 JSON 行的形式追加到统计
+文件，同时在内存中汇总，供界面实时显示。
+"""
+import os
+import json
+import time
+import threading
+from collections import deque
+
+DEFAULT_TELEMETRY_FILE = os.path.join(os.path.expanduser("~"), ".cache", "pdf-translator", "telemetry.jsonl")
+
+PHASE_LABELS = {
+    "wait": "等待额度",
+    "startup": "启动",
+    "pages": "解析/翻译",
+    "finalize": "渲染/保存",
+    "merge": "合并",
+    "postprocess": "输出优化",
+    "suspended": "挂起",
+}
+
+try:
+    _CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+except (AttributeError, ValueError, OSError):
+    _CLOCK_TICKS = 100
+
+
+def child_pids(pid):
+    pids = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children", "r") as f:
+                pids.extend(int(child) for child in f.read().split())
+    except (OSError, ValueError):
+        pass
+    return pids
+
+
+def read_process(pid):
+    """返回 (常驻内存MB, 累计CPU秒数)，进程不存在或系统不支持 /proc 时返回 None"""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            # 进程名可能包含空格，从最后一个右括号之后开始分割
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status", "r") as f:
+            rss_kb = next((int(line.split()[1]) for line in f if line.startswith("VmRSS:")), 0)
+    except (OSError, ValueError, IndexError):
+        return None
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    return rss_kb / 1024, cpu_seconds
+
+
+class ProcessSampler:
+    """
+    定时采样一个进程及其子进程的内存与 CPU 时间
+
+    existing 为 True 时（常驻工作进程）只统计采样开始后的 CPU 时间增量。
+    """
+
+    def __init__(self, pid, existing=False, interval=0.25):
+        self.pid = pid
+        self.existing = existing
+        self.interval = interval
+        self.peak_rss_mb = 0.0
+        self.cpu_seconds = 0.0
+        self._cpu_start = {}
+        self._cpu_used = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self.sample()
+            if self._stop.wait(self.interval):
+                break
+
+    def sample(self):
+        rss_total = 0.0
+        for pid in [self.pid] + child_pids(self.pid):
+            usage = read_process(pid)
+            if usage is None:
+                continue
+            rss_mb, cpu_seconds = usage
+            rss_total += rss_mb
+            baseline = cpu_seconds if self.existing and pid == self.pid else 0.0
+            start = self._cpu_start.setdefault(pid, baseline)
+            self._cpu_used[pid] = cpu_seconds - start
+        self.cpu_seconds = sum(self._cpu_used.values())
+        self.peak_rss_mb = max(self.peak_rss_mb, rss_total)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+
+
+class JobTelemetry:
+    """单个任务的统计，由执行线程更新，界面线程读取快照"""
+
+    def __init__(self, owner, job_id, params):
+        self._owner = owner
+        self._lock = threading.Lock()
+        self.job_id = job_id
+        self.file_path = params.get("file_path", "")
+        self.pages_spec = params.get("pages", "")
+        self.service = params.get("service", "")
+        self.model = params.get("model", "")
+        self.threads = params.get("threads", 0)
+        self.mode = "subprocess"
+        self.started_at = time.time()
+        self.phase = "startup"
+        self.phase_started_at = self.started_at
+        self.phases = {}
+        self.pages_started_at = None
+        self.current_page = 0
+        self.total_pages = 0
+        self.batches_done = 0
+        self.batches_total = 0
+        self.sampler = None
+        self.extra = {}
+        self._resume_phase = None
+
+    def _enter(self, phase, now=None):
+        now = now or time.time()
+        elapsed = now - self.phase_started_at
+        if elapsed > 0 or self.phase in self.phases:
+            self.phases[self.phase] = self.phases.get(self.phase, 0.0) + elapsed
+        self.phase = phase
+        self.phase_started_at = now
+
+    def enter(self, phase):
+        with self._lock:
+            self._enter(phase)
+
+    def suspend(self):
+        """任务被抢占挂起，挂起时间单独统计，不计入页速率"""
+        with self._lock:
+            if self.phase != "suspended":
+                self._resume_phase = self.phase
+                self._enter("suspended")
+
+    def resume(self):
+        with self._lock:
+            if self.phase != "suspended":
+                return
+            now = time.time()
+            if self.pages_started_at:
+                self.pages_started_at += now - self.phase_started_at
+            self._enter(self._resume_phase, now)
+
+    def set_mode(self, mode):
+        with self._lock:
+            self.mode = mode
+            if mode == "merge":
+                self._enter("merge")
+
+    def set_threads(self, threads):
+        self.threads = threads
+
+    def attach_process(self, pid, existing=False):
+        """开始采样执行翻译的进程"""
+        if self.sampler is None:
+            self.sampler = ProcessSampler(pid, existing)
+
+    def progress(self, current, total):
+        with self._lock:
+            now = time.time()
+            if self.phase == "startup":
+                self._enter("pages", now)
+                self.pages_started_at = now
+            self.current_page = current
+            self.total_pages = total
+            if total and current >= total and self.phase == "pages":
+                self._enter("finalize", now)
+
+    def batch(self, current, total):
+        with self._lock:
+            self.batches_done = current
+            self.batches_total = total
+
+    def pages_per_second(self):
+        if not self.pages_started_at or not self.current_page:
+            return 0.0
+        end = self.phase_started_at if self.phase == "finalize" else time.time()
+        elapsed = end - self.pages_started_at
+        return self.current_page / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        """预计剩余秒数，尚无法估计时返回 None"""
+        with self._lock:
+            if self.phase == "finalize":
+                return 0.0
+            rate = self.pages_per_second()
+            if not rate or not self.total_pages:
+                return None
+            return (self.total_pages - self.current_page) / rate
+
+    def finish(self, success, message=""):
+        """结束统计并交给所属的 TelemetryLog 记录，返回记录字典"""
+        with self._lock:
+            now = time.time()
+            self._enter(self.phase, now)
+        if self.sampler is not None:
+            self.sampler.sample()
+            self.sampler.stop()
+        duration = now - self.started_at
+        pages_time = self.phases.get("pages", 0.0)
+        record = {
+            "job_id": self.job_id,
+            "file": self.file_path,
+            "pages_spec": self.pages_spec,
+            "service": self.service,
+            "model": self.model,
+            "threads": self.threads,
+            "mode": self.mode,
+            "success": success,
+            "message": message.splitlines()[0] if message else "",
+            "started_at": self.started_at,
+            "finished_at": now,
+            "duration": round(duration, 3),
+            "phases": {phase: round(seconds, 3) for phase, seconds in self.phases.items()},
+            "pages": self.total_pages,
+            "pages_per_sec": round(self.total_pages / pages_time, 4) if pages_time > 0 else 0.0,
+            "batches": self.batches_total,
+            "batches_per_sec": round(self.batches_done / pages_time, 4) if pages_time > 0 else 0.0,
+            "peak_rss_mb": round(self.sampler.peak_rss_mb, 1) if self.sampler else None,
+            "cpu_seconds": round(self.sampler.cpu_seconds, 2) if self.sampler else None,
+            "cpu_percent": (round(self.sampler.cpu_seconds / duration * 100, 1)
+                            if self.sampler and duration > 0 else None),
+        }
+        record.update(self.extra)
+        self._owner._record(self, record)
+        return record
+
+
+class TelemetryLog:
+    """
+    收集所有任务的统计
+
+    start() 为任务创建 JobTelemetry；任务结束后的记录追加到 path 指向的 JSON 行文件
+    （path 为空时不写文件），rollup() 汇总本次运行的记录和运行中的任务。
+    """
+
+    def __init__(self, path=DEFAULT_TELEMETRY_FILE, keep_records=1000):
+        self.path = path
+        self._lock = threading.Lock()
+        self._active = {}
+        self.records = deque(maxlen=keep_records)
+
+    def start(self, job_id, params):
+        telemetry = JobTelemetry(self, job_id, params)
+        with self._lock:
+            self._active[job_id] = telemetry
+        return telemetry
+
+    def active(self, job_id):
+        with self._lock:
+            return self._active.get(job_id)
+
+    def _record(self, telemetry, record):
+        with self._lock:
+            if self._active.get(telemetry.job_id) is telemetry:
+                del self._active[telemetry.job_id]
+            self.records.append(record)
+            if not self.path:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError:
+                pass
+
+    def rollup(self):
+        """
+        按服务汇总已完成任务的页数吞吐量、各阶段耗时占比与资源峰值
+
+        缓存命中和检查点恢复的任务不计入吞吐量。
+        """
+        with self._lock:
+            records = [r for r in self.records if r["success"] and r["mode"] in ("subprocess", "pool")]
+            active = list(self._active.values())
+
+        services = {}
+        for record in records:
+            entry = services.setdefault(record["service"], {
+                "jobs": 0, "pages": 0, "pages_seconds": 0.0, "phases": {},
+                "peak_rss_mb": 0.0, "cpu_seconds": 0.0, "duration": 0.0,
+            })
+            entry["jobs"] += 1
+            entry["pages"] += record["pages"]
+            entry["pages_seconds"] += record["phases"].get("pages", 0.0)
+            entry["duration"] += record["duration"]
+            entry["cpu_seconds"] += record["cpu_seconds"] or 0.0
+            entry["peak_rss_mb"] = max(entry["peak_rss_mb"], record["peak_rss_mb"] or 0.0)
+            for phase, seconds in record["phases"].items():
+                entry["phases"][phase] = entry["phases"].get(phase, 0.0) + seconds
+
+        for entry in services.values():
+            entry["pages_per_minute"] = (entry["pages"] / entry["pages_seconds"] * 60
+                                         if entry["pages_seconds"] else 0.0)
+            total = sum(entry["phases"].values())
+            entry["phase_share"] = {phase: seconds / total for phase, seconds in entry["phases"].items()} \
+                if total else {}
+
+        etas = [eta for eta in (telemetry.eta() for telemetry in active) if eta is not None]
+        return {
+            "services": services,
+            "running": len(active),
+            "eta": max(etas) if etas else None,
+            "peak_rss_mb": max((t.sampler.peak_rss_mb for t in active if t.sampler), default=0.0),
+        }
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return ""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def format_rollup(rollup, service_name=lambda service: service):
+    """把 rollup() 的结果格式化为一行摘要"""
+    parts = []
+    for service, entry in rollup["services"].items():
+        phases = " ".join(f"{PHASE_LABELS.get(phase, phase)} {share * 100:.0f}%"
+                          for phase, share in entry["phase_share"].items())
+        text = f"{service_name(service)}: {entry['pages_per_minute']:.1f} 页/分钟"
+        if phases:
+            text += f" ({phases})"
+        if entry["peak_rss_mb"]:
+            text += f"，峰值内存 {entry['peak_rss_mb']:.0f} MB"
+        if entry["duration"]:
+            text += f"，CPU {entry['cpu_seconds'] / entry['duration'] * 100:.0f}%"
+        parts.append(text)
+    if rollup["running"]:
+        text = f"运行中 {rollup['running']} 个"
+        if rollup["eta"] is not None:
+            text += f"，预计剩余 {format_seconds(rollup['eta'])}"
+        if rollup["peak_rss_mb"]:
+            text += f"，内存 {rollup['peak_rss_mb']:.0f} MB"
+        parts.append(text)
+    return " | ".join(parts) if parts else "暂无统计"
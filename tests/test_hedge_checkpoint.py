@@ -0,0 +1,76 @@
+"""对冲胜出的分片写入检查点的测试"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import TranslationRunner, output_paths  # noqa: E402
+from checkpoint import CheckpointJournal, JOURNAL_NAME  # noqa: E402
+from routing import ProviderRouter  # noqa: E402
+
+
+class _HedgeAlwaysRouter(ProviderRouter):
+    """主服务一开始就按慢于预期处理，立即启动对冲"""
+
+    def should_hedge(self, attempt):
+        return True
+
+
+def _fake_subprocess(runner):
+    """对冲在临时目录中立即生成输出；主服务一直等到被停止"""
+    if os.path.basename(runner.params["output_dir"]).startswith(".hedge-"):
+        for path in output_paths(runner.params):
+            with open(path, "wb") as f:
+                f.write(runner.params["service"].encode("ascii"))
+        runner.on_progress(1, 1)
+        return True, "翻译完成"
+    runner.attempt_event.wait(10)
+    return False, "已停止"
+
+
+class HedgeCheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.root, "shards")
+        os.makedirs(self.output_dir)
+        self.file_path = os.path.join(self.root, "paper-shard0.pdf")
+        with open(self.file_path, "wb") as f:
+            f.write(b"%PDF-1.4\n")
+        CheckpointJournal(self.root).begin("digest", ["1-3"])
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_hedged_shard_is_marked_done(self):
+        params = {
+            "file_path": self.file_path, "output_dir": self.output_dir, "pages": "1-3",
+            "service": "google", "model": "", "api_key": "", "api_url": "",
+            "fallbacks": [{"service": "bing"}], "hedge": True,
+            "checkpoint_journal": self.root, "shard_index": 0,
+        }
+        runner = TranslationRunner(params, router=_HedgeAlwaysRouter())
+        with mock.patch.object(TranslationRunner, "run_subprocess", _fake_subprocess):
+            success, message = runner.run()
+
+        self.assertTrue(success, message)
+        self.assertIn("对冲", message)
+        self.assertEqual(runner.params["output_dir"], self.output_dir)
+        self.assertEqual(runner.params["service"], "bing")
+        with open(os.path.join(self.root, JOURNAL_NAME), "r", encoding="utf-8") as f:
+            completed = json.load(f)["completed"]
+        self.assertIn("0", completed)
+        self.assertEqual(completed["0"]["mono"], output_paths(params)[0])
+        for path in output_paths(params):
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b"bing")
+        self.assertEqual(CheckpointJournal(self.root).begin("digest", ["1-3"]), {0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""LlmGateway 与本地桩服务器之间的转发测试"""
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import unittest
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_gateway import LlmGateway  # noqa: E402
+
+RESPONSE_DELAY = 0.3
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """模拟 OpenAI 兼容接口：记录请求路径和同时进行的请求数，延迟后返回请求体"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.lock:
+            server.paths.append(self.path)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        time.sleep(RESPONSE_DELAY)
+        with server.lock:
+            server.active -= 1
+        content = json.dumps({"echo": body.decode("utf-8")}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LlmGatewayTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        cls.stub.daemon_threads = True
+        cls.stub.lock = threading.Lock()
+        threading.Thread(target=cls.stub.serve_forever, daemon=True).start()
+        cls.stub_url = f"http://127.0.0.1:{cls.stub.server_address[1]}/v1"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.shutdown()
+        cls.stub.server_close()
+
+    def setUp(self):
+        self.stub.paths = []
+        self.stub.active = 0
+        self.stub.max_active = 0
+        self.gateway = LlmGateway(cap=2, batch_window=0)
+        self.gateway.start()
+
+    def tearDown(self):
+        self.gateway.stop()
+
+    def gateway_url(self, upstream):
+        env = self.gateway.apply({"service": "openai"}, {"OPENAI_BASE_URL": upstream})
+        return env["OPENAI_BASE_URL"]
+
+    def post(self, base_url, payload):
+        url = urllib.parse.urlsplit(base_url)
+        connection = http.client.HTTPConnection(url.hostname, url.port, timeout=10)
+        try:
+            connection.request("POST", f"{url.path}/chat/completions", body=json.dumps(payload),
+                               headers={"Content-Type": "application/json", "Authorization": "Bearer test"})
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    def post_concurrently(self, base_url, payloads):
+        with ThreadPoolExecutor(len(payloads)) as executor:
+            return list(executor.map(lambda payload: self.post(base_url, payload), payloads))
+
+    def test_identical_requests_are_coalesced(self):
+        base_url = self.gateway_url(self.stub_url)
+        count = 4
+        results = self.post_concurrently(base_url, [{"prompt": "Figure 1"}] * count)
+
+        self.assertEqual([status for status, _ in results], [200] * count)
+        self.assertEqual(len({content for _, content in results}), 1)
+        self.assertEqual(len(self.stub.paths), 1)
+        self.assertEqual(self.gateway.stats["requests"], count)
+        self.assertEqual(self.gateway.stats["coalesced"], count - 1)
+
+    def test_distinct_requests_respect_cap(self):
+        base_url = self.gateway_url(self.stub_url)
+        payloads = [{"prompt": f"paragraph {index}"} for index in range(6)]
+        results = self.post_concurrently(base_url, payloads)
+
+        self.assertEqual([status for status, _ in results], [200] * len(payloads))
+        self.assertEqual([json.loads(content)["echo"] for _, content in results],
+                         [json.dumps(payload) for payload in payloads])
+        self.assertEqual(len(self.stub.paths), len(payloads))
+        self.assertEqual(self.gateway.stats["coalesced"], 0)
+        self.assertLessEqual(self.stub.max_active, self.gateway.cap)
+
+    def test_connections_are_reused(self):
+        base_url = self.gateway_url(self.stub_url)
+        for index in range(3):
+            status, _ = self.post(base_url, {"prompt": f"line {index}"})
+            self.assertEqual(status, 200)
+
+        self.assertEqual(self.gateway.stats["connections"], 1)
+        self.assertEqual(self.gateway.stats["reused"], 2)
+
+    def test_upstream_path_prefix_is_preserved(self):
+        self.post(self.gateway_url(self.stub_url), {"prompt": "title"})
+
+        self.assertEqual(self.stub.paths, ["/v1/chat/completions"])
+
+    def test_dead_upstream_returns_502(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        status, content = self.post(self.gateway_url(f"http://127.0.0.1:{port}/v1"), {"prompt": "title"})
+
+        self.assertEqual(status, 502)
+        self.assertIn("error", json.loads(content))
+        self.assertEqual(self.gateway.stats["errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,277 @@
+"""
+段落级翻译记忆
+
+同一领域的论文有大量重复文本（固定表述、方法描述、图表标题、参考文献中的短语）。
+翻译记忆以 (服务, 模型, 源语言, 目标语言, 规范化后的段落) 为键，把译文保存在本地
+SQLite 数据库中，前面加一层进程内 LRU。启用后在 pdf2zh 进程中替换
+BaseTranslator.translate：每个段落先查翻译记忆，未命中时才交给翻译服务，结果随即
+写回。多台电脑可以共用一个数据库文件，或通过导出/导入 JSON Lines 合并。
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+
+DEFAULT_MEMORY_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pdf-translator", "memory.db")
+DEFAULT_MAX_ENTRIES = 500000
+
+# pdf2zh 子进程通过环境变量获得翻译记忆的位置
+MEMORY_ENV = "PDF_TRANSLATOR_MEMORY"
+MEMORY_MAX_ENV = "PDF_TRANSLATOR_MEMORY_MAX"
+
+# 每写入多少条检查一次是否超出上限
+_EVICT_INTERVAL = 500
+
+_WHITESPACE = re.compile(r"\s+")
+
+logger = logging.getLogger("pdf_translator.memory")
+
+
+def normalize_segment(text):
+    """统一 Unicode 形式并合并空白，使排版上的细微差别不影响命中"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def segment_key(service, model, lang_in, lang_out, text):
+    raw = "\0".join((service, model or "", lang_in, lang_out, normalize_segment(text)))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TranslationMemory:
+    """
+    SQLite 翻译记忆，可在多个线程和进程中同时使用
+
+    条目超过 max_entries 时按最近使用时间淘汰最旧的 10%。
+    """
+
+    def __init__(self, path=DEFAULT_MEMORY_PATH, max_entries=DEFAULT_MAX_ENTRIES, lru_size=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS segments (
+                key TEXT PRIMARY KEY, service TEXT, model TEXT, lang_in TEXT, lang_out TEXT,
+                source TEXT, target TEXT, created REAL, last_used REAL, hits INTEGER DEFAULT 0)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS segments_last_used ON segments (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, target):
+        with self._lock:
+            self._lru[key] = target
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def get(self, service, model, lang_in, lang_out, text):
+        """查找译文，未命中时返回 None"""
+        key = segment_key(service, model, lang_in, lang_out, text)
+        with self._lock:
+            target = self._lru.get(key)
+            if target is not None:
+                self._lru.move_to_end(key)
+                return target
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT target FROM segments WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE segments SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                             (time.time(), key))
+        except sqlite3.Error as e:
+            logger.warning(f"读取翻译记忆失败: {str(e)}")
+            return None
+        self._remember(key, row[0])
+        return row[0]
+
+    def put(self, service, model, lang_in, lang_out, text, target):
+        if not target:
+            return
+        key = segment_key(service, model, lang_in, lang_out, text)
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO segments (key, service, model, lang_in, lang_out, source, "
+                    "target, created, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, service, model or "", lang_in, lang_out, text, target, now, now))
+        except sqlite3.Error as e:
+            logger.warning(f"写入翻译记忆失败: {str(e)}")
+            return
+        self._remember(key, target)
+        with self._lock:
+            self._writes += 1
+            check = self._writes % _EVICT_INTERVAL == 0
+        if check:
+            self.evict()
+
+    def evict(self):
+        """条目超过上限时删除最久未使用的条目"""
+        if not self.max_entries:
+            return
+        with self._connect() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+            if count <= self.max_entries:
+                return
+            remove = count - int(self.max_entries * 0.9)
+            conn.execute("DELETE FROM segments WHERE key IN "
+                         "(SELECT key FROM segments ORDER BY last_used LIMIT ?)", (remove,))
+        with self._lock:
+            self._lru.clear()
+
+    def add_stats(self, hits, misses):
+        with self._connect() as conn:
+            for name, value in (("hits", hits), ("misses", misses)):
+                conn.execute("INSERT INTO stats (name, value) VALUES (?, ?) "
+                             "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, value))
+
+    def stats(self):
+        """返回条目数、文件大小以及累计命中次数"""
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        size = sum(os.path.getsize(self.path + suffix) for suffix in ("", "-wal")
+                   if os.path.exists(self.path + suffix))
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM segments")
+            conn.execute("DELETE FROM stats")
+        with self._lock:
+            self._lru.clear()
+        with self._connect() as conn:
+            conn.execute("VACUUM")
+
+    def export(self, path):
+        """导出为 JSON Lines，返回导出的条目数"""
+        count = 0
+        with open(path, "w", encoding="utf-8") as f, self._connect() as conn:
+            for row in conn.execute("SELECT service, model, lang_in, lang_out, source, target, "
+                                    "created FROM segments ORDER BY created"):
+                keys = ("service", "model", "lang_in", "lang_out", "source", "target", "created")
+                f.write(json.dumps(dict(zip(keys, row)), ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def import_file(self, path):
+        """
+        合并导出的 JSON Lines 或另一个翻译记忆数据库，已有的条目保持不变
+
+        返回新增的条目数。
+        """
+        with self._connect() as conn:
+            before = conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+            if path.endswith(".db"):
+                conn.execute("ATTACH DATABASE ? AS other", (path,))
+                try:
+                    conn.execute("INSERT OR IGNORE INTO segments SELECT * FROM other.segments")
+                finally:
+                    conn.commit()
+                    conn.execute("DETACH DATABASE other")
+            else:
+                now = time.time()
+                rows = []
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        item = json.loads(line)
+                        rows.append((segment_key(item["service"], item["model"], item["lang_in"],
+                                                 item["lang_out"], item["source"]),
+                                     item["service"], item["model"], item["lang_in"], item["lang_out"],
+                                     item["source"], item["target"], item.get("created", now), now))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO segments (key, service, model, lang_in, lang_out, source, "
+                    "target, created, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            after = conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        self.evict()
+        return after - before
+
+
+# ---- 在 pdf2zh 进程中启用 ----
+_active = None
+_counters = {"hits": 0, "misses": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def activate(path, max_entries=DEFAULT_MAX_ENTRIES):
+    """
+    在当前进程中启用（path 为空时停用）翻译记忆，首次调用时替换 BaseTranslator.translate
+
+    工作进程每个任务调用一次，可以在任务之间切换或停用。
+    """
+    global _active
+    if not path:
+        _active = None
+        return
+    if _active is None or _active.path != path:
+        _active = TranslationMemory(path, max_entries)
+    else:
+        _active.max_entries = max_entries
+
+    from pdf2zh.translator import BaseTranslator
+    if getattr(BaseTranslator.translate, "_memory_hook", False):
+        return
+    original = BaseTranslator.translate
+
+    def translate(self, text, ignore_cache=False):
+        memory = _active
+        if memory is None or self.ignore_cache or ignore_cache or not text.strip():
+            return original(self, text, ignore_cache)
+        target = memory.get(self.name, self.model, self.lang_in, self.lang_out, text)
+        if target is not None:
+            _count("hits")
+            return target
+        _count("misses")
+        target = original(self, text, ignore_cache)
+        memory.put(self.name, self.model, self.lang_in, self.lang_out, text, target)
+        return target
+
+    translate._memory_hook = True
+    BaseTranslator.translate = translate
+
+
+def report():
+    """汇总本次运行的命中情况并累加到数据库，返回日志文本"""
+    with _counters_lock:
+        hits, misses = _counters["hits"], _counters["misses"]
+        _counters["hits"] = _counters["misses"] = 0
+    if _active is None or not hits + misses:
+        return None
+    try:
+        _active.add_stats(hits, misses)
+    except sqlite3.Error:
+        pass
+    return f"翻译记忆: 命中 {hits}/{hits + misses} 段 ({hits / (hits + misses) * 100:.0f}%)"
@@ -0,0 +1,402 @@
+"""
+翻译用量与费用统计
+
+在 pdf2zh 进程中包装各翻译器的 do_translate，只统计真正发给翻译服务的请求（命中
+pdf2zh 缓存或翻译记忆的段落不计）：请求数、源文和译文的字符数。子进程模式下以
+"[usage] {...}" 行写到 stderr，常驻工作进程模式下通过管道发送。无法在 pdf2zh 进程中
+计量时（例如 pdf2zh 不在当前 Python 环境中），按预检得到的文本量和已完成页数估算。
+
+主进程按价格表把字符数换算为 token 数和费用，检查单任务预算和本次会话预算，并把
+每个任务的用量写入 SQLite，便于按服务、模型和页数查看累计花费。
+"""
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import threading
+
+DEFAULT_USAGE_DB = os.path.join(os.path.expanduser("~"), ".cache", "pdf-translator", "usage.db")
+DEFAULT_PRICES_FILE = os.path.join(os.path.expanduser("~"), ".cache", "pdf-translator", "prices.json")
+
+# ---- 价格表 ----
+# 默认价格（美元）。按 token 计费的服务为 [每百万输入 token, 每百万输出 token]，
+# 按字符计费的服务为每百万源文字符；免费接口和本地模型为 0。价格可能变化，
+# 可以在 prices.json 中覆盖。
+TOKEN_PRICES = {
+    "openai": {"gpt-4o-mini": [0.15, 0.60], "gpt-4o": [2.50, 10.00], "gpt-3.5-turbo": [0.50, 1.50]},
+    "azure-openai": {"gpt-4o-mini": [0.15, 0.60], "gpt-4o": [2.50, 10.00], "gpt-3.5-turbo": [0.50, 1.50]},
+    "zhipu": {"glm-4-flash": [0.0, 0.0], "glm-4": [14.0, 14.0], "glm-3-turbo": [0.14, 0.14]},
+    "modelscope": {"": [0.0, 0.0]},
+    "gemini": {"gemini-1.5-flash": [0.075, 0.30], "gemini-1.5-pro": [1.25, 5.00]},
+    "deepseek": {"deepseek-chat": [0.27, 1.10], "deepseek-coder": [0.27, 1.10]},
+    "qwen-mt": {"qwen-mt-turbo": [0.16, 0.49]},
+    "silicon": {"deepseek-ai/DeepSeek-V3": [0.27, 1.10], "Qwen/Qwen2.5-7B-Instruct": [0.0, 0.0]},
+    "ollama": {"": [0.0, 0.0]},
+    "xinference": {"": [0.0, 0.0]},
+}
+CHARACTER_PRICES = {"google": 0.0, "bing": 0.0, "argos": 0.0, "deepl": 25.0, "tencent": 8.0}
+
+# pdf2zh 为大模型翻译的每个段落附带的提示词大约占用的 token 数
+PROMPT_TOKENS_PER_SEGMENT = 60
+
+USAGE_PREFIX = "[usage] "
+USAGE_PATTERN = re.compile(r"\[usage\] (\{.*\})")
+
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]")
+
+
+def estimate_tokens(chars, cjk_chars):
+    """粗略估算 token 数：中日韩文字约 1 个/token，其他文字约 4 个字符/token"""
+    return cjk_chars + max(chars - cjk_chars, 0) / 4
+
+
+def estimated_counters(estimate, share=1.0):
+    """按预检得到的文本量估算用量计数，share 为已翻译部分所占的比例"""
+    chars = int(estimate["chars"] * share)
+    # 中日韩译文约每 3 个源文字符对应 1 个字
+    chars_out = chars // 3 if estimate.get("cjk_target") else chars
+    return {
+        "calls": int(estimate["segments"] * share),
+        "chars_in": chars,
+        "cjk_in": int(estimate["cjk"] * share),
+        "chars_out": chars_out,
+        "cjk_out": chars_out if estimate.get("cjk_target") else 0,
+    }
+
+
+class PriceTable:
+    """默认价格加上 prices.json 中的覆盖项，格式与 TOKEN_PRICES / CHARACTER_PRICES 相同"""
+
+    def __init__(self, path=DEFAULT_PRICES_FILE):
+        self.path = path
+        self.token_prices = {service: dict(models) for service, models in TOKEN_PRICES.items()}
+        self.character_prices = dict(CHARACTER_PRICES)
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    overrides = json.load(f)
+            except (OSError, ValueError):
+                # 价格表损坏时使用默认价格
+                overrides = {}
+            for service, models in overrides.get("token", {}).items():
+                self.token_prices.setdefault(service, {}).update(models)
+            self.character_prices.update(overrides.get("character", {}))
+
+    def save(self, path=None):
+        """写出完整价格表，供用户编辑"""
+        path = path or self.path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"token": self.token_prices, "character": self.character_prices}, f,
+                      ensure_ascii=False, indent=4)
+
+    def is_llm(self, service):
+        return service in self.token_prices
+
+    def tokens(self, service, counters):
+        """把用量计数换算为 (输入 token, 输出 token)"""
+        tokens_in = estimate_tokens(counters["chars_in"], counters["cjk_in"])
+        if self.is_llm(service):
+            tokens_in += counters["calls"] * PROMPT_TOKENS_PER_SEGMENT
+        return int(tokens_in), int(estimate_tokens(counters["chars_out"], counters["cjk_out"]))
+
+    def cost(self, service, model, tokens_in, tokens_out, chars_in):
+        """估算费用（美元），价格表中没有该服务时返回 None"""
+        if service in self.character_prices:
+            return chars_in / 1e6 * self.character_prices[service]
+        models = self.token_prices.get(service)
+        if not models:
+            return None
+        price = models.get(model or "") or next(iter(models.values()))
+        return (tokens_in * price[0] + tokens_out * price[1]) / 1e6
+
+
+# ---- 在 pdf2zh 进程中计量 ----
+EMIT_INTERVAL = 1.0
+
+_counters = {"calls": 0, "chars_in": 0, "cjk_in": 0, "chars_out": 0, "cjk_out": 0}
+_counters_lock = threading.Lock()
+_emit = None
+_last_emit = 0.0
+
+
+def _add(text, result):
+    with _counters_lock:
+        _counters["calls"] += 1
+        _counters["chars_in"] += len(text)
+        _counters["cjk_in"] += len(_CJK.findall(text))
+        _counters["chars_out"] += len(result)
+        _counters["cjk_out"] += len(_CJK.findall(result))
+        due = time.time() - _last_emit >= EMIT_INTERVAL
+    if due:
+        flush()
+
+
+def _metered(method):
+    def do_translate(self, text, *args, **kwargs):
+        result = method(self, text, *args, **kwargs)
+        _add(text, result if isinstance(result, str) else "")
+        return result
+
+    do_translate._usage_hook = True
+    return do_translate
+
+
+def activate_metering(emit=None):
+    """
+    包装所有翻译器的 do_translate，emit(计数字典) 定时接收累计用量
+
+    可以多次调用（例如每个任务一次），只会包装一次。emit 为空时由调用方通过
+    snapshot() 读取。
+    """
+    global _emit
+    _emit = emit
+    from pdf2zh.translator import BaseTranslator
+    pending = list(BaseTranslator.__subclasses__())
+    while pending:
+        cls = pending.pop()
+        pending.extend(cls.__subclasses__())
+        method = cls.__dict__.get("do_translate")
+        if method is not None and not getattr(method, "_usage_hook", False):
+            cls.do_translate = _metered(method)
+
+
+def reset_meter():
+    with _counters_lock:
+        for name in _counters:
+            _counters[name] = 0
+
+
+def snapshot():
+    with _counters_lock:
+        return dict(_counters)
+
+
+def flush():
+    """立即报告当前的累计用量"""
+    global _last_emit
+    with _counters_lock:
+        counters = dict(_counters)
+        _last_emit = time.time()
+    if _emit is not None and counters["calls"]:
+        try:
+            _emit(counters)
+        except Exception:
+            pass
+
+
+def print_usage(snapshot):
+    """子进程模式的 emit：写到 stderr，由主进程解析"""
+    print(USAGE_PREFIX + json.dumps(snapshot), file=sys.stderr, flush=True)
+
+
+# ---- 主进程：任务用量、预算与记录 ----
+class JobUsage:
+    """单个任务的用量，由执行线程更新"""
+
+    def __init__(self, ledger, job_id, params):
+        self._ledger = ledger
+        self.job_id = job_id
+        self.file_path = params.get("file_path", "")
+        self.service = params.get("service", "")
+        self.model = params.get("model", "")
+        self.estimate = params.get("estimate")
+        self.started_at = time.time()
+        self.metered = False
+        self.started = False  # 是否真正交给了翻译服务（缓存命中的任务不记录）
+        self.pages = 0
+        self.counters = {"calls": 0, "chars_in": 0, "cjk_in": 0, "chars_out": 0, "cjk_out": 0}
+        self.stopped = ""
+
+    def update(self, counters):
+        """pdf2zh 进程报告的累计用量"""
+        with self._ledger._lock:
+            self.metered = True
+            self.counters = {name: counters.get(name, 0) for name in self.counters}
+
+    def progress(self, pages_done):
+        """页进度；没有计量数据时按预检的每页平均文本量估算"""
+        with self._ledger._lock:
+            self.pages = max(self.pages, pages_done)
+            if not self.metered and self.estimate and self.estimate.get("pages"):
+                self.counters = estimated_counters(self.estimate, min(self.pages / self.estimate["pages"], 1.0))
+
+    def tokens(self):
+        return self._ledger.prices.tokens(self.service, self.counters)
+
+    def cost(self):
+        tokens_in, tokens_out = self.tokens()
+        return self._ledger.prices.cost(self.service, self.model, tokens_in, tokens_out,
+                                        self.counters["chars_in"]) or 0.0
+
+    def estimated_cost(self, pages=0):
+        """按预检结果估算翻译 pages 页（0 表示全部）的费用，没有预检结果时返回 None"""
+        if not self.estimate or not self.estimate.get("pages"):
+            return None
+        share = min(pages / self.estimate["pages"], 1.0) if pages else 1.0
+        counters = estimated_counters(self.estimate, share)
+        tokens_in, tokens_out = self._ledger.prices.tokens(self.service, counters)
+        return self._ledger.prices.cost(self.service, self.model, tokens_in, tokens_out, counters["chars_in"])
+
+    def check(self):
+        """超出预算时返回原因"""
+        return self._ledger.check(self)
+
+    def check_estimate(self, pages=0):
+        """启动前按预检结果检查预算"""
+        return self._ledger.check_estimate(self, pages)
+
+    def fork(self, params):
+        """同一任务改用另一个服务（故障切换或对冲）时的新记录"""
+        usage = self._ledger.start(self.job_id, params)
+        usage.estimate = self.estimate
+        return usage
+
+    def finish(self, success):
+        self._ledger._finish(self, success)
+
+
+class UsageLedger:
+    """
+    记录所有任务的用量并执行预算
+
+    job_budget / session_budget 为单任务和本次会话（程序运行期间）的费用上限（美元），
+    为0时不限制。会话费用超出上限时调用一次 on_session_exceeded(原因)，由调用方按
+    budget_action（"pause" 暂停队列或 "cancel" 取消全部任务）处理。path 为空时不写数据库。
+    """
+
+    def __init__(self, path=DEFAULT_USAGE_DB, prices=None, job_budget=0.0, session_budget=0.0,
+                 budget_action="pause", on_session_exceeded=None):
+        self.path = path
+        self.prices = prices or PriceTable()
+        self.job_budget = job_budget
+        self.session_budget = session_budget
+        self.budget_action = budget_action
+        self.on_session_exceeded = on_session_exceeded or (lambda reason: None)
+        self.session = time.strftime("%Y%m%d-%H%M%S")
+        self._lock = threading.RLock()
+        self._active = {}
+        self._session_cost = 0.0
+        self._session_tokens = 0
+        self._exceeded = False
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("""CREATE TABLE IF NOT EXISTS usage (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, session TEXT, job_id INTEGER, file TEXT,
+                    service TEXT, model TEXT, pages INTEGER, calls INTEGER, chars_in INTEGER,
+                    chars_out INTEGER, tokens_in INTEGER, tokens_out INTEGER, cost REAL,
+                    metered INTEGER, success INTEGER, stopped TEXT, started REAL, finished REAL)""")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def set_budgets(self, job_budget, session_budget, budget_action=None):
+        with self._lock:
+            self.job_budget = job_budget
+            self.session_budget = session_budget
+            if budget_action:
+                self.budget_action = budget_action
+            # 提高上限后允许再次触发
+            self._exceeded = bool(session_budget) and self._current_session_cost() > session_budget
+
+    def start(self, job_id, params):
+        usage = JobUsage(self, job_id, params)
+        with self._lock:
+            self._active[id(usage)] = usage
+        return usage
+
+    def _current_session_cost(self):
+        return self._session_cost + sum(usage.cost() for usage in self._active.values())
+
+    def session_totals(self):
+        """本次会话的 (费用, token 数)，包括运行中的任务"""
+        with self._lock:
+            tokens = self._session_tokens + sum(sum(usage.tokens()) for usage in self._active.values())
+            return self._current_session_cost(), tokens
+
+    def check(self, usage):
+        """任务费用或会话费用超出上限时返回原因"""
+        with self._lock:
+            cost = usage.cost()
+            if self.job_budget and cost > self.job_budget:
+                return f"任务费用约 ${cost:.4f}，超出单任务预算 ${self.job_budget:.2f}"
+            if not self.session_budget:
+                return None
+            session_cost = self._current_session_cost()
+            if session_cost <= self.session_budget:
+                return None
+            reason = f"本次费用约 ${session_cost:.4f}，超出会话预算 ${self.session_budget:.2f}"
+            notify = not self._exceeded
+            self._exceeded = True
+        if notify:
+            self.on_session_exceeded(reason)
+        return reason
+
+    def check_estimate(self, usage, pages):
+        """启动前按预检结果检查预算，预计会超出时返回原因"""
+        with self._lock:
+            if self.session_budget and self._exceeded:
+                return f"本次费用已超出会话预算 ${self.session_budget:.2f}"
+            estimate = usage.estimated_cost(pages)
+            if estimate is None or not self.job_budget or estimate <= self.job_budget:
+                return None
+            return f"预计费用约 ${estimate:.4f}，超出单任务预算 ${self.job_budget:.2f}"
+
+    def _finish(self, usage, success):
+        with self._lock:
+            self._active.pop(id(usage), None)
+            cost = usage.cost()
+            tokens_in, tokens_out = usage.tokens()
+            self._session_cost += cost
+            self._session_tokens += tokens_in + tokens_out
+        if not usage.started or not self.path:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO usage (session, job_id, file, service, model, pages, calls, chars_in, "
+                    "chars_out, tokens_in, tokens_out, cost, metered, success, stopped, started, finished) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (self.session, usage.job_id, usage.file_path, usage.service, usage.model, usage.pages,
+                     usage.counters["calls"], usage.counters["chars_in"], usage.counters["chars_out"],
+                     tokens_in, tokens_out, round(cost, 6),
+                     int(usage.metered), int(success), usage.stopped, usage.started_at, time.time()))
+        except sqlite3.Error:
+            pass
+
+    def summary(self, session_only=False):
+        """按服务和模型汇总累计用量"""
+        if not self.path:
+            return []
+        query = ("SELECT service, model, COUNT(*), SUM(pages), SUM(tokens_in), SUM(tokens_out), "
+                 "SUM(chars_in), SUM(cost) FROM usage")
+        args = ()
+        if session_only:
+            query += " WHERE session = ?"
+            args = (self.session,)
+        query += " GROUP BY service, model ORDER BY SUM(cost) DESC"
+        with self._connect() as conn:
+            rows = conn.execute(query, args).fetchall()
+        keys = ("service", "model", "jobs", "pages", "tokens_in", "tokens_out", "chars", "cost")
+        return [dict(zip(keys, row)) for row in rows]
+
+
+def format_summary(rows, service_name=lambda service: service):
+    """把 summary() 的结果格式化为多行文字"""
+    if not rows:
+        return "暂无用量记录"
+    lines = []
+    for row in rows:
+        name = service_name(row["service"]) + (f" {row['model']}" if row["model"] else "")
+        text = (f"{name}: {row['jobs']} 个任务，{row['pages'] or 0} 页，"
+                f"{(row['tokens_in'] or 0) + (row['tokens_out'] or 0):,} token，"
+                f"{row['chars'] or 0:,} 字符，${row['cost'] or 0:.4f}")
+        if row["pages"]:
+            text += f" (每页 ${(row['cost'] or 0) / row['pages']:.4f})"
+        lines.append(text)
+    total = sum(row["cost"] or 0 for row in rows)
+    lines.append(f"合计: ${total:.4f}")
+    return "\n".join(lines)
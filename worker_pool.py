@@ -0,0 +1,262 @@
+"""
+常驻 pdf2zh 工作进程池
+
+每个工作进程启动时导入 pdf2zh 并加载版面检测模型，之后通过管道循环接收任务，
+避免每篇文档都冷启动 Python、导入依赖并重新加载 ONNX 模型。工作进程在处理
+一定数量的任务或内存超过上限后会被回收并替换为新进程。
+"""
+import os
+import sys
+import time
+import queue
+import logging
+import threading
+import traceback
+import multiprocessing
+
+from core import parse_pages
+import layout_cache
+import translation_memory
+import usage
+
+
+def current_rss_mb():
+    """当前进程的常驻内存(MB)，无法获取时返回0"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 单位为字节，Linux 为KB
+        return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+    except Exception:
+        return 0
+
+
+class _PipeLogHandler(logging.Handler):
+    """把工作进程中的日志转发给主进程"""
+
+    def __init__(self, conn):
+        super().__init__(logging.INFO)
+        self.conn = conn
+        self.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+
+    def emit(self, record):
+        try:
+            self.conn.send(("log", self.format(record)))
+        except Exception:
+            pass
+
+
+def _worker_main(conn):
+    """工作进程入口：预热 pdf2zh 后循环处理任务，收到 None 时退出"""
+    started = time.time()
+    try:
+        from pdf2zh.high_level import translate
+        from pdf2zh.doclayout import ModelInstance, OnnxModel
+        if ModelInstance.value is None:
+            ModelInstance.value = OnnxModel.load_available()
+        model = ModelInstance.value
+    except Exception as e:
+        conn.send(("fatal", f"加载 pdf2zh 失败: {str(e)}"))
+        return
+    conn.send(("ready", time.time() - started))
+
+    logging.getLogger().addHandler(_PipeLogHandler(conn))
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request is None:
+            break
+        _run_request(conn, request, translate, model)
+
+
+def _run_request(conn, request, translate, model):
+    # 工作进程一次只处理一个任务，可以直接修改本进程的环境变量
+    env = request.get("env", {})
+    saved_env = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+
+    def callback(progress):
+        conn.send(("progress", int(progress.n), int(progress.total or 0)))
+        # 用量随页进度一起发送，避免翻译线程并发写管道
+        conn.send(("usage", usage.snapshot()))
+
+    try:
+        usage.reset_meter()
+        usage.activate_metering()
+        translation_memory.activate(request.get("translation_memory"),
+                                    request.get("translation_memory_entries",
+                                                translation_memory.DEFAULT_MAX_ENTRIES))
+        layout_cache.activate(request.get("layout_cache"))
+        translate(
+            files=[request["file_path"]],
+            output=request["output_dir"],
+            pages=parse_pages(request.get("pages")),
+            lang_in=request["source_lang"],
+            lang_out=request["target_lang"],
+            service=request["service"],
+            thread=request["threads"],
+            callback=callback,
+            compatible=request["compatible_mode"],
+            model=model,
+            envs=env,
+            skip_subset_fonts=request["skip_subset_fonts"],
+            ignore_cache=request.get("ignore_cache", False),
+        )
+        conn.send(("usage", usage.snapshot()))
+        for message in (translation_memory.report(), layout_cache.report()):
+            if message:
+                conn.send(("log", message))
+        conn.send(("done", True, "翻译完成", current_rss_mb()))
+    except Exception as e:
+        translation_memory.report()
+        layout_cache.report()
+        conn.send(("usage", usage.snapshot()))
+        conn.send(("done", False, f"翻译失败: {str(e)}\n{traceback.format_exc()}", current_rss_mb()))
+    finally:
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.jobs = 0
+        self.ready = False
+
+
+class WorkerPool:
+    """
+    固定数量的常驻工作进程
+
+    run() 在调用线程中阻塞，直到分配到空闲工作进程并完成任务。
+    max_jobs_per_worker / max_memory_mb 为0时表示不限制。
+    """
+
+    def __init__(self, size=2, max_jobs_per_worker=20, max_memory_mb=0):
+        # Qt 主进程中有多个线程，使用 spawn 避免 fork 带来的死锁
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = set()
+        self._closed = False
+        self.size = max(1, int(size))
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.max_memory_mb = max_memory_mb
+        for _ in range(self.size):
+            self._spawn()
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        with self._lock:
+            self._workers.add(worker)
+        self._idle.put(worker)
+
+    def _retire(self, worker, kill=False):
+        """回收工作进程，并在进程池未关闭时补充新进程"""
+        with self._lock:
+            self._workers.discard(worker)
+            closed = self._closed
+        if kill:
+            worker.process.terminate()
+        else:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                worker.process.terminate()
+        worker.conn.close()
+        if not closed:
+            self._spawn()
+
+    def run(self, request, on_event, cancel_event):
+        """
+        执行一个翻译请求，返回 (是否成功, 消息)
+
+        on_event(kind, *args) 接收 ("log", 文本)、("progress", 当前页, 总页数)、
+        ("usage", 累计用量) 与 ("pid", 工作进程号)。
+        cancel_event 被设置时会终止工作进程并补充新进程。
+        """
+        worker = None
+        while worker is None:
+            if cancel_event.is_set():
+                return False, "翻译已取消"
+            try:
+                worker = self._idle.get(timeout=0.2)
+            except queue.Empty:
+                continue
+
+        try:
+            worker.conn.send(request)
+            on_event("pid", worker.process.pid)
+            while True:
+                if cancel_event.is_set():
+                    self._retire(worker, kill=True)
+                    return False, "翻译已取消"
+                if not worker.conn.poll(0.2):
+                    if not worker.process.is_alive():
+                        raise EOFError
+                    continue
+
+                message = worker.conn.recv()
+                kind = message[0]
+                if kind == "ready":
+                    worker.ready = True
+                    on_event("log", f"工作进程已就绪，预热耗时 {message[1]:.1f} 秒")
+                elif kind == "fatal":
+                    self._retire(worker, kill=True)
+                    return False, message[1]
+                elif kind == "done":
+                    _, success, text, rss_mb = message
+                    worker.jobs += 1
+                    if self._should_recycle(worker, rss_mb):
+                        on_event("log", f"回收工作进程 (已处理 {worker.jobs} 个任务，内存 {rss_mb:.0f} MB)")
+                        self._retire(worker)
+                    else:
+                        self._idle.put(worker)
+                    return success, text
+                else:
+                    on_event(*message)
+        except (EOFError, OSError):
+            self._retire(worker, kill=True)
+            return False, "工作进程异常退出"
+
+    def _should_recycle(self, worker, rss_mb):
+        if self.max_jobs_per_worker and worker.jobs >= self.max_jobs_per_worker:
+            return True
+        if self.max_memory_mb and rss_mb > self.max_memory_mb:
+            return True
+        return False
+
+    def shutdown(self):
+        """关闭所有工作进程"""
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in workers:
+            worker.process.join(timeout=2)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()